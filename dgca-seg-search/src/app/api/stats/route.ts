@@ -1,32 +1,71 @@
 import { NextResponse } from 'next/server'
 import { Pinecone } from '@pinecone-database/pinecone'
+import { readFile } from 'fs/promises'
+import path from 'path'
 
 const pinecone = new Pinecone({
   apiKey: process.env.PINECONE_API_KEY!,
 })
 
 const INDEX_NAME = process.env.PINECONE_INDEX_NAME || 'dgca-reports'
+// CATALOG_DIR of the Python ingest pipeline
+const CORPUS_CATALOG_DIR = process.env.CORPUS_CATALOG_DIR
+
+interface CatalogSummary {
+  documents: number
+  chunks: number
+  categories: Record<string, { documents: number }>
+}
+
+async function readCatalog(): Promise<CatalogSummary | null> {
+  if (!CORPUS_CATALOG_DIR) {
+    return null
+  }
+  try {
+    const summary = await readFile(
+      path.join(CORPUS_CATALOG_DIR, INDEX_NAME, 'summary.json'),
+      'utf-8'
+    )
+    return JSON.parse(summary)
+  } catch (error) {
+    console.error('Corpus catalog unreadable:', error)
+    return null
+  }
+}
 
 export async function GET() {
   try {
+    const catalog = await readCatalog()
+    if (catalog) {
+      return NextResponse.json({
+        total_documents: catalog.documents,
+        total_chunks: catalog.chunks,
+        categories: Object.fromEntries(
+          Object.entries(catalog.categories).map(([category, totals]) => [
+            category.toUpperCase(),
+            totals.documents,
+          ])
+        ),
+      })
+    }
+
+    // Without the catalog only the chunk count is known; null marks the rest
     const index = pinecone.index(INDEX_NAME)
     const stats = await index.describeIndexStats()
 
     return NextResponse.json({
-      total_documents: 163, // Your backend has 163 documents
-      total_chunks: stats.totalRecordCount || 2713,
-      categories: {
-        INCIDENT: 153,
-        ACCIDENT: 10,
-      },
+      total_documents: null,
+      total_chunks: stats.totalRecordCount ?? null,
+      categories: null,
     })
   } catch (error) {
     console.error('Stats API error:', error)
     return NextResponse.json(
       {
-        total_documents: 0,
-        total_chunks: 0,
-        categories: {},
+        error: 'Failed to load stats',
+        total_documents: null,
+        total_chunks: null,
+        categories: null,
       },
       { status: 500 }
     )
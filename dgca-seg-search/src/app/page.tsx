@@ -42,13 +42,13 @@ export default function Home() {
           <div className="mt-4 flex items-center justify-center space-x-8 text-sm text-white/80">
             <div className="text-center">
               <div className="text-lg font-semibold text-white">
-                {stats.total_documents}
+                {stats.total_documents ?? '—'}
               </div>
               <div>Documents</div>
             </div>
             <div className="text-center">
               <div className="text-lg font-semibold text-white">
-                {stats.total_chunks}
+                {stats.total_chunks ?? '—'}
               </div>
               <div>Chunks</div>
             </div>
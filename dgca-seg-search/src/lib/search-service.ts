@@ -30,10 +30,11 @@ export class SearchService {
     }
   }
 
+  // null where the count is unknown (no corpus catalog, or the request failed)
   static async getStats(): Promise<{
-    total_documents: number
-    total_chunks: number
-    categories: Record<string, number>
+    total_documents: number | null
+    total_chunks: number | null
+    categories: Record<string, number> | null
   }> {
     try {
       const response = await fetch('/api/stats')
@@ -46,9 +47,9 @@ export class SearchService {
     } catch (error) {
       console.error('Stats error:', error)
       return {
-        total_documents: 0,
-        total_chunks: 0,
-        categories: {},
+        total_documents: null,
+        total_chunks: null,
+        categories: null,
       }
     }
   }
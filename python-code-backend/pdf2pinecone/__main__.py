@@ -1,13 +1,28 @@
 import argparse
+import atexit
 import glob
 import os
+import time
 import logging
-from tqdm import tqdm
 from pdf2pinecone.config import load_config
 from pdf2pinecone.logger import setup_logger
-from pdf2pinecone.pdf_utils import extract_text_from_pdf, clean_text
-from pdf2pinecone.pinecone_utils import create_chunks, setup_pinecone_index, upload_to_pinecone
-import openai
+from pdf2pinecone.embedding_cache import EmbeddingCache
+from pdf2pinecone.manifest import IngestManifest
+from pdf2pinecone.pdf_utils import ParallelExtractor
+from pdf2pinecone.pinecone_utils import setup_pinecone_index, delete_from_pinecone
+from pdf2pinecone.pipeline import ingest_files, CompletionTracker
+from pdf2pinecone.async_uploader import AsyncUploader, load_failures
+from pdf2pinecone.local_index import setup_local_index, local_index_options
+from pdf2pinecone.lexical_index import LexicalIndex
+from pdf2pinecone.chunk_store import ChunkStore
+from pdf2pinecone.dedup import DuplicateDetector
+from pdf2pinecone.similar_reports import SimilarReports
+from pdf2pinecone.catalog import CorpusCatalog
+from pdf2pinecone.embeddings import EMBEDDING_MODEL
+from pdf2pinecone.embedders import BACKENDS, make_embedder
+from pdf2pinecone.search_session import SearchSession
+from pdf2pinecone.postprocess import format_results
+from pdf2pinecone.metrics import metrics, timed
 from pinecone import Pinecone
 
 def main():
@@ -15,12 +30,33 @@ def main():
     parser.add_argument('--incident-folder', type=str, help='Path to incident PDFs folder')
     parser.add_argument('--accident-folder', type=str, help='Path to accident PDFs folder')
     parser.add_argument('--index-name', type=str, help='Pinecone index name')
-    parser.add_argument('--chunk-size', type=int, help='Words per chunk')
-    parser.add_argument('--chunk-overlap', type=int, help='Overlapping words per chunk')
+    parser.add_argument('--vector-store', type=str, choices=['pinecone', 'local'], help='Where to store vectors')
+    parser.add_argument('--chunk-size', type=int, help='Words per chunk (only with --chunk-tokens 0)')
+    parser.add_argument('--chunk-overlap', type=int, help='Overlapping words per chunk (only with --chunk-tokens 0)')
+    parser.add_argument('--chunk-tokens', type=int, help='Estimated tokens per chunk (0 for word windows of --chunk-size)')
+    parser.add_argument('--chunk-overlap-tokens', type=int, help='Estimated overlapping tokens per chunk')
+    parser.add_argument('--dedup-threshold', type=float, help='Estimated Jaccard similarity at which chunks count as near-duplicates (0 disables)')
+    parser.add_argument('--embedding-backend', type=str, choices=BACKENDS, help='Embedding backend (default: EMBEDDING_BACKEND)')
+    parser.add_argument('--embedding-batch-size', type=int, help='Max chunks per embedding request')
+    parser.add_argument('--embedding-batch-tokens', type=int, help='Max estimated tokens per embedding request')
+    parser.add_argument('--no-embedding-cache', action='store_true', help='Re-embed every chunk instead of using the on-disk cache')
+    parser.add_argument('--force-reindex', action='store_true', help='Reprocess every PDF, ignoring the ingest manifest')
+    parser.add_argument('--extract-workers', type=int, help='Threads extracting PDF text')
+    parser.add_argument('--extract-processes', type=int, help='Worker processes for PDF extraction (0 to extract in-process)')
+    parser.add_argument('--embed-workers', type=int, help='Concurrent embedding requests')
+    parser.add_argument('--upsert-workers', type=int, help='Concurrent Pinecone upserts')
+    parser.add_argument('--embed-rate', type=float, help='Max embedding requests per second')
+    parser.add_argument('--upsert-rate', type=float, help='Max upserts per second')
+    parser.add_argument('--replay-failed', action='store_true', help='Retry batches that failed in a previous run before ingesting')
     parser.add_argument('--log-file', type=str, help='Log file path')
     parser.add_argument('--log-level', type=str, default='INFO', help='Log level')
     parser.add_argument('--test-query', type=str, help='Run a test search after upload')
+    parser.add_argument('--search-mode', type=str, choices=['auto', 'vector', 'keyword', 'hybrid'], help='How the test search ranks results')
     parser.add_argument('--category', type=str, choices=['incident', 'accident'], help='Filter search by category')
+    parser.add_argument('--chunks-per-report', type=int, help='Matching chunks shown per report in the test search')
+    parser.add_argument('--json', action='store_true', help='Print the test search results as JSON')
+    parser.add_argument('--metrics-file', type=str, help='Write run metrics here (.prom/.txt for Prometheus text, otherwise JSON)')
+    parser.add_argument('--trace-file', type=str, help='Write a Chrome trace of timed operations here')
     args = parser.parse_args()
 
     config = load_config()
@@ -31,20 +67,51 @@ def main():
     index_name = args.index_name or config['INDEX_NAME']
     chunk_size = args.chunk_size or config['CHUNK_SIZE']
     chunk_overlap = args.chunk_overlap or config['CHUNK_OVERLAP']
+    chunk_tokens = config['CHUNK_TOKENS'] if args.chunk_tokens is None else args.chunk_tokens
+    chunk_overlap_tokens = config['CHUNK_OVERLAP_TOKENS'] if args.chunk_overlap_tokens is None else args.chunk_overlap_tokens
+    embedding_batch_size = args.embedding_batch_size or config['EMBEDDING_BATCH_SIZE']
+    embedding_batch_tokens = args.embedding_batch_tokens or config['EMBEDDING_BATCH_TOKENS']
     log_file = args.log_file
     log_level = args.log_level
     setup_logger(log_file, log_level)
+    metrics_file = args.metrics_file or config['METRICS_FILE']
+    trace_file = args.trace_file or config['TRACE_FILE']
+    if metrics_file or trace_file:
+        metrics.enable(tracing=bool(trace_file))
+        started = time.perf_counter()
 
-    openai.api_key = config['OPENAI_API_KEY']
-    if not openai.api_key:
+        def export_metrics():
+            metrics.observe('run_seconds', time.perf_counter() - started)
+            metrics.export(metrics_file, trace_file)
+        atexit.register(export_metrics)
+
+    embedding_backend = args.embedding_backend or config['EMBEDDING_BACKEND']
+    if embedding_backend == 'openai' and not config['OPENAI_API_KEY']:
         raise ValueError("OPENAI_API_KEY not found in environment variables")
-    pc = Pinecone(api_key=config['PINECONE_API_KEY'])
-    if not config['PINECONE_API_KEY']:
-        raise ValueError("PINECONE_API_KEY not found in environment variables")
-    embedding_dimension = 1536
+    embedder = make_embedder(config, embedding_backend)
+    logging.info(f"Embedding with {embedder.model} ({embedder.dimension} dimensions)")
+    vector_store = args.vector_store or config['VECTOR_STORE']
+    if vector_store == 'pinecone':
+        if not config['PINECONE_API_KEY']:
+            raise ValueError("PINECONE_API_KEY not found in environment variables")
+        pc = Pinecone(api_key=config['PINECONE_API_KEY'])
+    embedding_dimension = embedder.dimension
+    cache = None
+    if not args.no_embedding_cache:
+        cache = EmbeddingCache(config['EMBEDDING_CACHE_DIR'], config['EMBEDDING_CACHE_MAX_MB'] * 1024 * 1024)
 
-    all_chunks = []
+    manifest = IngestManifest(config['MANIFEST_PATH'])
+    if chunk_tokens:
+        chunk_params = {'chunk_tokens': chunk_tokens, 'chunk_overlap_tokens': chunk_overlap_tokens,
+                        'align_sentences': config['CHUNK_ALIGN_SENTENCES']}
+    else:
+        chunk_params = {'chunk_size': chunk_size, 'chunk_overlap': chunk_overlap}
+    if embedder.model != EMBEDDING_MODEL:
+        # Files embedded by another model are not current
+        chunk_params['embedding_model'] = embedder.model
+    pending_files = []
     total_files = 0
+    skipped_files = 0
     
     for category, pdf_folder in pdf_folders.items():
         os.makedirs(pdf_folder, exist_ok=True)
@@ -53,79 +120,168 @@ def main():
             logging.warning(f"No PDF files found in {pdf_folder} for category '{category}'")
             continue
         
-        logging.info(f"Found {len(pdf_files)} {category} PDF files to process")
+        logging.info(f"Found {len(pdf_files)} {category} PDF files")
         total_files += len(pdf_files)
-        
-        for pdf_path in tqdm(pdf_files, desc=f"Processing {category} PDFs"):
-            filename = os.path.basename(pdf_path)
-            text = extract_text_from_pdf(pdf_path)
-            if not text:
-                logging.warning(f"No text extracted from {filename}")
+        for pdf_path in pdf_files:
+            file_hash = manifest.file_hash(pdf_path)
+            if not args.force_reindex and manifest.is_current(pdf_path, file_hash, chunk_params):
+                skipped_files += 1
                 continue
-            cleaned_text = clean_text(text)
-            chunks = create_chunks(cleaned_text, filename, chunk_size, chunk_overlap, pdf_folder, category)
-            all_chunks.extend(chunks)
-            logging.info(f"Created {len(chunks)} chunks from {category}/{filename}")
+            pending_files.append({'path': pdf_path, 'category': category, 'folder': pdf_folder, 'sha256': file_hash})
+
+    removed = manifest.remove_deleted()
+    if removed:
+        logging.info(f"{len(removed)} previously ingested files were removed")
+    manifest.save()
+    logging.info(f"Skipped {skipped_files} unchanged files")
     
-    if not all_chunks:
-        logging.error("No chunks created from any PDFs")
-        return
-        
-    logging.info(f"Total chunks created: {len(all_chunks)} from {total_files} files")
-    index = setup_pinecone_index(pc, index_name, embedding_dimension)
-    upload_to_pinecone(index, all_chunks)
-    logging.info("Upload complete!")
+    if vector_store == 'local':
+        index = setup_local_index(config['LOCAL_INDEX_DIR'], index_name, embedding_dimension,
+                                  **local_index_options(config))
+    else:
+        index = setup_pinecone_index(pc, index_name, embedding_dimension)
+    lexical = None
+    if config['LEXICAL_INDEX_DIR']:
+        lexical = LexicalIndex(os.path.join(config['LEXICAL_INDEX_DIR'], index_name))
+    chunk_store = None
+    if config['CHUNK_STORE_DIR']:
+        chunk_store = ChunkStore(os.path.join(config['CHUNK_STORE_DIR'], index_name))
+    similar = None
+    if config['SIMILAR_REPORTS_DIR']:
+        similar = SimilarReports(os.path.join(config['SIMILAR_REPORTS_DIR'], index_name), config['SIMILAR_REPORTS_K'])
+    embed_workers = args.embed_workers or config['EMBED_WORKERS']
+    upsert_workers = args.upsert_workers or config['UPSERT_WORKERS']
+    embed_rate = args.embed_rate or config['EMBED_RATE']
+    upsert_rate = args.upsert_rate or config['UPSERT_RATE']
+    failures_path = config['FAILED_BATCHES_PATH']
+    if args.replay_failed and os.path.exists(failures_path):
+        failed_chunks = load_failures(failures_path)
+        logging.info(f"Replaying {len(failed_chunks)} chunks from {failures_path}")
+        tracker = CompletionTracker(manifest, save_interval=config['MANIFEST_SAVE_INTERVAL'])
+        by_path = {}
+        for chunk in failed_chunks:
+            by_path.setdefault(chunk['metadata']['source_path'], set()).add(chunk['id'])
+        for path, ids in by_path.items():
+            entry = manifest.files.get(path)
+            # Only files whose chunks have not changed since the failed run
+            if entry and entry['status'] == 'pending' and ids <= set(entry['chunk_ids']):
+                tracker.expect(path, ids)
+        uploader = AsyncUploader(index, client=embedder, model=embedder.model, cache=cache, embedding_batch_size=embedding_batch_size,
+                                 embedding_batch_tokens=embedding_batch_tokens, embed_rate=embed_rate,
+                                 upsert_rate=upsert_rate, embed_concurrency=embed_workers,
+                                 upsert_concurrency=upsert_workers, max_retries=config['MAX_RETRIES'])
+        report = uploader.upload(failed_chunks, on_upserted=tracker.uploaded,
+                                 on_vectors=similar.add_vectors if similar is not None else None)
+        tracker.flush()
+        report.write_failures(failures_path)
+        pending_files = [item for item in pending_files if not manifest.is_current(item['path'], item['sha256'], chunk_params)]
+    if pending_files:
+        logging.info(f"Processing {len(pending_files)} new or changed files out of {total_files}")
+        extract_processes = config['EXTRACT_PROCESSES'] if args.extract_processes is None else args.extract_processes
+        extractor = ParallelExtractor(extract_processes, config['PAGES_PER_TASK']) if extract_processes else None
+        dedup = None
+        dedup_threshold = config['DEDUP_THRESHOLD'] if args.dedup_threshold is None else args.dedup_threshold
+        if dedup_threshold:
+            os.makedirs(config['DEDUP_DIR'], exist_ok=True)
+            dedup = DuplicateDetector(dedup_threshold, path=os.path.join(config['DEDUP_DIR'], f"{index_name}.minhash"))
+            # Representatives must already be in the index
+            reingested = {item['path'] for item in pending_files}
+            dedup.load(chunk_id for path, entry in manifest.files.items()
+                       if entry['status'] == 'complete' and path not in reingested for chunk_id in entry['chunk_ids'])
+        try:
+            with metrics.timer('ingest_seconds'):
+                counts = ingest_files(pending_files, index, manifest, chunk_size, chunk_overlap, chunk_params,
+                                      client=embedder,
+                                      model=embedder.model,
+                                      cache=cache,
+                                      embedding_batch_size=embedding_batch_size,
+                                      embedding_batch_tokens=embedding_batch_tokens,
+                                      extract_workers=args.extract_workers or config['EXTRACT_WORKERS'],
+                                      embed_workers=embed_workers,
+                                      upsert_workers=upsert_workers,
+                                      buffer_size=config['PIPELINE_BUFFER_SIZE'],
+                                      extractor=extractor,
+                                      lexical=lexical,
+                                      chunk_store=chunk_store,
+                                      embed_rate=embed_rate,
+                                      upsert_rate=upsert_rate,
+                                      max_retries=config['MAX_RETRIES'],
+                                      failures_path=failures_path,
+                                      chunk_tokens=chunk_tokens,
+                                      chunk_overlap_tokens=chunk_overlap_tokens,
+                                      align_sentences=config['CHUNK_ALIGN_SENTENCES'],
+                                      dedup=dedup,
+                                      similar=similar,
+                                      manifest_save_interval=config['MANIFEST_SAVE_INTERVAL'])
+        finally:
+            if extractor is not None:
+                extractor.close()
+        logging.info(f"Created {counts['created']} chunks ({counts['chunk']} sent for embedding after "
+                     f"near-duplicate removal), upserted {counts['upsert']} batches")
+        if dedup is not None:
+            saved = dedup.summary(embedding_batch_size, embedding_batch_tokens)
+            logging.info(f"Near-duplicates: {saved['duplicates']} of {saved['chunks']} chunks reference a representative; "
+                         f"saved {saved['vectors_saved']} vectors, ~{saved['tokens_saved']} embedding tokens "
+                         f"and ~{saved['requests_saved']} embedding requests")
+        if counts['failed']:
+            logging.warning(f"{counts['failed']} chunks failed to upload; saved to {failures_path} "
+                            f"(re-run with --replay-failed)")
+    else:
+        logging.info("No new or changed PDFs to upload")
+    manifest.drop_referenced()
+    if manifest.pending_deletes:
+        if lexical is not None:
+            lexical.delete(manifest.pending_deletes)
+        if chunk_store is not None:
+            chunk_store.delete(manifest.pending_deletes)
+        manifest.deleted(delete_from_pinecone(index, manifest.pending_deletes))
+        manifest.save()
+    if similar is not None:
+        with metrics.timer('similar_reports_seconds'):
+            complete = {os.path.basename(path): entry['chunk_ids'] for path, entry in manifest.files.items()
+                        if entry['status'] == 'complete' and entry['chunk_ids']}
+            similar.backfill(index, complete)
+            similar.commit(complete, [os.path.basename(path) for path in removed])
+    if config['CATALOG_DIR']:
+        catalog = CorpusCatalog(os.path.join(config['CATALOG_DIR'], index_name))
+        changed, dropped = catalog.sync(manifest)
+        stats = catalog.stats()
+        logging.info(f"Catalog: {stats['documents']} documents, {stats['chunks']} chunks, {stats['pages']} pages "
+                     f"({changed} updated, {dropped} removed)")
+    logging.info("Ingest complete!")
+    if cache is not None:
+        cache.save()
+        stats = cache.stats()
+        logging.info(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                     f"({stats['hit_rate']:.1%} hit rate), {stats['entries']} entries, "
+                     f"{stats['size_bytes'] / (1024 * 1024):.1f} MB")
     
     if args.test_query:
-        test_search(index, args.test_query, category_filter=args.category)
+        session = SearchSession(config, index=index, lexical=lexical, client=embedder, model=embedder.model,
+                                disk_cache=cache, index_name=index_name, chunk_store=chunk_store)
+        test_search(session, args.test_query, category_filter=args.category, mode=args.search_mode,
+                    chunks_per_report=args.chunks_per_report, as_json=args.json)
+        # The test query's embedding went into the cache after it was saved above
+        session.save()
+    embedder.close()
 
-def test_search(index, query, top_k=5, category_filter=None):
-    import openai
+@timed('test_search_seconds')
+def test_search(session, query, top_k=5, category_filter=None, mode=None, chunks_per_report=None, as_json=False):
     import logging
-    from pdf2pinecone.pinecone_utils import generate_embedding
-    import re
+    import json
     logging.info(f"Testing search with query: '{query}'" + (f" (category: {category_filter})" if category_filter else ""))
-    query_embedding = generate_embedding(query)
-    if query_embedding is None:
-        logging.error("Failed to generate query embedding")
-        print("Failed to generate query embedding.")
-        return
     try:
-        # Build filter for category if specified
-        filter_dict = {"category": {"$eq": category_filter}} if category_filter else None
-        
-        results = index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_values=False,
-            include_metadata=True,
-            filter=filter_dict
-        )
-        
-        category_text = f" in '{category_filter}' category" if category_filter else ""
-        print(f"\nFound {len(results.matches)} results for: '{query}'{category_text}\n" + "="*60)
-        
-        for i, match in enumerate(results.matches):
-            filename = match.metadata.get('filename', 'N/A')
-            category = match.metadata.get('category', 'N/A')
-            chunk_idx = match.metadata.get('chunk_index', 'N/A')
-            score = match.score
-            chunk_text = match.metadata.get('text', None)
-            
-            # Highlight query in chunk_text
-            if chunk_text:
-                snippet = chunk_text[:500] + ("..." if len(chunk_text) > 500 else "")
-                # Highlight all occurrences of the query (case-insensitive)
-                pattern = re.compile(re.escape(query), re.IGNORECASE)
-                snippet = pattern.sub(lambda m: f"\033[1;31m{m.group(0)}\033[0m", snippet)
-            else:
-                snippet = "Content not found in metadata."
-                
-            print(f"Result {i+1} | Score: {score:.4f} | Category: {category.upper()}")
-            print(f"File: {filename} | Chunk: {chunk_idx}")
-            print(f"Snippet:\n{snippet}\n{'-'*60}")
-            
-        print(f"\nEnd of results. Displayed {len(results.matches)} out of {top_k} requested.\n")
+        results = session.search_reports(query, top_k=top_k, category=category_filter, mode=mode,
+                                         chunks_per_report=chunks_per_report)
+        if results is None:
+            logging.error("Failed to generate query embedding")
+            print("Failed to generate query embedding.")
+            return
+        if as_json:
+            print(json.dumps(results, indent=2))
+            return
+        print(f"\n{format_results(results)}")
+        print(f"\nEnd of results. Displayed {len(results['reports'])} out of {top_k} requested.\n")
     except Exception as e:
         logging.error(f"Error during search: {str(e)}")
         print(f"Error during search: {str(e)}")
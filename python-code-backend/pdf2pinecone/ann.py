@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import logging
+import argparse
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+ANN_META_FILE = "ivf.json"
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def nearest_centroids(centroids: np.ndarray, data: np.ndarray, block_size: int = 4096) -> np.ndarray:
+    assignments = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), block_size):
+        block = np.asarray(data[start:start + block_size], dtype=np.float32)
+        assignments[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+def spherical_kmeans(data: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    k-means on the unit sphere (cosine), returning normalised centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = np.array(data[rng.choice(len(data), nlist, replace=False)], dtype=np.float32)
+    for _ in range(iterations):
+        assignments = nearest_centroids(centroids, data)
+        order = np.argsort(assignments, kind='stable')
+        sorted_assignments = assignments[order]
+        present, starts = np.unique(sorted_assignments, return_index=True)
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(np.asarray(data[order], dtype=np.float32), starts, axis=0)
+        empty = np.setdiff1d(np.arange(nlist), present)
+        if len(empty):
+            # Reseed empty lists from random points
+            sums[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+        centroids = normalize(sums).astype(np.float32)
+    return centroids
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate search over the rows of a LocalIndex.
+
+    Rows are clustered around `nlist` centroids; a query scores only the
+    rows in the `nprobe` lists whose centroids are closest to it, so query
+    time grows with N / nlist * nprobe rather than N. Each build is stored
+    as flat arrays (centroids, row ids grouped by list, list offsets,
+    per-row assignments) that are memory-mapped on load. Rows added after
+    a build are assigned to the nearest centroid and appended to the
+    assignment file, then kept in small per-list tails until the next build.
+    """
+
+    def __init__(self, path: str, dimension: int):
+        self.path = path
+        self.dimension = dimension
+        self.nlist = 0
+        self.build = 0
+        self.generation = None
+        self.built_rows = 0
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._tails: Dict[int, List[int]] = {}
+        self._tail_arrays: Dict[int, np.ndarray] = {}
+        self.assigned_rows = 0
+        self._load()
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def tail_rows(self) -> int:
+        return self.assigned_rows - self.built_rows
+
+    def _file(self, name: str, build: Optional[int] = None) -> str:
+        return os.path.join(self.path, f"ivf.{self.build if build is None else build}.{name}")
+
+    def _load(self):
+        meta_path = os.path.join(self.path, ANN_META_FILE)
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.nlist = meta['nlist']
+        self.build = meta['build']
+        self.generation = meta['generation']
+        self.built_rows = meta['built_rows']
+        self.centroids = np.fromfile(self._file("centroids.f32"), dtype=np.float32).reshape(self.nlist, self.dimension)
+        self._lists = np.memmap(self._file("lists.i32"), dtype=np.int32, mode='r') if self.built_rows else np.empty(0, np.int32)
+        self._offsets = np.fromfile(self._file("offsets.i64"), dtype=np.int64)
+        assignments = np.fromfile(self._file("assign.i32"), dtype=np.int32)
+        self.assigned_rows = len(assignments)
+        for offset, list_id in enumerate(assignments[self.built_rows:]):
+            self._tails.setdefault(int(list_id), []).append(self.built_rows + offset)
+
+    def train(self, matrix: np.ndarray, generation: int, nlist: Optional[int] = None,
+              sample_size: int = 256, reuse_centroids: bool = False):
+        """
+        Cluster `matrix` (all rows of the local index) and write a new build
+        """
+        count = len(matrix)
+        if reuse_centroids and self.trained:
+            centroids = self.centroids
+        else:
+            nlist = nlist or max(1, int(4 * np.sqrt(count)))
+            nlist = min(nlist, count)
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(rng.choice(count, min(count, nlist * sample_size), replace=False))
+            centroids = spherical_kmeans(np.asarray(matrix[sample_rows], dtype=np.float32), nlist)
+        assignments = nearest_centroids(centroids, matrix)
+        lists = np.argsort(assignments, kind='stable').astype(np.int32)
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=len(centroids)))
+
+        build = self.build + 1
+        centroids.astype(np.float32).tofile(self._file("centroids.f32", build))
+        lists.tofile(self._file("lists.i32", build))
+        offsets.tofile(self._file("offsets.i64", build))
+        assignments.tofile(self._file("assign.i32", build))
+        meta_path = os.path.join(self.path, ANN_META_FILE)
+        with open(meta_path + ".tmp", 'w') as f:
+            json.dump({'nlist': len(centroids), 'build': build, 'generation': generation, 'built_rows': count}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        old_build = self.build
+        self._tails = {}
+        self._tail_arrays = {}
+        self._load()
+        for name in ("centroids.f32", "lists.i32", "offsets.i64", "assign.i32"):
+            old_path = self._file(name, old_build)
+            if old_build != self.build and os.path.exists(old_path):
+                os.remove(old_path)
+        logging.info(f"Built IVF index with {self.nlist} lists over {count} vectors")
+
+    def add(self, first_row: int, vectors: np.ndarray):
+        """
+        Assign rows first_row.. to their nearest lists
+        """
+        if first_row != self.assigned_rows:
+            raise ValueError(f"IVF index expected row {self.assigned_rows}, got {first_row}")
+        assignments = nearest_centroids(self.centroids, vectors)
+        with open(self._file("assign.i32"), 'ab') as f:
+            f.write(assignments.tobytes())
+        for offset, list_id in enumerate(assignments):
+            self._tails.setdefault(int(list_id), []).append(first_row + offset)
+            self._tail_arrays.pop(int(list_id), None)
+        self.assigned_rows += len(assignments)
+
+    def _list_rows(self, list_id: int) -> np.ndarray:
+        rows = self._lists[self._offsets[list_id]:self._offsets[list_id + 1]]
+        if list_id in self._tails:
+            if list_id not in self._tail_arrays:
+                self._tail_arrays[list_id] = np.array(self._tails[list_id], dtype=np.int32)
+            rows = np.concatenate([rows, self._tail_arrays[list_id]])
+        return rows
+
+    def candidates(self, query: np.ndarray, nprobe: int, mask: np.ndarray, min_candidates: int) -> np.ndarray:
+        """
+        Rows from the `nprobe` closest lists that pass `mask`. More lists are
+        probed while fewer than `min_candidates` rows pass, so selective
+        filters still fill top_k.
+        """
+        order = np.argsort(-(self.centroids @ query))
+        parts = []
+        found = 0
+        for probed, list_id in enumerate(order):
+            if probed >= nprobe and found >= min_candidates:
+                break
+            rows = self._list_rows(int(list_id))
+            rows = rows[mask[rows]]
+            parts.append(rows)
+            found += len(rows)
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+
+def recall_report(index, queries: np.ndarray, top_k: int = 10, nprobes=(1, 2, 4, 8, 16, 32),
+                  filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Compare IVF search against exact search: recall@top_k and latency per nprobe
+    """
+    def timed(**kwargs):
+        results, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            response = index.query(query, top_k=top_k, filter=filter, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append([match.id for match in response.matches])
+        return results, np.array(latencies)
+
+    def row(name, value, results, latencies):
+        hits = sum(len(set(found) & set(expected)) for found, expected in zip(results, exact))
+        total = sum(len(expected) for expected in exact)
+        return {
+            name: value,
+            'recall': hits / total if total else 1.0,
+            'mean_ms': float(latencies.mean()),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+        }
+
+    exact, exact_latencies = timed(exact=True)
+    report = [row('nprobe', 'exact', exact, exact_latencies)]
+    for nprobe in nprobes:
+        results, latencies = timed(nprobe=nprobe)
+        report.append(row('nprobe', nprobe, results, latencies))
+    return report
+
+def main():
+    from pdf2pinecone.local_index import LocalIndex
+    parser = argparse.ArgumentParser(description="Measure IVF recall and latency against exact search on a local index")
+    parser.add_argument('index_path', type=str, help='Path to a local index directory')
+    parser.add_argument('--queries', type=int, default=200, help='Number of sampled query vectors')
+    parser.add_argument('--top-k', type=int, default=10, help='Results per query')
+    parser.add_argument('--noise', type=float, default=0.05, help='Gaussian noise added to sampled vectors')
+    parser.add_argument('--nlist', type=int, help='Rebuild the IVF index with this many lists first')
+    parser.add_argument('--category', type=str, help='Filter queries by category')
+    args = parser.parse_args()
+
+    index = LocalIndex(args.index_path)
+    if args.nlist or not index.ann_trained:
+        index.build_ann(args.nlist)
+    vectors = index.sample_vectors(args.queries)
+    rng = np.random.default_rng(0)
+    queries = normalize(vectors + rng.normal(scale=args.noise, size=vectors.shape)).astype(np.float32)
+    filter_dict = {"category": {"$eq": args.category}} if args.category else None
+    print(f"{'nprobe':>8} {'recall':>8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for row in recall_report(index, queries, args.top_k, filter=filter_dict):
+        print(f"{row['nprobe']:>8} {row['recall']:>8.3f} {row['mean_ms']:>9.3f} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import random
+import asyncio
+import inspect
+import logging
+from typing import List, Dict, Any, Iterable, Optional, Callable
+from pdf2pinecone.metrics import metrics
+from pdf2pinecone.embeddings import EMBEDDING_MODEL, DEFAULT_BATCH_SIZE, DEFAULT_BATCH_TOKENS, embed_texts, make_batches
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average with bursts up to `capacity`
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0):
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to the endpoint (AIMD): every `limit`
+    successes raise it by one up to `max_limit`; a throttling response
+    (429 / 5xx) halves it, down to `min_limit`
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, initial: Optional[int] = None):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = initial or self.max_limit
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes = 0
+
+    def on_throttle(self):
+        self.limit = max(self.min_limit, self.limit // 2)
+        self._successes = 0
+
+def error_status(exc: Exception) -> Optional[int]:
+    """
+    HTTP status of an OpenAI / Pinecone / HTTP client error, if it carries one
+    """
+    for attr in ('status_code', 'status'):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int):
+            return status
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(response, 'status', None)
+    return status if isinstance(status, int) else None
+
+def is_throttle(exc: Exception) -> bool:
+    status = error_status(exc)
+    return status is not None and (status == 429 or status >= 500)
+
+def is_retryable(exc: Exception) -> bool:
+    if is_throttle(exc) or isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    # Client-side connection failures from openai / httpx carry no status
+    return error_status(exc) is None and type(exc).__name__ in (
+        'APIConnectionError', 'APITimeoutError', 'ConnectError', 'ReadTimeout', 'RemoteProtocolError'
+    )
+
+def retry_after(exc: Exception) -> Optional[float]:
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+class Endpoint:
+    """
+    Rate limit, adaptive concurrency and retry policy for one remote call
+    (embeddings or upserts). `call` accepts sync callables, which run in a
+    worker thread, and coroutine functions.
+    """
+
+    def __init__(self, name: str, rate: float, max_concurrency: int, max_retries: int = 5,
+                 base_delay: float = 0.5, max_delay: float = 30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.throttled = 0
+
+    async def call(self, fn: Callable, *args, **kwargs):
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                async with self.limiter:
+                    if inspect.iscoroutinefunction(fn):
+                        result = await fn(*args, **kwargs)
+                    else:
+                        result = await asyncio.to_thread(fn, *args, **kwargs)
+                self.limiter.on_success()
+                return result
+            except Exception as e:
+                if is_throttle(e):
+                    self.throttled += 1
+                    self.limiter.on_throttle()
+                    metrics.inc('throttled_total', endpoint=self.name)
+                if attempt >= self.max_retries or not is_retryable(e):
+                    metrics.inc('request_errors_total', endpoint=self.name)
+                    raise
+                # Exponential backoff with full jitter, or the server's Retry-After
+                delay = retry_after(e) or random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                metrics.inc('retries_total', endpoint=self.name)
+                logging.warning(f"{self.name.capitalize()} request failed ({str(e)}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+class UploadReport:
+    def __init__(self):
+        self.upserted_ids: List[str] = []
+        self.upserted_batches = 0
+        self.embedding_requests = 0
+        self.retries = 0
+        self.failures: List[Dict[str, Any]] = []
+
+    @property
+    def failed_chunks(self) -> int:
+        return sum(len(failure['chunks']) for failure in self.failures)
+
+    def write_failures(self, path: str):
+        """
+        Write failed batches as JSON lines so `load_failures` can replay them;
+        removes a stale file when nothing failed
+        """
+        if not self.failures:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        with open(path, 'w') as f:
+            for failure in self.failures:
+                f.write(json.dumps(failure) + "\n")
+
+def load_failures(path: str) -> List[Dict[str, Any]]:
+    """
+    Chunks from failed batches written by UploadReport.write_failures
+    """
+    chunks = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                chunks.extend(json.loads(line)['chunks'])
+    return chunks
+
+class AsyncUploader:
+    """
+    asyncio embed-and-upsert engine.
+
+    Chunks are packed into embedding requests (see embeddings.make_batches)
+    and each embedded batch is split into upsert batches. Embedding and
+    upsert calls go through separate Endpoints, each with its own token
+    bucket, adaptive concurrency limit and jittered retries, so many batches
+    are in flight at once and 429 / 5xx responses slow the engine down
+    instead of dropping work. Batches that still fail are returned in the
+    report for replay.
+    """
+
+    def __init__(self, index, client=None, model: str = EMBEDDING_MODEL, cache=None,
+                 embedding_batch_size: int = DEFAULT_BATCH_SIZE,
+                 embedding_batch_tokens: int = DEFAULT_BATCH_TOKENS, upsert_batch_size: int = 100,
+                 embed_rate: float = 50, upsert_rate: float = 20, embed_concurrency: int = 4,
+                 upsert_concurrency: int = 4, max_retries: int = 5, base_delay: float = 0.5,
+                 max_pending: Optional[int] = None):
+        self.index = index
+        self.client = client
+        self.model = model
+        self.cache = cache
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_batch_tokens = embedding_batch_tokens
+        self.upsert_batch_size = upsert_batch_size
+        self.embed_rate = embed_rate
+        self.upsert_rate = upsert_rate
+        self.embed_concurrency = embed_concurrency
+        self.upsert_concurrency = upsert_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_pending = max_pending or 2 * embed_concurrency
+        self.embeddings: Optional[Endpoint] = None
+        self.upserts: Optional[Endpoint] = None
+
+    async def _embed(self, batch: List[Dict[str, Any]], report: UploadReport) -> Dict[str, List[float]]:
+        texts = [chunk['text'] for chunk in batch]
+        cached = self.cache.get_many(self.model, texts) if self.cache is not None else [None] * len(batch)
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        if missing:
+            report.embedding_requests += 1
+            fresh = await self.embeddings.call(embed_texts, [texts[i] for i in missing], self.client, self.model)
+            if self.cache is not None:
+                self.cache.put_many(self.model, [texts[i] for i in missing], fresh)
+            for i, embedding in zip(missing, fresh):
+                cached[i] = embedding
+        return {chunk['id']: embedding for chunk, embedding in zip(batch, cached)}
+
+    async def _upsert(self, vectors: List[Dict[str, Any]], chunks: List[Dict[str, Any]],
+                      report: UploadReport, on_upserted, on_vectors=None):
+        try:
+            with metrics.timer('upsert_seconds'):
+                await self.upserts.call(self.index.upsert, vectors=vectors)
+        except Exception as e:
+            logging.error(f"Error uploading batch to Pinecone: {str(e)}")
+            report.failures.append({'stage': 'upsert', 'error': str(e), 'chunks': chunks})
+            metrics.inc('failed_chunks_total', len(chunks), stage='upsert')
+            return
+        metrics.observe('upsert_batch_size', len(vectors))
+        metrics.inc('upserted_vectors_total', len(vectors))
+        ids = [vector['id'] for vector in vectors]
+        report.upserted_ids.extend(ids)
+        report.upserted_batches += 1
+        if on_vectors:
+            on_vectors(vectors)
+        if on_upserted:
+            on_upserted(ids)
+
+    async def _process(self, batch: List[Dict[str, Any]], report: UploadReport, on_upserted, on_vectors=None):
+        try:
+            embeddings = await self._embed(batch, report)
+        except Exception as e:
+            logging.error(f"Error generating embeddings for {len(batch)} chunks: {str(e)}")
+            report.failures.append({'stage': 'embed', 'error': str(e), 'chunks': batch})
+            metrics.inc('failed_chunks_total', len(batch), stage='embed')
+            return
+        vectors = [{'id': chunk['id'], 'values': embeddings[chunk['id']], 'metadata': chunk['metadata']}
+                   for chunk in batch]
+        by_id = {chunk['id']: chunk for chunk in batch}
+        await asyncio.gather(*(
+            self._upsert(vectors[i:i + self.upsert_batch_size],
+                         [by_id[v['id']] for v in vectors[i:i + self.upsert_batch_size]], report, on_upserted,
+                         on_vectors)
+            for i in range(0, len(vectors), self.upsert_batch_size)
+        ))
+
+    async def run(self, chunks: Iterable[Dict[str, Any]], on_upserted=None, on_vectors=None) -> UploadReport:
+        """
+        Embed and upsert `chunks`, which may be a lazy (even blocking)
+        iterator; at most `max_pending` embedding batches are in flight, so
+        a slow endpoint pushes back on the producer. `on_upserted` gets the
+        ids and `on_vectors` the vectors of every batch once it is stored.
+        """
+        # asyncio primitives belong to the running loop, so each run gets fresh endpoints
+        self.embeddings = Endpoint("embedding", self.embed_rate, self.embed_concurrency,
+                                   self.max_retries, self.base_delay)
+        self.upserts = Endpoint("upsert", self.upsert_rate, self.upsert_concurrency, self.max_retries, self.base_delay)
+        report = UploadReport()
+        batches = iter(make_batches(chunks, self.embedding_batch_size, self.embedding_batch_tokens))
+        pending = set()
+        while True:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            while len(pending) >= self.max_pending:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.add(asyncio.create_task(self._process(batch, report, on_upserted, on_vectors)))
+        if pending:
+            await asyncio.gather(*pending)
+        report.retries = self.embeddings.retries + self.upserts.retries
+        logging.info(f"Upserted {len(report.upserted_ids)} vectors in {report.upserted_batches} batches "
+                     f"({report.embedding_requests} embedding requests, {report.retries} retries, "
+                     f"{report.failed_chunks} chunks failed)")
+        return report
+
+    def upload(self, chunks: Iterable[Dict[str, Any]], on_upserted=None, on_vectors=None) -> UploadReport:
+        return asyncio.run(self.run(chunks, on_upserted, on_vectors))
@@ -0,0 +1,186 @@
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator
+import numpy as np
+from pdf2pinecone.lexical_index import is_keyword_query
+from pdf2pinecone.metrics import metrics
+
+def load_queries(path: str) -> List[Dict[str, Any]]:
+    """
+    Queries from a JSONL file ({"query": ..., optional "id", "category",
+    "top_k", "relevant"}) or a text file with one query per line
+    """
+    queries = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            item = json.loads(line) if line.startswith('{') else {'query': line}
+            if not item.get('query'):
+                raise ValueError(f"{path}:{number}: missing 'query'")
+            item.setdefault('id', str(len(queries) + 1))
+            queries.append(item)
+    return queries
+
+def load_judgments(path: str) -> Dict[str, set]:
+    """
+    Relevant filenames or chunk ids per query id (or query text) from a JSONL
+    file of {"id" or "query": ..., "relevant": [...]}
+    """
+    judgments = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                judgments[str(item.get('id', item.get('query')))] = set(item['relevant'])
+    return judgments
+
+def score_ranking(ranked: List[str], relevant: set, top_k: int) -> Dict[str, float]:
+    """
+    recall@top_k and reciprocal rank of the first relevant result; `ranked`
+    may repeat keys (several chunks of one report), each counted once
+    """
+    seen = list(dict.fromkeys(ranked[:top_k]))
+    found = [key for key in seen if key in relevant]
+    rank = next((position for position, key in enumerate(seen, 1) if key in relevant), None)
+    return {
+        'recall': len(found) / len(relevant) if relevant else 0.0,
+        'reciprocal_rank': 1 / rank if rank else 0.0,
+    }
+
+def run_batch(session, queries: List[Dict[str, Any]], workers: int = 8, top_k: int = 5,
+              mode: Optional[str] = None, judgments: Optional[Dict[str, set]] = None,
+              judge_by: str = 'filename') -> Iterator[Dict[str, Any]]:
+    """
+    Search every query with up to `workers` in flight and yield one record
+    per query, in input order.
+
+    Query embeddings are requested up front in as few batched calls as the
+    embedding limits allow (keyword-like queries are skipped in 'auto' mode,
+    and 'keyword' mode embeds only on fallback), so the concurrent phase is
+    index and lexical lookups only. Relevance comes from each query's
+    "relevant" list or `judgments`, matched on result `judge_by` (a metadata
+    field such as 'filename', or 'id' for chunk ids).
+    """
+    mode = mode or session.config['SEARCH_MODE']
+    judgments = judgments or {}
+    # The whole run's embeddings, which may outnumber the session's query cache
+    embeddings: Dict[str, List[float]] = {}
+    if mode != 'keyword':
+        texts = [item['query'] for item in queries if mode != 'auto' or not is_keyword_query(item['query'])]
+        start = time.perf_counter()
+        requests = session.embed_many(texts, embeddings=embeddings)
+        logging.info(f"Embedded {len(set(texts))} distinct queries with {requests} requests "
+                     f"in {time.perf_counter() - start:.2f}s")
+
+    def search(position: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        k = int(item.get('top_k') or top_k)
+        record = {'id': str(item.get('id', position + 1)), 'query': item['query'], 'category': item.get('category'), 'top_k': k}
+        start = time.perf_counter()
+        try:
+            results = session.search(item['query'], top_k=k, category=item.get('category'), mode=mode,
+                                     embeddings=embeddings)
+        except Exception as e:
+            results = None
+            record['error'] = str(e)
+        record['latency_ms'] = (time.perf_counter() - start) * 1000
+        if results is None:
+            record.setdefault('error', 'query embedding failed')
+            record['results'] = []
+        else:
+            record['results'] = [{
+                'id': match.id,
+                'score': match.score,
+                'filename': (match.metadata or {}).get('filename'),
+                'category': (match.metadata or {}).get('category'),
+                'chunk_index': (match.metadata or {}).get('chunk_index'),
+                'page_start': (match.metadata or {}).get('page_start'),
+            } for match in results.matches]
+        relevant = item.get('relevant')
+        if relevant is None:
+            relevant = judgments.get(record['id'], judgments.get(item['query']))
+        if relevant is not None:
+            ranked = [result['id'] if judge_by == 'id' else result.get(judge_by) for result in record['results']]
+            record.update(score_ranking(ranked, set(relevant), k))
+        return record
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for position, item in enumerate(queries):
+            # Bounded window: submit ahead of the writer, not the whole file
+            pending.append(executor.submit(search, position, item))
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def summarize(records: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    latencies = np.array([record['latency_ms'] for record in records]) if records else np.zeros(1)
+    judged = [record for record in records if 'recall' in record]
+    summary = {
+        'queries': len(records),
+        'errors': sum(1 for record in records if 'error' in record),
+        'elapsed_s': elapsed,
+        'queries_per_s': len(records) / elapsed if elapsed else None,
+        'mean_ms': float(latencies.mean()),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+    }
+    if judged:
+        summary['judged'] = len(judged)
+        summary['recall'] = float(np.mean([record['recall'] for record in judged]))
+        summary['mrr'] = float(np.mean([record['reciprocal_rank'] for record in judged]))
+    return summary
+
+def main(argv: Optional[List[str]] = None):
+    from pdf2pinecone.search_session import SearchSession
+    parser = argparse.ArgumentParser(description="Run a file of search queries concurrently and write JSONL results")
+    parser.add_argument('queries', type=str, help='JSONL ({"query", "category", "top_k", "relevant"}) or one query per line')
+    parser.add_argument('--output', type=str, help='Results JSONL (default: stdout)')
+    parser.add_argument('--judgments', type=str, help='JSONL of {"id" or "query", "relevant": [...]} for recall@k and MRR')
+    parser.add_argument('--judge-by', type=str, default='filename', help="Result field relevance is judged on ('filename' or 'id')")
+    parser.add_argument('--top-k', type=int, default=5, help='Results per query unless the query sets top_k')
+    parser.add_argument('--category', type=str, choices=['incident', 'accident'], help='Category for queries that set none')
+    parser.add_argument('--mode', type=str, choices=['auto', 'hybrid', 'keyword', 'vector'], help='Search mode (default: SEARCH_MODE)')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent searches')
+    parser.add_argument('--summary', type=str, help='Also write the summary JSON here')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    queries = load_queries(args.queries)
+    if args.category:
+        for item in queries:
+            item.setdefault('category', args.category)
+    judgments = load_judgments(args.judgments) if args.judgments else None
+    session = SearchSession()
+    metrics_file, trace_file = session.config['METRICS_FILE'], session.config['TRACE_FILE']
+    if metrics_file or trace_file:
+        metrics.enable(tracing=bool(trace_file))
+    session.index
+    out = open(args.output, 'w') if args.output else sys.stdout
+    records = []
+    start = time.perf_counter()
+    try:
+        for record in run_batch(session, queries, args.workers, args.top_k, args.mode, judgments, args.judge_by):
+            out.write(json.dumps(record) + "\n")
+            records.append({key: value for key, value in record.items() if key != 'results'})
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    summary = summarize(records, time.perf_counter() - start)
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if metrics_file or trace_file:
+        metrics.export(metrics_file, trace_file)
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
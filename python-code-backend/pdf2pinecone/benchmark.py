@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import glob
+import random
+import hashlib
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from types import SimpleNamespace
+from typing import List, Dict, Any, Callable
+import fitz
+import numpy as np
+from pdf2pinecone.pdf_utils import extract_pages, join_pages
+from pdf2pinecone.pinecone_utils import generate_embedding
+from pdf2pinecone.chunker import iter_chunks
+from pdf2pinecone.embeddings import make_batches, embed_texts, DEFAULT_BATCH_TOKENS
+from pdf2pinecone.local_index import LocalIndex
+from pdf2pinecone.lexical_index import tokenize
+from pdf2pinecone.dedup import DuplicateDetector
+
+OPERATORS = ["IndiGo", "SpiceJet", "Air India", "Vistara", "Akasa Air", "Alliance Air", "GoFirst", "Blue Dart"]
+AIRCRAFT = ["A320neo", "A321", "B737-800", "B787-8", "ATR 72-600", "Q400", "A319", "B777-300ER"]
+AIRPORTS = ["Delhi", "Mumbai", "Bengaluru", "Chennai", "Kolkata", "Hyderabad", "Goa", "Pune", "Jaipur", "Patna"]
+PHASES = ["takeoff roll", "initial climb", "cruise", "descent", "approach", "landing roll", "taxi"]
+EVENTS = [
+    "an engine failure", "a bird strike", "a hard landing", "a runway excursion", "a tail strike",
+    "smoke in the cabin", "a hydraulic system failure", "a TCAS resolution advisory", "a go-around",
+    "a cabin pressurisation problem", "a landing gear malfunction", "a fuel imbalance", "severe turbulence",
+]
+FINDINGS = [
+    "The crew did not follow the standard operating procedures for the {phase}.",
+    "Maintenance records showed the {part} had been replaced {days} days before the occurrence.",
+    "Weather at {airport} was reported as visibility {vis} metres with {wind} knot crosswind.",
+    "The flight data recorder indicated a vertical acceleration of {g} g at touchdown.",
+    "Air traffic control cleared the aircraft for the {phase} at {time} UTC.",
+    "The {part} was sent to the manufacturer for a detailed strip examination.",
+    "The pilot in command had {hours} hours of flying experience, {type_hours} on type.",
+    "Cabin crew reported the event to the flight deck and prepared the cabin for evacuation.",
+]
+PARTS = ["No. 2 engine", "main landing gear", "nose wheel steering actuator", "pitot probe", "APU",
+         "hydraulic pump", "fuel control unit", "cabin pressure controller", "brake assembly"]
+SECTIONS = ["SYNOPSIS", "FACTUAL INFORMATION", "ANALYSIS", "CONCLUSIONS", "SAFETY RECOMMENDATIONS"]
+FOREWORD = (
+    "FOREWORD In accordance with Annex 13 to the Convention on International Civil Aviation Organization (ICAO) "
+    "and Rule 3 of Aircraft (Investigation of Accidents and Incidents) Rules 2017, the sole objective of the "
+    "investigation of an accident or incident shall be the prevention of accidents and incidents and not to "
+    "apportion blame or liability. The investigation conducted in accordance with the provisions of the above "
+    "said rules shall be separate from any judicial or administrative proceedings to apportion blame or "
+    "liability. This document has been prepared based upon the evidences collected during the investigation, "
+    "opinion obtained from the experts and laboratory examination of various components. Consequently, the use "
+    "of this report for any purpose other than for the prevention of future accidents or incidents could lead "
+    "to erroneous interpretations. Information contained in this report may be used by the operator, the "
+    "regulator and other stakeholders for the purpose of improving flight safety, and extracts may be published "
+    "provided that the source is duly acknowledged. Report {report}. "
+    "GLOSSARY OF ABBREVIATIONS " + " ".join([
+        "AAIB Aircraft Accident Investigation Bureau", "AGL Above Ground Level", "AME Aircraft Maintenance Engineer",
+        "AMSL Above Mean Sea Level", "AOC Air Operator Certificate", "APU Auxiliary Power Unit",
+        "ATC Air Traffic Control", "ATPL Airline Transport Pilot Licence", "CAR Civil Aviation Requirements",
+        "CPL Commercial Pilot Licence", "CVR Cockpit Voice Recorder", "DFDR Digital Flight Data Recorder",
+        "DGCA Directorate General of Civil Aviation", "ECAM Electronic Centralised Aircraft Monitor",
+        "EGPWS Enhanced Ground Proximity Warning System", "FDR Flight Data Recorder", "FO First Officer",
+        "FOD Foreign Object Debris", "ICAO International Civil Aviation Organization", "ILS Instrument Landing System",
+        "IST Indian Standard Time", "MEL Minimum Equipment List", "METAR Meteorological Aerodrome Report",
+        "NOTAM Notice to Airmen", "PF Pilot Flying", "PIC Pilot in Command", "PM Pilot Monitoring",
+        "QRH Quick Reference Handbook", "RWY Runway", "SOP Standard Operating Procedure",
+        "TCAS Traffic Collision Avoidance System", "UTC Coordinated Universal Time", "VMC Visual Meteorological Conditions",
+    ]) + ". "
+    "All timings in this report are in UTC unless otherwise specified. The investigation was carried out by the "
+    "investigation team appointed by the Director General, Aircraft Accident Investigation Bureau, and the team "
+    "examined the aircraft, the maintenance records, the crew records, the recorder data, the weather reports and "
+    "the air traffic control transcripts. The operator, the manufacturer and the regulator were given the "
+    "opportunity to comment on the draft report and their comments have been considered where appropriate. "
+    "Safety recommendations made in this report do not create a presumption of blame or liability."
+)
+
+def registration(rng: random.Random) -> str:
+    return "VT-" + "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(3))
+
+def report_text(rng: random.Random, category: str, number: int, pages: int) -> List[str]:
+    """
+    Page texts of one synthetic DGCA-style investigation report
+    """
+    reg = registration(rng)
+    operator = rng.choice(OPERATORS)
+    aircraft = rng.choice(AIRCRAFT)
+    airport = rng.choice(AIRPORTS)
+    event = rng.choice(EVENTS)
+    title = (f"FINAL INVESTIGATION REPORT ON {category.upper()} INVOLVING {operator.upper()} {aircraft} "
+             f"AIRCRAFT {reg} AT {airport.upper()} (REPORT NO. {category[:3].upper()}/{2015 + number % 10}/{number:04d})")
+    # Every report opens with the same foreword and glossary, as DGCA's do
+    page_texts = [FOREWORD.format(report=f"{category[:3].upper()}/{2015 + number % 10}/{number:04d}")]
+    for page in range(pages):
+        lines = [title] if page == 0 else []
+        lines.append(SECTIONS[min(page * len(SECTIONS) // pages, len(SECTIONS) - 1)])
+        lines.append(f"On the day of the occurrence, {operator} {aircraft} {reg} experienced {event} during "
+                     f"{rng.choice(PHASES)} at {airport}.")
+        for _ in range(rng.randint(18, 26)):
+            lines.append(rng.choice(FINDINGS).format(
+                phase=rng.choice(PHASES), part=rng.choice(PARTS), days=rng.randint(2, 400), airport=airport,
+                vis=rng.choice([800, 1500, 3000, 5000]), wind=rng.randint(5, 30), g=round(rng.uniform(1.2, 3.1), 2),
+                time=f"{rng.randint(0, 23):02d}{rng.randint(0, 59):02d}", hours=rng.randint(1500, 15000),
+                type_hours=rng.randint(200, 5000)))
+        page_texts.append(" ".join(lines))
+    return page_texts
+
+def generate_corpus(root: str, reports: int = 40, pages: int = 6, seed: int = 0) -> Dict[str, str]:
+    """
+    Write synthetic incident and accident report PDFs under root/incident
+    and root/accident (same layout as the scrapers' download folders).
+    The same arguments always produce the same text. Returns the folders.
+    """
+    rng = random.Random(seed)
+    folders = {category: os.path.join(root, category) for category in ('incident', 'accident')}
+    for number in range(reports):
+        category = 'incident' if number % 2 == 0 else 'accident'
+        os.makedirs(folders[category], exist_ok=True)
+        path = os.path.join(folders[category], f"{category}_report_{number:04d}.pdf")
+        page_texts = report_text(rng, category, number, rng.randint(max(1, pages // 2), pages * 3 // 2))
+        if os.path.exists(path):
+            continue
+        doc = fitz.open()
+        for text in page_texts:
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 545, 792), text, fontsize=9)
+        doc.save(path)
+        doc.close()
+    return folders
+
+class FakeEmbedder:
+    """
+    Deterministic stand-in for the OpenAI client (`client.embeddings.create`).
+
+    Texts are embedded by the hashing trick over their tokens, so texts that
+    share words get similar vectors and query results are meaningful.
+    `latency` seconds are slept per request to model network time.
+    """
+
+    def __init__(self, dimension: int = 256, latency: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency
+        self.requests = 0
+        self.embeddings = self
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in tokenize(text):
+            digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'little')
+            vector[digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def create(self, input, model: str):
+        if self.latency:
+            time.sleep(self.latency)
+        self.requests += 1
+        texts = [input] if isinstance(input, str) else input
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=self._vector(text))
+                                     for i, text in enumerate(texts)])
+
+class StageTimer:
+    """
+    Per-call latencies and item counts for one benchmarked stage
+    """
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.items = 0
+
+    def time(self, fn: Callable, *args, items: int = 1, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.latencies.append(time.perf_counter() - start)
+        self.items += items
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = np.array(self.latencies) * 1000
+        total = float(latencies.sum()) / 1000
+        if not len(latencies):
+            return {'calls': 0, 'items': 0}
+        return {
+            'calls': len(latencies),
+            'items': self.items,
+            'total_s': total,
+            'items_per_s': self.items / total if total else None,
+            'mean_ms': float(latencies.mean()),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p90_ms': float(np.percentile(latencies, 90)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'max_ms': float(latencies.max()),
+        }
+
+QUERIES = [
+    ("engine failure during takeoff roll", None), ("bird strike on approach", None),
+    ("hard landing vertical acceleration", 'accident'), ("runway excursion in heavy rain", 'accident'),
+    ("smoke in the cabin evacuation", None), ("hydraulic pump failure", 'incident'),
+    ("TCAS resolution advisory", 'incident'), ("landing gear malfunction", None),
+    ("crew did not follow standard operating procedures", None), ("fuel control unit replaced", None),
+]
+
+def run_benchmark(corpus: str, dimension: int = 256, chunk_tokens: int = 640, chunk_overlap_tokens: int = 64,
+                  embedding_batch_size: int = 256, upsert_batch_size: int = 100, queries: int = 200,
+                  embed_latency: float = 0.0, dedup_threshold: float = 0.9) -> Dict[str, Any]:
+    """
+    Time each ingest stage, as the pipeline runs them, over every PDF under
+    `corpus`/incident and `corpus`/accident, then `queries` searches.
+    Embeddings come from the fake embedder; the upsert stage writes the
+    vectors the embedding stage produced to a LocalIndex in a scratch folder,
+    which the queries then search.
+    """
+    stages = {name: StageTimer() for name in (
+        'extract_pages', 'join_pages', 'iter_chunks', 'deduplicate', 'embedding', 'upsert', 'query')}
+    client = FakeEmbedder(dimension, embed_latency)
+    detector = DuplicateDetector(dedup_threshold)
+    files = sorted(glob.glob(os.path.join(corpus, '*', '*.pdf')))
+    pdf_bytes = 0
+    with tempfile.TemporaryDirectory() as scratch:
+        index = LocalIndex(scratch, dimension)
+        for path in files:
+            category = os.path.basename(os.path.dirname(path))
+            folder, filename = os.path.split(path)
+            pdf_bytes += os.path.getsize(path)
+            with open(path, 'rb') as f:
+                sha256 = hashlib.sha256(f.read()).hexdigest()
+            pages = stages['extract_pages'].time(extract_pages, path, items=0)
+            stages['extract_pages'].items += len(pages)
+            text, page_starts = stages['join_pages'].time(join_pages, pages, items=0)
+            stages['join_pages'].items += len(text)
+            if not text:
+                continue
+            chunks = stages['iter_chunks'].time(
+                lambda: list(iter_chunks(text, filename, folder, category, sha256, chunk_tokens,
+                                         chunk_overlap_tokens, True, page_starts)), items=0)
+            stages['iter_chunks'].items += len(chunks)
+            chunks, _ = stages['deduplicate'].time(detector.deduplicate, chunks, items=len(chunks))
+            vectors = []
+            for batch in make_batches(chunks, embedding_batch_size):
+                embeddings = stages['embedding'].time(embed_texts, [chunk['text'] for chunk in batch], client,
+                                                      items=len(batch))
+                vectors.extend({'id': chunk['id'], 'values': values, 'metadata': chunk['metadata']}
+                               for chunk, values in zip(batch, embeddings))
+            for start in range(0, len(vectors), upsert_batch_size):
+                batch = vectors[start:start + upsert_batch_size]
+                stages['upsert'].time(index.upsert, batch, items=len(batch))
+        stored = index.describe_index_stats()['total_vector_count']
+        query_rng = random.Random(0)
+        for _ in range(queries if stored else 0):
+            query, category = query_rng.choice(QUERIES)
+            filter_dict = {"category": {"$eq": category}} if category else None
+            stages['query'].time(lambda: index.query(generate_embedding(query, client), top_k=5,
+                                                     filter=filter_dict, include_metadata=True))
+    return {
+        'corpus': {'files': len(files), 'pdf_bytes': pdf_bytes, 'vectors': stored},
+        'stages': {name: timer.summary() for name, timer in stages.items()},
+        'dedup': detector.summary(embedding_batch_size, DEFAULT_BATCH_TOKENS),
+    }
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count(), 'timestamp': time.time()}
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]):
+    print(f"{'stage':<22} {'items/s before':>15} {'items/s after':>15} {'change':>8}")
+    for name, stats in current['stages'].items():
+        before = baseline.get('stages', {}).get(name, {}).get('items_per_s')
+        after = stats.get('items_per_s')
+        change = f"{(after / before - 1) * 100:+.1f}%" if before and after else "n/a"
+        print(f"{name:<22} {before or 0:>15.1f} {after or 0:>15.1f} {change:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of every pipeline stage on a synthetic corpus")
+    parser.add_argument('--corpus', type=str, help='Folder with incident/ and accident/ PDFs (a synthetic corpus is generated there if it has none, or in a temporary folder if omitted)')
+    parser.add_argument('--reports', type=int, default=40, help='Synthetic reports to generate')
+    parser.add_argument('--pages', type=int, default=6, help='Average pages per synthetic report')
+    parser.add_argument('--seed', type=int, default=0, help='Corpus generator seed')
+    parser.add_argument('--dimension', type=int, default=256, help='Fake embedding dimension')
+    parser.add_argument('--queries', type=int, default=200, help='Queries to time')
+    parser.add_argument('--embed-latency', type=float, default=0.0, help='Simulated seconds per embedding request')
+    parser.add_argument('--output', type=str, help='Write the JSON results to this file')
+    parser.add_argument('--compare', type=str, help='Earlier JSON results to compare throughput against')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        corpus = args.corpus or os.path.join(scratch, 'pdfs')
+        if not glob.glob(os.path.join(corpus, '*', '*.pdf')):
+            generate_corpus(corpus, args.reports, args.pages, args.seed)
+        results = run_benchmark(corpus, args.dimension, queries=args.queries, embed_latency=args.embed_latency)
+    results['environment'] = environment()
+    results['parameters'] = vars(args)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    summary = sys.stderr if not args.output else sys.stdout
+    print(f"\n{'stage':<22} {'items/s':>12} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}", file=summary)
+    for name, stats in results['stages'].items():
+        if stats['calls']:
+            print(f"{name:<22} {stats['items_per_s'] or 0:>12.1f} {stats['p50_ms']:>9.3f} "
+                  f"{stats['p90_ms']:>9.3f} {stats['p99_ms']:>9.3f}", file=summary)
+    dedup = results['dedup']
+    print(f"\nnear-duplicates: {dedup['duplicates']} of {dedup['chunks']} chunks, "
+          f"~{dedup['tokens_saved']} tokens and ~{dedup['requests_saved']} embedding requests saved", file=summary)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+CATALOG_FILE = "catalog.json"
+SUMMARY_FILE = "summary.json"
+COUNTS = ('documents', 'chunks', 'bytes', 'pages', 'text_chars')
+
+def page_count(pdf_path: str) -> int:
+    """
+    Number of pages in a PDF, without extracting any text
+    """
+    import fitz
+    try:
+        with fitz.open(pdf_path) as doc:
+            return len(doc)
+    except Exception as e:
+        logging.warning(f"Could not count pages of {pdf_path}: {str(e)}")
+        return 0
+
+def _empty_totals() -> Dict[str, Any]:
+    return {**{name: 0 for name in COUNTS}, 'first_ingested_at': None, 'last_ingested_at': None}
+
+def _widen(totals: Dict[str, Any], record: Dict[str, Any]):
+    first, last = record['first_ingested_at'], record['ingested_at']
+    if first and (totals['first_ingested_at'] is None or first < totals['first_ingested_at']):
+        totals['first_ingested_at'] = first
+    if last and (totals['last_ingested_at'] is None or last > totals['last_ingested_at']):
+        totals['last_ingested_at'] = last
+
+def _with_averages(totals: Dict[str, Any]) -> Dict[str, Any]:
+    documents, chunks = totals['documents'], totals['chunks']
+    return {**totals,
+            'chunks_per_document': chunks / documents if documents else 0.0,
+            'pages_per_document': totals['pages'] / documents if documents else 0.0,
+            'chars_per_chunk': totals['text_chars'] / chunks if chunks else 0.0}
+
+class CorpusCatalog:
+    """
+    Record of what the ingest pipeline has indexed, for corpus statistics.
+
+    catalog.json keeps one record per source PDF (filename, category,
+    content hash, PDF bytes, pages, chunks, chunk text characters and the
+    first and latest ingest time); summary.json keeps the totals for the
+    corpus and each category. `sync` applies only the records that changed
+    since the last run and adjusts the totals by their difference, so
+    `stats()` reads one small file and never touches the vector store or
+    the per-file records.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._files: Optional[Dict[str, Dict[str, Any]]] = None
+        self._summary: Optional[Dict[str, Any]] = None
+        self._lock = threading.RLock()
+
+    def _read(self, name: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.path, name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable catalog file {path}: {str(e)}")
+            return None
+
+    def _write(self, name: str, data: Dict[str, Any]):
+        path = os.path.join(self.path, name)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(data, f, indent=1)
+        os.replace(path + ".tmp", path)
+
+    @property
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._summary is None:
+                self._summary = self._read(SUMMARY_FILE)
+                if self._summary is None:
+                    # Loading the records rebuilds the totals
+                    self.files
+            return self._summary
+
+    @property
+    def files(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            if self._files is None:
+                data = self._read(CATALOG_FILE) or {'revision': 0, 'files': {}}
+                self._files = data['files']
+                summary = self._summary or self._read(SUMMARY_FILE)
+                if summary is None or summary['revision'] != data['revision']:
+                    # Interrupted between the two writes
+                    self._summary = self._totals(self._files.values(), data['revision'])
+            return self._files
+
+    def __len__(self) -> int:
+        return self.summary['documents']
+
+    def __contains__(self, source_path: str) -> bool:
+        return source_path in self.files
+
+    def _totals(self, records, revision: int = 0) -> Dict[str, Any]:
+        summary = {**_empty_totals(), 'revision': revision, 'updated_at': None, 'categories': {}}
+        for record in records:
+            self._count(summary, record, 1)
+        return summary
+
+    def _count(self, summary: Dict[str, Any], record: Dict[str, Any], sign: int):
+        category = summary['categories'].setdefault(record['category'], _empty_totals())
+        for totals in (summary, category):
+            totals['documents'] += sign
+            for name in COUNTS[1:]:
+                totals[name] += sign * record[name]
+            if sign > 0:
+                _widen(totals, record)
+        if sign < 0 and not category['documents']:
+            del summary['categories'][record['category']]
+
+    def _retime(self):
+        """
+        Recompute first / last ingest times after records were removed
+        """
+        for totals in [self._summary, *self._summary['categories'].values()]:
+            totals['first_ingested_at'] = totals['last_ingested_at'] = None
+        for record in self._files.values():
+            _widen(self._summary, record)
+            _widen(self._summary['categories'][record['category']], record)
+
+    def clear(self):
+        with self._lock:
+            self.files.clear()
+            self._summary = self._totals([], self.summary['revision'])
+
+    def put(self, source_path: str, record: Dict[str, Any]):
+        with self._lock:
+            self.remove(source_path, retime=False)
+            self.files[source_path] = record
+            self._count(self.summary, record, 1)
+
+    def remove(self, source_path: str, retime: bool = True) -> bool:
+        with self._lock:
+            record = self.files.pop(source_path, None)
+            if record is None:
+                return False
+            self._count(self.summary, record, -1)
+            if retime:
+                self._retime()
+            return True
+
+    def _record(self, source_path: str, entry: Dict[str, Any], old: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        duplicates = entry.get('duplicates', {})
+        representatives = set(duplicates.values()) - set(duplicates)
+        return {
+            'filename': os.path.basename(source_path),
+            'category': entry['category'],
+            'sha256': entry['sha256'],
+            'bytes': entry['size'],
+            # Entries written before the counts were recorded
+            'pages': entry['pages'] if 'pages' in entry else page_count(source_path),
+            'chunks': entry.get('chunks', len(set(entry['chunk_ids']) - representatives)),
+            'text_chars': entry.get('text_chars', 0),
+            'first_ingested_at': old['first_ingested_at'] if old else entry['ingested_at'],
+            'ingested_at': entry['ingested_at'],
+        }
+
+    def sync(self, manifest) -> Tuple[int, int]:
+        """
+        Bring the catalog in line with the manifest's completed files;
+        returns the number of records (added or changed, removed)
+        """
+        with self._lock:
+            current = {path: entry for path, entry in manifest.files.items() if entry['status'] == 'complete'}
+            removed = [path for path in self.files if path not in current]
+            for path in removed:
+                self.remove(path, retime=False)
+            changed = 0
+            for path, entry in current.items():
+                old = self.files.get(path)
+                if old and old['sha256'] == entry['sha256'] and old['ingested_at'] == entry['ingested_at']:
+                    continue
+                self.put(path, self._record(path, entry, old))
+                changed += 1
+            if removed:
+                self._retime()
+            if changed or removed:
+                self.save()
+            return changed, len(removed)
+
+    def save(self):
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            summary = self.summary
+            summary['revision'] += 1
+            summary['updated_at'] = time.time()
+            self._write(CATALOG_FILE, {'revision': summary['revision'], 'files': self.files})
+            self._write(SUMMARY_FILE, summary)
+
+    def stats(self, category: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Totals for the corpus, with per-category totals under 'categories',
+        or for one category
+        """
+        summary = self.summary
+        if category is not None:
+            return _with_averages(summary['categories'].get(category, _empty_totals()))
+        return {**_with_averages({name: value for name, value in summary.items() if name != 'categories'}),
+                'categories': {name: _with_averages(totals) for name, totals in sorted(summary['categories'].items())}}
+
+    def list_files(self, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Per-file records, most recently ingested first
+        """
+        records = [{'source_path': path, **record} for path, record in self.files.items()
+                   if category is None or record['category'] == category]
+        return sorted(records, key=lambda record: record['ingested_at'] or 0, reverse=True)
+
+def _format_time(timestamp: Optional[float]) -> str:
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(timestamp)) if timestamp else '-'
+
+def main():
+    from pdf2pinecone.config import load_config
+    from pdf2pinecone.manifest import IngestManifest
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Corpus statistics from the ingest catalog")
+    parser.add_argument('--index-name', type=str, default=config['INDEX_NAME'], help='Index the catalog belongs to')
+    parser.add_argument('--category', type=str, choices=['incident', 'accident'], help='Only this category')
+    parser.add_argument('--files', action='store_true', help='List every cataloged file')
+    parser.add_argument('--json', action='store_true', help='Print JSON')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the catalog from the ingest manifest first')
+    args = parser.parse_args()
+    catalog = CorpusCatalog(os.path.join(config['CATALOG_DIR'], args.index_name))
+    if args.rebuild:
+        catalog.clear()
+        catalog.sync(IngestManifest(config['MANIFEST_PATH']))
+    if args.files:
+        records = catalog.list_files(args.category)
+        if args.json:
+            print(json.dumps(records, indent=2))
+            return
+        for record in records:
+            print(f"{_format_time(record['ingested_at'])}  {record['category']:<9} {record['pages']:>5} pages "
+                  f"{record['chunks']:>6} chunks {record['bytes'] / 1024:>9.1f} KB  {record['filename']}")
+        return
+    stats = catalog.stats(args.category)
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return
+    rows = [(args.category or 'total', stats)]
+    if args.category is None:
+        rows = list(stats['categories'].items()) + rows
+    print(f"{'':<9} {'documents':>9} {'chunks':>8} {'pages':>7} {'MB':>9}  last ingested")
+    for name, totals in rows:
+        print(f"{name:<9} {totals['documents']:>9} {totals['chunks']:>8} {totals['pages']:>7} "
+              f"{totals['bytes'] / (1024 * 1024):>9.1f}  {_format_time(totals['last_ingested_at'])}")
+
+if __name__ == "__main__":
+    main()
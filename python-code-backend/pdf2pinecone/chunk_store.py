@@ -0,0 +1,226 @@
+import os
+import re
+import mmap
+import zlib
+import struct
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+OFFSETS_FILE = "offsets.idx"
+# segment, offset, compressed length, raw length; segment DELETED marks a tombstone
+RECORD = struct.Struct("<IQII")
+ID_LENGTH = struct.Struct("<H")
+DELETED = 0xFFFFFFFF
+SEGMENT_PATTERN = re.compile(r"^segment\.(\d+)\.dat$")
+
+def strip_text(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Drop the chunk text from each chunk's vector metadata (it stays in
+    chunk['text'] for embedding and lives in the ChunkStore afterwards)
+    """
+    for chunk in chunks:
+        chunk['metadata'] = {key: value for key, value in chunk['metadata'].items() if key != 'text'}
+    return chunks
+
+class ChunkStore:
+    """
+    Local store for chunk text, so vector metadata only carries small fields.
+
+    Texts are zlib-compressed one record at a time and appended to segment
+    files (segment.N.dat, rolled over at `max_segment_bytes`); an append-only
+    offsets file maps each chunk id to (segment, offset, length) and is
+    loaded into a dict on open. Reads go through memory-mapped segments and
+    `get_many` sorts lookups by position, so hydrating a page of search
+    results touches each segment sequentially. Deletes append tombstones;
+    `compact` rewrites live records into new segments once most of the
+    stored bytes are dead.
+    """
+
+    def __init__(self, path: str, max_segment_bytes: int = 256 * 1024 * 1024, level: int = 6):
+        self.path = path
+        self.max_segment_bytes = max_segment_bytes
+        self.level = level
+        self._lock = threading.RLock()
+        self._maps: Dict[int, mmap.mmap] = {}
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, f"segment.{segment}.dat")
+
+    def _load(self):
+        self._offsets: Dict[str, Tuple[int, int, int, int]] = {}
+        self.dead_bytes = 0
+        segments = [int(m.group(1)) for m in map(SEGMENT_PATTERN.match, os.listdir(self.path)) if m]
+        self._segment = max(segments, default=0)
+        sizes = {segment: os.path.getsize(self._segment_path(segment)) for segment in segments}
+        offsets_path = os.path.join(self.path, OFFSETS_FILE)
+        if not os.path.exists(offsets_path):
+            return
+        with open(offsets_path, 'rb') as f:
+            data = f.read()
+        position = 0
+        while position + ID_LENGTH.size <= len(data):
+            (id_length,) = ID_LENGTH.unpack_from(data, position)
+            end = position + ID_LENGTH.size + id_length + RECORD.size
+            if end > len(data):
+                # A torn final record from an interrupted write
+                break
+            chunk_id = data[position + ID_LENGTH.size:position + ID_LENGTH.size + id_length].decode()
+            record = RECORD.unpack_from(data, end - RECORD.size)
+            position = end
+            if record[0] == DELETED:
+                self._discard(chunk_id)
+            elif record[1] + record[2] <= sizes.get(record[0], 0):
+                self._discard(chunk_id)
+                self._offsets[chunk_id] = record
+        if position != len(data):
+            with open(offsets_path, 'r+b') as f:
+                f.truncate(position)
+
+    def _discard(self, chunk_id: str):
+        old = self._offsets.pop(chunk_id, None)
+        if old is not None:
+            self.dead_bytes += old[2]
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._offsets
+
+    @property
+    def stored_bytes(self) -> int:
+        return sum(record[2] for record in self._offsets.values())
+
+    @property
+    def raw_bytes(self) -> int:
+        return sum(record[3] for record in self._offsets.values())
+
+    def add(self, chunks: Iterable[Dict[str, Any]]):
+        """
+        Store chunk['text'] for each chunk produced by create_chunks
+        """
+        self.put_many([(chunk['id'], chunk['text']) for chunk in chunks])
+
+    def put_many(self, items: List[Tuple[str, str]]):
+        if not items:
+            return
+        with self._lock:
+            records = self._append([(chunk_id, text.encode()) for chunk_id, text in items])
+            self._write_offsets(records, 'ab')
+
+    def _append(self, items: List[Tuple[str, bytes]]) -> List[Tuple[str, Tuple[int, int, int, int]]]:
+        records = []
+        segment_path = self._segment_path(self._segment)
+        offset = os.path.getsize(segment_path) if os.path.exists(segment_path) else 0
+        f = open(segment_path, 'ab')
+        try:
+            for chunk_id, raw in items:
+                if offset >= self.max_segment_bytes:
+                    f.close()
+                    self._segment += 1
+                    offset = 0
+                    f = open(self._segment_path(self._segment), 'ab')
+                data = zlib.compress(raw, self.level)
+                f.write(data)
+                records.append((chunk_id, (self._segment, offset, len(data), len(raw))))
+                offset += len(data)
+            # Segment bytes reach disk before the offsets that point at them
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        return records
+
+    def _write_offsets(self, records: List[Tuple[str, Tuple[int, int, int, int]]], mode: str):
+        offsets_path = os.path.join(self.path, OFFSETS_FILE)
+        target = offsets_path if mode == 'ab' else offsets_path + ".tmp"
+        with open(target, mode) as f:
+            for chunk_id, record in records:
+                encoded = chunk_id.encode()
+                f.write(ID_LENGTH.pack(len(encoded)) + encoded + RECORD.pack(*record))
+        if mode != 'ab':
+            os.replace(target, offsets_path)
+        for chunk_id, record in records:
+            self._discard(chunk_id)
+            if record[0] != DELETED:
+                self._offsets[chunk_id] = record
+
+    def _segment_map(self, segment: int, end: int) -> mmap.mmap:
+        view = self._maps.get(segment)
+        if view is None or len(view) < end:
+            # Remap once the segment has grown past the mapped size
+            if view is not None:
+                view.close()
+            with open(self._segment_path(segment), 'rb') as f:
+                view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = view
+        return view
+
+    def get_many(self, ids: List[str]) -> List[Optional[str]]:
+        """
+        Texts for `ids` (None for unknown ids), read in segment order
+        """
+        results: List[Optional[str]] = [None] * len(ids)
+        with self._lock:
+            wanted = sorted((self._offsets[chunk_id], i) for i, chunk_id in enumerate(ids) if chunk_id in self._offsets)
+            for (segment, offset, length, _), i in wanted:
+                view = self._segment_map(segment, offset + length)
+                results[i] = zlib.decompress(view[offset:offset + length]).decode()
+        return results
+
+    def get(self, chunk_id: str) -> Optional[str]:
+        return self.get_many([chunk_id])[0]
+
+    def hydrate(self, matches: List[Any], field: str = 'text') -> List[Any]:
+        """
+        Fill metadata[field] of query matches from the store in one bulk
+        read; matches whose metadata already carries the text are left alone
+        """
+        missing = [match for match in matches if match.metadata is not None and not match.metadata.get(field)]
+        for match, text in zip(missing, self.get_many([match.id for match in missing])):
+            if text is not None:
+                match.metadata[field] = text
+        return matches
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            targets = [chunk_id for chunk_id in ids if chunk_id in self._offsets]
+            if not targets:
+                return
+            self._write_offsets([(chunk_id, (DELETED, 0, 0, 0)) for chunk_id in targets], 'ab')
+            if self.dead_bytes > max(self.stored_bytes, 1024 * 1024):
+                self.compact()
+
+    def compact(self):
+        """
+        Rewrite live records into fresh segments and drop the old ones
+        """
+        with self._lock:
+            old_segments = sorted({record[0] for record in self._offsets.values()} |
+                                  {int(m.group(1)) for m in map(SEGMENT_PATTERN.match, os.listdir(self.path)) if m})
+            live = sorted(self._offsets.items(), key=lambda item: item[1])
+            items = []
+            for chunk_id, (segment, offset, length, _) in live:
+                view = self._segment_map(segment, offset + length)
+                items.append((chunk_id, zlib.decompress(view[offset:offset + length])))
+            self._segment = max(old_segments, default=0) + 1
+            records = self._append(items) if items else []
+            self._offsets = {}
+            self._write_offsets(records, 'wb')
+            self.dead_bytes = 0
+            for view in self._maps.values():
+                view.close()
+            self._maps = {}
+            for segment in old_segments:
+                if os.path.exists(self._segment_path(segment)):
+                    os.remove(self._segment_path(segment))
+            logging.info(f"Compacted chunk store to {len(records)} records in {self._segment_path(self._segment)}")
+
+    def close(self):
+        with self._lock:
+            for view in self._maps.values():
+                view.close()
+            self._maps = {}
@@ -0,0 +1,114 @@
+import os
+import hashlib
+from bisect import bisect_right
+from typing import List, Dict, Any, Tuple, Optional, Iterator, Callable
+import numpy as np
+
+WHITESPACE = np.array([c for c in range(0x3001) if chr(c).isspace()], dtype=np.uint32)
+SENTENCE_MARKS = np.array([ord(c) for c in '.!?'], dtype=np.uint32)
+CLOSERS = np.array([ord(c) for c in '"\')]'], dtype=np.uint32)
+
+def chunk_id(file_hash: str, start: int, end: int) -> str:
+    """
+    Stable chunk id: the same file content chunked the same way always
+    yields the same ids, independent of the file's name or location
+    """
+    return hashlib.md5(f"{file_hash}:{start}:{end}".encode()).hexdigest()
+
+def word_spans(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Character offsets [start, end) of every whitespace-separated word,
+    the same words as text.split()
+    """
+    codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    space = np.isin(codes, WHITESPACE)
+    edges = np.diff(np.concatenate(([1], space.view(np.int8), [1])))
+    return np.flatnonzero(edges == -1), np.flatnonzero(edges == 1)
+
+def iter_chunks(text: str, filename: str, pdf_folder: str, category: str, file_hash: str,
+                max_tokens: int = 640, overlap_tokens: int = 64, align_sentences: bool = True,
+                page_starts: Optional[List[Tuple[int, int]]] = None,
+                count_tokens: Optional[Callable[[str], float]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield chunks of `text` (cleaned, single-spaced, as from pdf_utils.join_pages)
+    in one pass over its words.
+
+    Words are located once as character offsets and their token costs
+    accumulated into a prefix sum, so each chunk boundary is a binary
+    search and a chunk's text is one slice of `text`. A chunk ends before
+    the word that would push it past `max_tokens`; with `align_sentences`
+    it ends at the last sentence end in its second half instead, when there
+    is one. The next chunk starts with up to `overlap_tokens` of the
+    previous one (from a sentence start when aligned). Chunks have the same
+    shape as create_chunks' (including page_start / page_end when
+    `page_starts` is given), with ids derived from `file_hash` and offsets.
+    Each word costs (len + 1) / 4 tokens, the same ~4 characters per token
+    as embeddings.estimate_tokens, unless `count_tokens` is given.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError(f"overlap_tokens ({overlap_tokens}) must be smaller than max_tokens ({max_tokens})")
+    starts, ends = word_spans(text)
+    count = len(starts)
+    if not count:
+        return
+    if count_tokens is None:
+        tokens = (ends - starts + 1) / 4
+    else:
+        tokens = np.fromiter((count_tokens(text[a:b]) for a, b in zip(starts, ends)), dtype=np.float64, count=count)
+    cumulative = np.concatenate(([0.0], np.cumsum(tokens)))
+    sentence_ends = np.empty(0, dtype=np.int64)
+    if align_sentences:
+        codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        last = codes[ends - 1]
+        before = codes[np.maximum(ends - 2, starts)]
+        sentence_ends = np.flatnonzero(np.isin(last, SENTENCE_MARKS) |
+                                       (np.isin(last, CLOSERS) & np.isin(before, SENTENCE_MARKS) & (ends - starts > 1)))
+    page_offsets = [offset for offset, _ in page_starts] if page_starts else None
+    source_path = os.path.join(pdf_folder, filename)
+    first = 0
+    covered = 0
+    chunk_index = 0
+    while True:
+        # Words [first, end) fit the budget; every chunk takes at least one
+        # word past the previous one, even when that word alone overflows
+        # it, and drops the overlap when the next word does not fit after it
+        end = int(np.searchsorted(cumulative, cumulative[first] + max_tokens, 'right')) - 1
+        if end <= covered and first < covered:
+            first = covered
+            end = int(np.searchsorted(cumulative, cumulative[first] + max_tokens, 'right')) - 1
+        end = max(end, covered + 1)
+        cut = end
+        if end < count and len(sentence_ends):
+            i = int(np.searchsorted(sentence_ends, end, 'left')) - 1
+            if i >= 0 and sentence_ends[i] >= max(first + (end - first) // 2, covered):
+                cut = int(sentence_ends[i]) + 1
+        start_char, end_char = int(starts[first]), int(ends[cut - 1])
+        chunk_text = text[start_char:end_char]
+        chunk_data = {
+            'id': chunk_id(file_hash, start_char, end_char),
+            'text': chunk_text,
+            'metadata': {
+                'filename': filename,
+                'category': category,
+                'chunk_index': chunk_index,
+                'word_count': cut - first,
+                'char_count': len(chunk_text),
+                'source_path': source_path,
+                'text': chunk_text
+            }
+        }
+        if page_offsets:
+            chunk_data['metadata']['page_start'] = page_starts[max(bisect_right(page_offsets, first) - 1, 0)][1]
+            chunk_data['metadata']['page_end'] = page_starts[max(bisect_right(page_offsets, cut - 1) - 1, 0)][1]
+        yield chunk_data
+        if end >= count:
+            return
+        chunk_index += 1
+        covered = cut
+        # Overlap: the trailing words of this chunk that fit in overlap_tokens
+        keep = int(np.searchsorted(cumulative, cumulative[cut] - overlap_tokens, 'left'))
+        if len(sentence_ends):
+            i = int(np.searchsorted(sentence_ends, keep - 1, 'left'))
+            if i < len(sentence_ends) and sentence_ends[i] + 1 < cut:
+                keep = int(sentence_ends[i]) + 1
+        first = max(keep, first + 1)
@@ -11,7 +11,58 @@ def load_config():
             'incident': os.getenv('INCIDENT_FOLDER', './pdfs/incident'),
             'accident': os.getenv('ACCIDENT_FOLDER', './pdfs/accident')
         },
+        'VECTOR_STORE': os.getenv('VECTOR_STORE', 'pinecone'),
+        'LOCAL_INDEX_DIR': os.getenv('LOCAL_INDEX_DIR', './local_index'),
+        'ANN_MIN_ROWS': int(os.getenv('ANN_MIN_ROWS', 10000)),
+        'ANN_NLIST': int(os.getenv('ANN_NLIST', 0)),
+        'ANN_NPROBE': int(os.getenv('ANN_NPROBE', 8)),
+        'LOCAL_QUANTIZATION': os.getenv('LOCAL_QUANTIZATION', ''),
+        'LOCAL_RESCORE': int(os.getenv('LOCAL_RESCORE', 4)),
+        'LOCAL_SHARDS': int(os.getenv('LOCAL_SHARDS', 1)),
+        'LOCAL_SHARD_BY': os.getenv('LOCAL_SHARD_BY', ''),
+        'LOCAL_QUERY_WORKERS': int(os.getenv('LOCAL_QUERY_WORKERS', 0)),
+        'LEXICAL_INDEX_DIR': os.getenv('LEXICAL_INDEX_DIR', './lexical_index'),
+        'CHUNK_STORE_DIR': os.getenv('CHUNK_STORE_DIR', ''),
+        'DEDUP_THRESHOLD': float(os.getenv('DEDUP_THRESHOLD', 0)),
+        'DEDUP_DIR': os.getenv('DEDUP_DIR', './near_duplicates'),
+        'SIMILAR_REPORTS_DIR': os.getenv('SIMILAR_REPORTS_DIR', './similar_reports'),
+        'SIMILAR_REPORTS_K': int(os.getenv('SIMILAR_REPORTS_K', 10)),
+        'CATALOG_DIR': os.getenv('CATALOG_DIR', './corpus_catalog'),
+        'SEARCH_MODE': os.getenv('SEARCH_MODE', 'auto'),
+        'QUERY_CACHE_SIZE': int(os.getenv('QUERY_CACHE_SIZE', 1024)),
+        'QUERY_CACHE_TTL': float(os.getenv('QUERY_CACHE_TTL', 3600)),
+        'QUERY_CACHE_DIR': os.getenv('QUERY_CACHE_DIR', './.query_cache'),
+        'RESULT_CHUNKS_PER_REPORT': int(os.getenv('RESULT_CHUNKS_PER_REPORT', 1)),
+        'RESULT_MAX_CANDIDATES': int(os.getenv('RESULT_MAX_CANDIDATES', 200)),
+        'SNIPPET_CHARS': int(os.getenv('SNIPPET_CHARS', 500)),
         'INDEX_NAME': os.getenv('INDEX_NAME', 'dgca-reports'),
         'CHUNK_SIZE': int(os.getenv('CHUNK_SIZE', 500)),
         'CHUNK_OVERLAP': int(os.getenv('CHUNK_OVERLAP', 50)),
+        'CHUNK_TOKENS': int(os.getenv('CHUNK_TOKENS', 0)),
+        'CHUNK_OVERLAP_TOKENS': int(os.getenv('CHUNK_OVERLAP_TOKENS', 64)),
+        'CHUNK_ALIGN_SENTENCES': os.getenv('CHUNK_ALIGN_SENTENCES', 'true').lower() in ('1', 'true', 'yes'),
+        'EXTRACT_WORKERS': int(os.getenv('EXTRACT_WORKERS', 2)),
+        'EXTRACT_PROCESSES': int(os.getenv('EXTRACT_PROCESSES', os.cpu_count() or 1)),
+        'PAGES_PER_TASK': int(os.getenv('PAGES_PER_TASK', 50)),
+        'EMBED_WORKERS': int(os.getenv('EMBED_WORKERS', 4)),
+        'UPSERT_WORKERS': int(os.getenv('UPSERT_WORKERS', 2)),
+        'EMBED_RATE': float(os.getenv('EMBED_RATE', 50)),
+        'UPSERT_RATE': float(os.getenv('UPSERT_RATE', 20)),
+        'MAX_RETRIES': int(os.getenv('MAX_RETRIES', 5)),
+        'FAILED_BATCHES_PATH': os.getenv('FAILED_BATCHES_PATH', './failed_batches.jsonl'),
+        'PIPELINE_BUFFER_SIZE': int(os.getenv('PIPELINE_BUFFER_SIZE', 16)),
+        'MANIFEST_PATH': os.getenv('MANIFEST_PATH', './.ingest_manifest.json'),
+        'MANIFEST_SAVE_INTERVAL': float(os.getenv('MANIFEST_SAVE_INTERVAL', 5)),
+        'METRICS_FILE': os.getenv('METRICS_FILE'),
+        'TRACE_FILE': os.getenv('TRACE_FILE'),
+        'OPENAI_BASE_URL': os.getenv('OPENAI_BASE_URL'),
+        'EMBEDDING_BACKEND': os.getenv('EMBEDDING_BACKEND', 'openai'),
+        'EMBEDDING_MODEL': os.getenv('EMBEDDING_MODEL', 'text-embedding-ada-002'),
+        'EMBEDDING_DIMENSION': int(os.getenv('EMBEDDING_DIMENSION', 0)),
+        'EMBEDDING_PROCESSES': int(os.getenv('EMBEDDING_PROCESSES', 0)),
+        'EMBEDDING_MODEL_PATH': os.getenv('EMBEDDING_MODEL_PATH', ''),
+        'EMBEDDING_BATCH_SIZE': int(os.getenv('EMBEDDING_BATCH_SIZE', 256)),
+        'EMBEDDING_BATCH_TOKENS': int(os.getenv('EMBEDDING_BATCH_TOKENS', 200000)),
+        'EMBEDDING_CACHE_DIR': os.getenv('EMBEDDING_CACHE_DIR', './.embedding_cache'),
+        'EMBEDDING_CACHE_MAX_MB': int(os.getenv('EMBEDDING_CACHE_MAX_MB', 2048)),
     }
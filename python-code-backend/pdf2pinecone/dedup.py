@@ -0,0 +1,171 @@
+import os
+import zlib
+import struct
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+import numpy as np
+from pdf2pinecone.embeddings import estimate_tokens
+
+HEADER = struct.Struct("<HH")
+SHINGLE_BASE = np.uint64(0x100000001B3)
+
+def choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    LSH bands x rows per band whose collision threshold (1/b)^(1/r) is the
+    highest one not above `threshold`, so pairs at the threshold are likely
+    to share a bucket
+    """
+    options = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    below = [option for option in options if (1 / option[0]) ** (1 / option[1]) <= threshold]
+    return max(below or options[-1:], key=lambda option: (1 / option[0]) ** (1 / option[1]))
+
+class DuplicateDetector:
+    """
+    MinHash near-duplicate detection for chunks, run before embedding.
+
+    A chunk's signature is the minimum of `num_perm` hash functions over its
+    word `shingle_size`-grams; the fraction of equal signature entries
+    estimates the Jaccard similarity of two chunks' shingle sets. Signatures
+    are bucketed by LSH bands, and a chunk whose best candidate in its
+    category reaches `threshold` becomes a reference to that candidate (its
+    representative) instead of being embedded. Representatives are
+    remembered across runs in `path` (one record per chunk id), and `load`
+    keeps only those still in the index.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 5,
+                 path: Optional[str] = None, seed: int = 0):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.path = path
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._signatures: List[np.ndarray] = []
+        self._buckets: List[Dict[Tuple[str, bytes], List[int]]] = [{} for _ in range(self.bands)]
+        self.chunks = 0
+        self.duplicates = 0
+        self.tokens_saved = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        words = text.lower().split()
+        if not words:
+            return np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        hashes = np.fromiter((zlib.crc32(word.encode()) for word in words), dtype=np.uint64, count=len(words))
+        size = min(self.shingle_size, len(words))
+        shingles = np.zeros(len(words) - size + 1, dtype=np.uint64)
+        for offset in range(size):
+            shingles = shingles * SHINGLE_BASE + hashes[offset:len(hashes) - size + 1 + offset]
+        shingles = np.unique(shingles)
+        # Multiply-shift hashing; uint64 arithmetic wraps
+        permuted = (shingles[:, None] * self._a + self._b) >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, category: str, signature: np.ndarray) -> List[Tuple[str, bytes]]:
+        return [(category, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)]
+
+    def _find(self, keys: List[Tuple[str, bytes]], signature: np.ndarray) -> Optional[int]:
+        candidates = {position for band, key in enumerate(keys) for position in self._buckets[band].get(key, ())}
+        best, best_similarity = None, self.threshold
+        for position in candidates:
+            similarity = float(np.mean(self._signatures[position] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = position, similarity
+        return best
+
+    def _add(self, chunk_id: str, keys: List[Tuple[str, bytes]], signature: np.ndarray):
+        position = len(self._ids)
+        self._ids.append(chunk_id)
+        self._signatures.append(signature)
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, []).append(position)
+
+    def deduplicate(self, chunks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        """
+        Split `chunks` into those to embed and a {duplicate id: representative
+        id} map; the kept chunks become representatives for later ones
+        """
+        signatures = [self.signature(chunk['text']) for chunk in chunks]
+        unique, references, added = [], {}, []
+        with self._lock:
+            for chunk, signature in zip(chunks, signatures):
+                category = chunk['metadata'].get('category') or ''
+                keys = self._band_keys(category, signature)
+                position = self._find(keys, signature)
+                if position is not None and self._ids[position] != chunk['id']:
+                    references[chunk['id']] = self._ids[position]
+                    self.tokens_saved += estimate_tokens(chunk['text'])
+                    continue
+                unique.append(chunk)
+                if position is None:
+                    self._add(chunk['id'], keys, signature)
+                    added.append((chunk['id'], category, signature))
+            self.chunks += len(chunks)
+            self.duplicates += len(references)
+            if self.path and added:
+                self._write(added, self.path, 'ab')
+        return unique, references
+
+    def _write(self, records: List[Tuple[str, str, np.ndarray]], path: str, mode: str):
+        with open(path, mode) as f:
+            for chunk_id, category, signature in records:
+                encoded_id, encoded_category = chunk_id.encode(), category.encode()
+                f.write(HEADER.pack(len(encoded_id), len(encoded_category)) + encoded_id + encoded_category +
+                        signature.tobytes())
+
+    def load(self, live_ids: Iterable[str]):
+        """
+        Read representatives saved by earlier runs, keeping those whose ids
+        are in `live_ids`, and rewrite the file without the rest
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+        live = set(live_ids)
+        signature_bytes = self.num_perm * 4
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        kept = []
+        dropped = 0
+        position = 0
+        while position + HEADER.size <= len(data):
+            id_length, category_length = HEADER.unpack_from(data, position)
+            start = position + HEADER.size
+            end = start + id_length + category_length + signature_bytes
+            if end > len(data):
+                # A torn final record from an interrupted write
+                break
+            chunk_id = data[start:start + id_length].decode()
+            category = data[start + id_length:start + id_length + category_length].decode()
+            position = end
+            if chunk_id in live:
+                signature = np.frombuffer(data, dtype=np.uint32, count=self.num_perm,
+                                          offset=end - signature_bytes).copy()
+                kept.append((chunk_id, category, signature))
+            else:
+                dropped += 1
+        with self._lock:
+            for chunk_id, category, signature in kept:
+                self._add(chunk_id, self._band_keys(category, signature), signature)
+        if dropped or position != len(data):
+            self._write(kept, self.path + ".tmp", 'wb')
+            os.replace(self.path + ".tmp", self.path)
+        logging.info(f"Loaded {len(kept)} near-duplicate representatives from {self.path}")
+
+    def summary(self, embedding_batch_size: int, embedding_batch_tokens: int) -> Dict[str, int]:
+        """
+        Embedding inputs, estimated tokens and requests, and vectors saved
+        """
+        requests = max(self.duplicates / max(embedding_batch_size, 1), self.tokens_saved / max(embedding_batch_tokens, 1))
+        return {
+            'chunks': self.chunks,
+            'duplicates': self.duplicates,
+            'vectors_saved': self.duplicates,
+            'tokens_saved': self.tokens_saved,
+            'requests_saved': int(np.ceil(requests)) if self.duplicates else 0,
+        }
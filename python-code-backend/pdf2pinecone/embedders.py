@@ -0,0 +1,186 @@
+import os
+import zlib
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional
+import numpy as np
+import openai
+from pdf2pinecone.embeddings import EMBEDDING_MODEL
+from pdf2pinecone.lexical_index import tokenize
+
+BACKENDS = ('openai', 'hashing', 'local-model')
+OPENAI_DIMENSIONS = {
+    'text-embedding-ada-002': 1536,
+    'text-embedding-3-small': 1536,
+    'text-embedding-3-large': 3072,
+}
+
+class Embedder(ABC):
+    """
+    Embedding backend with the OpenAI client's call shape
+    (`embedder.embeddings.create(input=..., model=...)`), so it can be passed
+    wherever a client is expected, plus the `model` name that embedding
+    caches are keyed by and the vector `dimension` an index needs.
+    Subclasses implement `embed`.
+    """
+
+    model: str
+    dimension: int
+
+    def __init__(self):
+        self.embeddings = self
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        pass
+
+    def create(self, input, model: Optional[str] = None):
+        texts = [input] if isinstance(input, str) else list(input)
+        vectors = self.embed(texts)
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=vector.tolist())
+                                     for i, vector in enumerate(vectors)])
+
+    def close(self):
+        pass
+
+class OpenAIEmbedder(Embedder):
+    """
+    The OpenAI embeddings API; the client is created on first use
+    """
+
+    def __init__(self, model: str = EMBEDDING_MODEL, dimension: Optional[int] = None, client=None,
+                 api_key: Optional[str] = None, base_url: Optional[str] = None):
+        super().__init__()
+        if not (dimension or model in OPENAI_DIMENSIONS):
+            raise ValueError(f"Unknown dimension for embedding model {model!r}; set EMBEDDING_DIMENSION")
+        self.model = model
+        self.dimension = dimension or OPENAI_DIMENSIONS[model]
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = client
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url or None)
+        return self._client
+
+    def create(self, input, model: Optional[str] = None):
+        return self.client.embeddings.create(input=input, model=model or self.model)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        data = sorted(self.create(texts).data, key=lambda item: item.index)
+        return np.array([item.embedding for item in data], dtype=np.float32)
+
+def hash_features(texts: List[str], dimension: int, ngrams: int = 2) -> np.ndarray:
+    """
+    L2-normalised signed feature hashing of word n-grams with sublinear
+    term frequency (1 + log tf), one row per text
+    """
+    rows, grams = [], []
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        features = list(tokens)
+        for n in range(2, ngrams + 1):
+            features.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        grams.extend(features)
+        rows.append(np.full(len(features), row, dtype=np.uint64))
+    matrix = np.zeros((len(texts), dimension), dtype=np.float32)
+    if not grams:
+        return matrix
+    hashes = np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams))
+    keys, counts = np.unique((np.concatenate(rows) << np.uint64(32)) | hashes, return_counts=True)
+    hashes = keys & np.uint64(0xFFFFFFFF)
+    weights = (1 + np.log(counts)) * np.where(hashes >> np.uint64(31), 1.0, -1.0)
+    cells = (keys >> np.uint64(32)) * np.uint64(dimension) + hashes % np.uint64(dimension)
+    matrix += np.bincount(cells.astype(np.int64), weights, minlength=matrix.size).reshape(matrix.shape)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+class HashingEmbedder(Embedder):
+    """
+    Offline CPU embeddings by feature hashing (see hash_features): texts
+    that share words and word pairs get similar vectors, with no model
+    download or network access. Requests of at least `min_parallel` texts
+    are split across `processes` worker processes; the vectors are
+    deterministic, so caches and indexes stay valid across runs.
+    """
+
+    def __init__(self, dimension: int = 768, ngrams: int = 2, processes: Optional[int] = None,
+                 min_parallel: int = 64):
+        super().__init__()
+        self.dimension = dimension
+        self.ngrams = ngrams
+        self.model = f"hashing-{ngrams}gram-{dimension}"
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.min_parallel = min_parallel
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.processes)
+            return self._executor
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if self.processes <= 1 or len(texts) < self.min_parallel:
+            return hash_features(texts, self.dimension, self.ngrams)
+        size = -(-len(texts) // self.processes)
+        blocks = [texts[start:start + size] for start in range(0, len(texts), size)]
+        results = self._pool().map(hash_features, blocks, [self.dimension] * len(blocks), [self.ngrams] * len(blocks))
+        return np.vstack(list(results))
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+class LocalModelEmbedder(Embedder):
+    """
+    A sentence-transformers model loaded from a local directory, run on CPU
+    in batches of `batch_size`; needs the optional sentence-transformers
+    package
+    """
+
+    def __init__(self, path: str, batch_size: int = 64, device: str = 'cpu'):
+        super().__init__()
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ValueError("EMBEDDING_BACKEND=local-model needs the sentence-transformers package")
+        if not os.path.isdir(path):
+            raise ValueError(f"Embedding model directory {path} not found")
+        self._model = SentenceTransformer(path, device=device)
+        self.model = f"local:{os.path.basename(os.path.normpath(path))}"
+        self.dimension = self._model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        # torch already spreads one batch over every core
+        with self._lock:
+            return self._model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                      normalize_embeddings=True).astype(np.float32)
+
+def make_embedder(config: Dict[str, Any], backend: Optional[str] = None) -> Embedder:
+    """
+    The embedding backend selected by EMBEDDING_BACKEND (or `backend`)
+    """
+    backend = backend or config['EMBEDDING_BACKEND']
+    if backend == 'openai':
+        return OpenAIEmbedder(config['EMBEDDING_MODEL'], config['EMBEDDING_DIMENSION'] or None,
+                              api_key=config['OPENAI_API_KEY'], base_url=config['OPENAI_BASE_URL'])
+    if backend == 'hashing':
+        return HashingEmbedder(config['EMBEDDING_DIMENSION'] or 768, processes=config['EMBEDDING_PROCESSES'] or None)
+    if backend == 'local-model':
+        if not config['EMBEDDING_MODEL_PATH']:
+            raise ValueError("EMBEDDING_BACKEND=local-model needs EMBEDDING_MODEL_PATH")
+        return LocalModelEmbedder(config['EMBEDDING_MODEL_PATH'])
+    raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {', '.join(BACKENDS)}")
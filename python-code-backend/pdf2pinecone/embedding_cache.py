@@ -0,0 +1,177 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import List, Optional, Dict
+import numpy as np
+from pdf2pinecone.metrics import metrics
+
+INDEX_FILE = "index.json"
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk embedding cache.
+
+    Vectors are appended as raw float32 rows to one file per dimension and read
+    back through a memory map; a JSON index maps sha256(model + text) to its
+    row. When the data files outgrow `max_bytes` the least recently used
+    entries are dropped and the files are compacted.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, list] = {}  # key -> [dim, row, last_used]
+        self._rows: Dict[int, int] = {}  # dim -> rows in the data file
+        self._maps: Dict[int, np.memmap] = {}
+        self._clock = 0
+        self._generation = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+    def _data_path(self, dim: int, generation: Optional[int] = None) -> str:
+        generation = self._generation if generation is None else generation
+        return os.path.join(self.cache_dir, f"vectors_{dim}.{generation}.f32")
+
+    def _load(self):
+        index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        try:
+            with open(index_path) as f:
+                data = json.load(f)
+            self._entries = data['entries']
+            self._clock = data.get('clock', 0)
+            self._generation = data.get('generation', 0)
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable embedding cache index {index_path}: {str(e)}")
+            self._entries = {}
+            return
+        for dim in {entry[0] for entry in self._entries.values()}:
+            path = self._data_path(dim)
+            self._rows[dim] = os.path.getsize(path) // (dim * 4) if os.path.exists(path) else 0
+        # Drop entries whose rows did not make it to disk
+        self._entries = {k: e for k, e in self._entries.items() if e[1] < self._rows.get(e[0], 0)}
+
+    def _map(self, dim: int) -> np.memmap:
+        if dim not in self._maps:
+            self._maps[dim] = np.memmap(self._data_path(dim), dtype=np.float32, mode='r',
+                                        shape=(self._rows[dim], dim))
+        return self._maps[dim]
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        results = []
+        with self._lock:
+            for text in texts:
+                entry = self._entries.get(self.key(model, text))
+                if entry is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self.hits += 1
+                self._clock += 1
+                entry[2] = self._clock
+                self._dirty = True
+                results.append(self._map(entry[0])[entry[1]].tolist())
+        hits = sum(result is not None for result in results)
+        metrics.inc('embedding_cache_hits_total', hits)
+        metrics.inc('embedding_cache_misses_total', len(results) - hits)
+        return results
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        if not texts:
+            return
+        with self._lock:
+            new = {}
+            for text, vector in zip(texts, vectors):
+                key = self.key(model, text)
+                if key not in self._entries:
+                    new[key] = vector
+            if not new:
+                return
+            matrix = np.asarray(list(new.values()), dtype=np.float32)
+            dim = matrix.shape[1]
+            with open(self._data_path(dim), 'ab') as f:
+                f.write(matrix.tobytes())
+            start = self._rows.get(dim, 0)
+            for offset, key in enumerate(new):
+                self._clock += 1
+                self._entries[key] = [dim, start + offset, self._clock]
+            self._rows[dim] = start + len(new)
+            self._maps.pop(dim, None)
+            self._dirty = True
+            if self.max_bytes and self.size_bytes() > self.max_bytes:
+                self._evict()
+
+    def put(self, model: str, text: str, vector: List[float]):
+        self.put_many(model, [text], [vector])
+
+    def size_bytes(self) -> int:
+        return sum(rows * dim * 4 for dim, rows in self._rows.items())
+
+    def _evict(self):
+        """
+        Drop least recently used entries until the cache is at 90% of
+        max_bytes, then rewrite the data files without the dropped rows
+        """
+        target = int(self.max_bytes * 0.9)
+        live = sum(entry[0] * 4 for entry in self._entries.values())
+        evicted = 0
+        for key, entry in sorted(self._entries.items(), key=lambda item: item[1][2]):
+            if live <= target:
+                break
+            live -= entry[0] * 4
+            del self._entries[key]
+            evicted += 1
+        for dim in list(self._rows):
+            keep = sorted((e for e in self._entries.values() if e[0] == dim), key=lambda e: e[1])
+            rows = np.array([e[1] for e in keep], dtype=np.int64)
+            kept = np.array(self._map(dim)[rows]) if len(rows) else np.empty((0, dim), dtype=np.float32)
+            self._maps.pop(dim, None)
+            with open(self._data_path(dim, self._generation + 1), 'wb') as f:
+                f.write(kept.tobytes())
+            for new_row, entry in enumerate(keep):
+                entry[1] = new_row
+            self._rows[dim] = len(keep)
+        # The old files stay valid until the index points at the new generation
+        self._generation += 1
+        self._save_index()
+        for dim in self._rows:
+            old_path = self._data_path(dim, self._generation - 1)
+            if os.path.exists(old_path):
+                os.remove(old_path)
+        logging.info(f"Evicted {evicted} entries from embedding cache ({self.size_bytes()} bytes kept)")
+
+    def _save_index(self):
+        index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        with open(index_path + ".tmp", 'w') as f:
+            json.dump({'clock': self._clock, 'generation': self._generation, 'entries': self._entries}, f)
+        os.replace(index_path + ".tmp", index_path)
+        self._dirty = False
+
+    def save(self):
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'size_bytes': self.size_bytes()
+        }
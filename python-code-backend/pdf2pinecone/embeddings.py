@@ -0,0 +1,102 @@
+import logging
+from typing import List, Dict, Any, Iterator, Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import openai
+from pdf2pinecone.metrics import metrics
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_BATCH_TOKENS = 200000
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for English text (~4 characters per token)
+    """
+    return len(text) // 4 + 1
+
+def make_batches(chunks: List[Dict[str, Any]], max_inputs: int = DEFAULT_BATCH_SIZE,
+                 max_tokens: int = DEFAULT_BATCH_TOKENS,
+                 count_tokens: Callable[[str], int] = estimate_tokens) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Pack chunks into request-sized batches, keeping input order and staying
+    under both the input-count and the token budget
+    """
+    batch = []
+    batch_tokens = 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk['text'])
+        if tokens > max_tokens:
+            logging.warning(f"Chunk {chunk['id']} (~{tokens} tokens) exceeds the batch token budget; sending it alone")
+        if batch and (len(batch) >= max_inputs or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(chunk)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+def embed_texts(texts: List[str], client=None, model: str = EMBEDDING_MODEL) -> List[List[float]]:
+    """
+    Embed several texts with a single request; results follow the input order
+    """
+    client = client or openai
+    metrics.observe('embedding_batch_size', len(texts))
+    with metrics.timer('embedding_request_seconds'):
+        response = client.embeddings.create(input=texts, model=model)
+    data = sorted(response.data, key=lambda item: item.index)
+    if len(data) != len(texts):
+        raise ValueError(f"Expected {len(texts)} embeddings, got {len(data)}")
+    return [item.embedding for item in data]
+
+def generate_embeddings(chunks: List[Dict[str, Any]], client=None, model: str = EMBEDDING_MODEL,
+                        max_inputs: int = DEFAULT_BATCH_SIZE, max_tokens: int = DEFAULT_BATCH_TOKENS,
+                        max_workers: int = 4, cache=None) -> Dict[str, List[float]]:
+    """
+    Embed chunks in batched requests and map the vectors back to chunk ids.
+
+    The returned dict follows the order of `chunks`; chunks whose batch failed
+    are left out and logged. With an EmbeddingCache, only cache misses are
+    sent to the API and fresh vectors are written back to the cache.
+    """
+    cached = {}
+    if cache is not None:
+        for chunk, embedding in zip(chunks, cache.get_many(model, [chunk['text'] for chunk in chunks])):
+            if embedding is not None:
+                cached[chunk['id']] = embedding
+    pending = [chunk for chunk in chunks if chunk['id'] not in cached]
+    batches = list(make_batches(pending, max_inputs, max_tokens))
+    results: Dict[int, List[List[float]]] = {}
+
+    def embed_batch(batch_num: int, batch: List[Dict[str, Any]]):
+        try:
+            results[batch_num] = embed_texts([chunk['text'] for chunk in batch], client, model)
+        except Exception as e:
+            logging.error(f"Error generating embeddings for batch {batch_num + 1}/{len(batches)} "
+                          f"({len(batch)} chunks): {str(e)}")
+
+    if max_workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(embed_batch, i, batch) for i, batch in enumerate(batches)]
+            for future in as_completed(futures):
+                future.result()
+    else:
+        for i, batch in enumerate(batches):
+            embed_batch(i, batch)
+
+    fresh = {}
+    for i, batch in enumerate(batches):
+        if i not in results:
+            continue
+        for chunk, embedding in zip(batch, results[i]):
+            fresh[chunk['id']] = embedding
+        if cache is not None:
+            cache.put_many(model, [chunk['text'] for chunk in batch], results[i])
+    embeddings = {}
+    for chunk in chunks:
+        embedding = cached.get(chunk['id']) or fresh.get(chunk['id'])
+        if embedding is not None:
+            embeddings[chunk['id']] = embedding
+    logging.info(f"Embedded {len(embeddings)}/{len(chunks)} chunks in {len(batches)} requests "
+                 f"({len(cached)} from cache)")
+    return embeddings
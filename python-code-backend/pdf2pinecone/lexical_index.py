@@ -0,0 +1,399 @@
+import os
+import re
+import json
+import math
+import logging
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Optional, Callable
+import numpy as np
+from pdf2pinecone.local_index import Match, QueryResponse, filter_mask
+from pdf2pinecone.metrics import metrics
+
+SEGMENTS_FILE = "segments.json"
+DOCS_FILE = "docs.jsonl"
+# Chunk metadata kept per document: what filters and results need. The
+# text itself is read back from the vector index or the chunk store.
+STORED_FIELDS = ('filename', 'category', 'chunk_index', 'page_start', 'page_end')
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-/.][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens; hyphenated and slashed identifiers such as
+    aircraft registrations (vt-abc) and report numbers stay whole
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def stored_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: metadata[field] for field in STORED_FIELDS if field in metadata}
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """
+    LEB128-style variable-length encoding of non-negative integers
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return b''
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for shift in (7, 14, 21, 28, 35, 42, 49, 56, 63):
+        nbytes += values >= (np.uint64(1) << np.uint64(shift))
+    total = int(nbytes.sum())
+    starts = np.cumsum(nbytes) - nbytes
+    position = np.arange(total) - np.repeat(starts, nbytes)
+    repeated = np.repeat(values, nbytes) >> (np.uint64(7) * position.astype(np.uint64))
+    out = (repeated & np.uint64(0x7f)).astype(np.uint8)
+    out[position < np.repeat(nbytes, nbytes) - 1] |= 0x80
+    return out.tobytes()
+
+def decode_varints(buf: np.ndarray) -> np.ndarray:
+    buf = np.asarray(buf, dtype=np.uint8)
+    if len(buf) == 0:
+        return np.empty(0, dtype=np.int64)
+    ends = np.flatnonzero(buf < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    position = np.arange(len(buf)) - np.repeat(starts, ends - starts + 1)
+    values = (buf & 0x7f).astype(np.int64) << (7 * position)
+    return np.add.reduceat(values, starts)
+
+class Segment:
+    """
+    An immutable block of postings: for each term, delta-encoded doc numbers
+    followed by term frequencies, varint-compressed in one mmapped file
+    """
+
+    def __init__(self, path: str, name: str):
+        self.name = name
+        self.path = path
+        with open(os.path.join(path, f"{name}.terms.json")) as f:
+            self.terms: Dict[str, List[int]] = json.load(f)
+        postings_path = os.path.join(path, f"{name}.post")
+        if os.path.getsize(postings_path):
+            self.postings = np.memmap(postings_path, dtype=np.uint8, mode='r')
+        else:
+            self.postings = np.empty(0, dtype=np.uint8)
+
+    @property
+    def size(self) -> int:
+        return len(self.postings)
+
+    def postings_for(self, term: str):
+        entry = self.terms.get(term)
+        if entry is None:
+            return None
+        offset, length, df = entry
+        values = decode_varints(self.postings[offset:offset + length])
+        return np.cumsum(values[:df]), values[df:]
+
+    @staticmethod
+    def write(path: str, name: str, postings: Dict[str, Dict[int, int]]) -> 'Segment':
+        terms = {}
+        offset = 0
+        with open(os.path.join(path, f"{name}.post"), 'wb') as f:
+            for term in sorted(postings):
+                docs = np.array(sorted(postings[term]), dtype=np.int64)
+                tfs = np.array([postings[term][doc] for doc in docs], dtype=np.int64)
+                deltas = np.diff(docs, prepend=0)
+                data = encode_varints(np.concatenate([deltas, tfs]))
+                f.write(data)
+                terms[term] = [offset, len(data), len(docs)]
+                offset += len(data)
+        with open(os.path.join(path, f"{name}.terms.json"), 'w') as f:
+            json.dump(terms, f)
+        return Segment(path, name)
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk text, built incrementally.
+
+    Each call to `add` writes a new compressed segment; small segments are
+    merged once there are more than `max_segments`. Documents are numbered
+    globally and described in an append-only log (chunk id, length and
+    the STORED_FIELDS of its metadata); re-adding a chunk id replaces the earlier document and
+    `delete` tombstones it.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75, max_segments: int = 8):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        self._segment_counter = 0
+        self._next_doc = 0
+        self.segments: List[Segment] = []
+        segments_path = os.path.join(self.path, SEGMENTS_FILE)
+        if os.path.exists(segments_path):
+            with open(segments_path) as f:
+                state = json.load(f)
+            self._segment_counter = state['counter']
+            self._next_doc = state['next_doc']
+            self.segments = [Segment(self.path, name) for name in state['segments']]
+        self._ids: List[Optional[str]] = []
+        self._lengths: List[int] = []
+        self._metadata: List[Optional[Dict[str, Any]]] = []
+        self._docs: Dict[str, int] = {}
+        docs_path = os.path.join(self.path, DOCS_FILE)
+        if os.path.exists(docs_path):
+            with open(docs_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry['op'] == 'add':
+                        self._set_doc(entry['doc'], entry['id'], entry['len'], stored_metadata(entry['metadata']))
+                    elif entry['op'] == 'delete':
+                        self._clear_doc(entry['id'])
+        self._next_doc = max(self._next_doc, len(self._ids))
+        self._invalidate()
+
+    def _invalidate(self):
+        self._columns: Dict[str, np.ndarray] = {}
+        self._live: Optional[np.ndarray] = None
+        self._length_array: Optional[np.ndarray] = None
+
+    def _set_doc(self, doc: int, id: str, length: int, metadata: Dict[str, Any]):
+        if doc >= len(self._ids):
+            grow = doc + 1 - len(self._ids)
+            self._ids.extend([None] * grow)
+            self._lengths.extend([0] * grow)
+            self._metadata.extend([None] * grow)
+        self._clear_doc(id)
+        self._docs[id] = doc
+        self._ids[doc] = id
+        self._lengths[doc] = length
+        self._metadata[doc] = metadata
+
+    def _clear_doc(self, id: str):
+        doc = self._docs.pop(id, None)
+        if doc is not None:
+            self._ids[doc] = None
+            self._metadata[doc] = None
+
+    def _save_segments(self):
+        segments_path = os.path.join(self.path, SEGMENTS_FILE)
+        with open(segments_path + ".tmp", 'w') as f:
+            json.dump({'counter': self._segment_counter, 'next_doc': self._next_doc,
+                       'segments': [segment.name for segment in self.segments]}, f)
+        os.replace(segments_path + ".tmp", segments_path)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, chunks: List[Dict[str, Any]]):
+        """
+        Index chunks produced by create_chunks as one new segment
+        """
+        if not chunks:
+            return
+        with self._lock:
+            postings: Dict[str, Dict[int, int]] = {}
+            entries = []
+            for chunk in chunks:
+                doc = self._next_doc
+                self._next_doc += 1
+                counts = Counter(tokenize(chunk['text']))
+                for term, tf in counts.items():
+                    postings.setdefault(term, {})[doc] = tf
+                entries.append({'op': 'add', 'doc': doc, 'id': chunk['id'],
+                                'len': sum(counts.values()), 'metadata': stored_metadata(chunk['metadata'])})
+            self._segment_counter += 1
+            self.segments.append(Segment.write(self.path, f"seg{self._segment_counter}", postings))
+            self._save_segments()
+            with open(os.path.join(self.path, DOCS_FILE), 'a') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+                    self._set_doc(entry['doc'], entry['id'], entry['len'], entry['metadata'])
+            self._invalidate()
+            if len(self.segments) > self.max_segments:
+                self._merge_smallest()
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            targets = [id for id in ids if id in self._docs]
+            if not targets:
+                return
+            with open(os.path.join(self.path, DOCS_FILE), 'a') as f:
+                for id in targets:
+                    f.write(json.dumps({'op': 'delete', 'id': id}) + "\n")
+                    self._clear_doc(id)
+            self._invalidate()
+
+    def _merge_smallest(self):
+        """
+        Merge the smallest segments into one, dropping deleted documents
+        """
+        count = len(self.segments) - self.max_segments // 2
+        to_merge = sorted(self.segments, key=lambda segment: segment.size)[:count]
+        live = self._live_mask()
+        postings: Dict[str, Dict[int, int]] = {}
+        for segment in to_merge:
+            for term in segment.terms:
+                docs, tfs = segment.postings_for(term)
+                keep = live[docs]
+                if keep.any():
+                    postings.setdefault(term, {}).update(zip(docs[keep].tolist(), tfs[keep].tolist()))
+        self._segment_counter += 1
+        merged = Segment.write(self.path, f"seg{self._segment_counter}", postings)
+        names = {segment.name for segment in to_merge}
+        self.segments = [segment for segment in self.segments if segment.name not in names] + [merged]
+        self._save_segments()
+        for name in names:
+            for suffix in (".post", ".terms.json"):
+                os.remove(os.path.join(self.path, name + suffix))
+        logging.debug(f"Merged {len(to_merge)} lexical segments into {merged.name}")
+
+    def _live_mask(self) -> np.ndarray:
+        if self._live is None:
+            live = np.zeros(self._next_doc, dtype=bool)
+            live[:len(self._ids)] = [id is not None for id in self._ids]
+            self._live = live
+        return self._live
+
+    def _column(self, field: str) -> np.ndarray:
+        if field not in self._columns:
+            column = np.empty(self._next_doc, dtype=object)
+            column[:len(self._metadata)] = [m.get(field) if m is not None else None for m in self._metadata]
+            self._columns[field] = column
+        return self._columns[field]
+
+    def _doc_lengths(self) -> np.ndarray:
+        if self._length_array is None:
+            lengths = np.zeros(self._next_doc, dtype=np.float64)
+            lengths[:len(self._lengths)] = self._lengths
+            self._length_array = lengths
+        return self._length_array
+
+    def query(self, text: str, top_k: int = 10, filter: Optional[Dict[str, Any]] = None,
+              include_metadata: bool = True, **kwargs) -> QueryResponse:
+        """
+        BM25-ranked chunks for `text`, in the same shape as a vector index query
+        """
+        terms = list(dict.fromkeys(tokenize(text)))
+        with self._lock:
+            if not terms or not self._docs:
+                return QueryResponse([])
+            mask = self._live_mask().copy()
+            if filter:
+                mask &= filter_mask(self._column, filter, self._next_doc)
+            lengths = self._doc_lengths()
+            live_count = len(self._docs)
+            live = self._live_mask()
+            avgdl = lengths[live].mean() or 1.0
+            scores = np.zeros(self._next_doc, dtype=np.float64)
+            for term in terms:
+                postings = [segment.postings_for(term) for segment in self.segments]
+                postings = [p for p in postings if p is not None]
+                # Segments keep deleted documents until they are merged
+                df = sum(int(live[docs].sum()) for docs, _ in postings)
+                if not df:
+                    continue
+                idf = math.log(1 + (live_count - df + 0.5) / (df + 0.5))
+                for docs, tfs in postings:
+                    norm = self.k1 * (1 - self.b + self.b * lengths[docs] / avgdl)
+                    scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+            scores[~mask] = 0
+            hits = np.flatnonzero(scores)
+            if len(hits) > top_k:
+                hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+            hits = hits[np.argsort(-scores[hits], kind='stable')]
+            return QueryResponse([
+                Match(self._ids[doc], float(scores[doc]), dict(self._metadata[doc]) if include_metadata else None)
+                for doc in hits
+            ])
+
+def hydrate_from_index(index, matches: List[Match], field: str = 'text') -> List[Match]:
+    """
+    Fill metadata[field] of matches that lack it (lexical-only hits) from
+    the vector index metadata in one fetch
+    """
+    missing = [match for match in matches if match.metadata is not None and not match.metadata.get(field)]
+    if not missing:
+        return matches
+    response = index.fetch(ids=[match.id for match in missing])
+    vectors = response.vectors if hasattr(response, 'vectors') else response
+    for match in missing:
+        vector = vectors.get(match.id)
+        if vector is None:
+            continue
+        metadata = vector['metadata'] if isinstance(vector, dict) else vector.metadata
+        if metadata and metadata.get(field):
+            match.metadata[field] = metadata[field]
+    return matches
+
+def is_keyword_query(query: str) -> bool:
+    """
+    Queries that are lookups rather than descriptions: a quoted phrase,
+    a single word, or only identifier-like tokens (registrations, report
+    numbers, flight numbers)
+    """
+    stripped = query.strip()
+    if len(stripped) > 1 and stripped[0] == stripped[-1] == '"':
+        return True
+    tokens = tokenize(stripped)
+    if len(tokens) == 1:
+        return True
+    return bool(tokens) and all(any(c.isdigit() for c in t) or '-' in t or '/' in t for t in tokens)
+
+def reciprocal_rank_fusion(rankings: List[List[Match]], k: int = 60) -> List[Match]:
+    """
+    Fuse ranked match lists; each match scores sum(1 / (k + rank)) over the
+    lists it appears in. Metadata comes from the first list that has it.
+    """
+    fused: Dict[str, Match] = {}
+    for ranking in rankings:
+        for rank, match in enumerate(ranking, 1):
+            if match.id not in fused:
+                fused[match.id] = Match(match.id, 0.0, match.metadata)
+            elif fused[match.id].metadata is None:
+                fused[match.id].metadata = match.metadata
+            fused[match.id].score += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda match: match.score, reverse=True)
+
+def hybrid_search(query: str, index, lexical: Optional[LexicalIndex], embed: Callable[[str], Optional[List[float]]],
+                  top_k: int = 5, filter: Optional[Dict[str, Any]] = None, mode: str = 'auto',
+                  candidates: Optional[int] = None) -> Optional[QueryResponse]:
+    """
+    Search with the lexical index, the vector index, or both.
+
+    mode 'keyword' and 'auto' on keyword-like queries (see is_keyword_query)
+    answer from BM25 alone without embedding the query; 'hybrid' and 'auto'
+    otherwise fuse BM25 and vector rankings with reciprocal rank fusion;
+    'vector' (or no lexical index) is a plain vector query. Returns None if
+    the query embedding fails.
+    """
+    if lexical is None or len(lexical) == 0:
+        mode = 'vector'
+    if mode == 'auto':
+        mode = 'keyword' if is_keyword_query(query) else 'hybrid'
+    if mode == 'keyword':
+        with metrics.timer('lexical_query_seconds'):
+            results = lexical.query(query.strip().strip('"'), top_k=top_k, filter=filter)
+        if results.matches:
+            metrics.inc('searches_total', mode='keyword')
+            return results
+        mode = 'hybrid'
+    metrics.inc('searches_total', mode=mode)
+    with metrics.timer('query_embedding_seconds'):
+        embedding = embed(query)
+    if embedding is None:
+        return None
+    if mode == 'vector':
+        with metrics.timer('vector_query_seconds'):
+            return index.query(vector=embedding, top_k=top_k, include_values=False, include_metadata=True,
+                               filter=filter)
+    depth = candidates or max(top_k * 4, 20)
+    with metrics.timer('vector_query_seconds'):
+        vector_results = index.query(vector=embedding, top_k=depth, include_values=False,
+                                     include_metadata=True, filter=filter)
+    with metrics.timer('lexical_query_seconds'):
+        lexical_results = lexical.query(query, top_k=depth, filter=filter)
+    return QueryResponse(reciprocal_rank_fusion([vector_results.matches, lexical_results.matches])[:top_k])
@@ -0,0 +1,442 @@
+import os
+import json
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+import numpy as np
+from pdf2pinecone.ann import IVFIndex, normalize
+from pdf2pinecone.quantize import QuantizedVectors
+
+META_FILE = "meta.json"
+# Candidate share of the rows above which a query scores every row instead of gathering candidates
+DENSE_SCAN_FRACTION = 0.25
+
+class Match:
+    def __init__(self, id: str, score: float, metadata: Optional[Dict[str, Any]] = None,
+                 values: Optional[List[float]] = None):
+        self.id = id
+        self.score = score
+        self.metadata = metadata
+        self.values = values
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'id': self.id, 'score': self.score, 'metadata': self.metadata, 'values': self.values}
+
+class QueryResponse:
+    def __init__(self, matches: List[Match]):
+        self.matches = matches
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'matches': [match.to_dict() for match in self.matches]}
+
+def filter_mask(columns, filter: Dict[str, Any], size: int) -> np.ndarray:
+    """
+    Evaluate a Pinecone-style metadata filter ({"category": {"$eq": "incident"}},
+    $ne, $in, $nin, plain values, $and/$or) into a boolean row mask.
+    `columns(field)` returns the field's values for every row as an array.
+    """
+    mask = np.ones(size, dtype=bool)
+    for field, condition in filter.items():
+        if field in ('$and', '$or'):
+            masks = [filter_mask(columns, sub, size) for sub in condition]
+            combined = np.logical_and.reduce(masks) if field == '$and' else np.logical_or.reduce(masks)
+            mask &= combined
+            continue
+        column = columns(field)
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        for op, value in condition.items():
+            if op == '$eq':
+                mask &= column == value
+            elif op == '$ne':
+                mask &= column != value
+            elif op in ('$in', '$nin'):
+                values = set(value)
+                found = np.fromiter((v in values for v in column), dtype=bool, count=len(column))
+                mask &= found if op == '$in' else ~found
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+    return mask
+
+class LocalIndex:
+    """
+    In-process stand-in for a Pinecone index (upsert / query / delete).
+
+    Vectors are L2-normalised and stored as rows of a float32 file that is
+    memory-mapped for querying, so cosine similarity is one matrix-vector
+    product. Ids and metadata live in an append-only JSON-lines log that is
+    replayed on open; every write is on disk before the call returns.
+    Rows are never rewritten: upserting an existing id appends a new row and
+    retires the old one. Deleted rows are reclaimed by `compact`, which
+    writes a new generation of both files and switches to it atomically
+    through meta.json.
+
+    Once the index holds `ann_min_rows` vectors an IVF index (see ann.py) is
+    built and queries score only the `nprobe` closest lists; pass
+    `exact=True` to `query` for brute-force scoring.
+
+    With `quantization` ('int8' or 'binary', see quantize.py) a compact code
+    per row is kept alongside the float file: queries rank candidates by
+    their codes first and rescore only the best `rescore * top_k` against
+    the memory-mapped float rows, so just the codes need to stay resident.
+    """
+
+    def __init__(self, path: str, dimension: Optional[int] = None, ann_min_rows: Optional[int] = 10000,
+                 nlist: Optional[int] = None, nprobe: int = 8, quantization: Optional[str] = None,
+                 rescore: int = 4):
+        self.path = path
+        self.ann_min_rows = ann_min_rows
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.quantization = quantization
+        self.rescore = rescore
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if dimension and dimension != meta['dimension']:
+                raise ValueError(f"Local index {path} has dimension {meta['dimension']}, not {dimension}")
+            self.dimension = meta['dimension']
+            self._generation = meta.get('generation', 0)
+        else:
+            if not dimension:
+                raise ValueError(f"Local index {path} does not exist and no dimension was given")
+            self.dimension = dimension
+            self._generation = 0
+            self._write_meta()
+        self._load()
+        self._ann = IVFIndex(path, self.dimension)
+        self._sync_ann()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, f"vectors.{self._generation}.f32")
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.path, f"log.{self._generation}.jsonl")
+
+    def _write_meta(self):
+        meta_path = os.path.join(self.path, META_FILE)
+        with open(meta_path + ".tmp", 'w') as f:
+            json.dump({'dimension': self.dimension, 'metric': 'cosine', 'generation': self._generation}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _load(self):
+        self._rows: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._metadata: List[Optional[Dict[str, Any]]] = []
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        self._count = size // (self.dimension * 4)
+        if size % (self.dimension * 4):
+            # Drop a partial row left by an interrupted write
+            with open(self._vectors_path, 'r+b') as f:
+                f.truncate(self._count * self.dimension * 4)
+        self._ids = [None] * self._count
+        self._metadata = [None] * self._count
+        if os.path.exists(self._log_path):
+            with open(self._log_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from an interrupted write
+                        continue
+                    if entry['op'] == 'upsert' and entry['row'] < self._count:
+                        self._set_row(entry['id'], entry['row'], entry.get('metadata'))
+                    elif entry['op'] == 'delete':
+                        self._clear_row(entry['id'])
+        self._matrix = None
+        self._invalidate()
+        self._sync_codes()
+
+    def _sync_codes(self):
+        self._codes: Optional[QuantizedVectors] = None
+        if self.quantization:
+            self._codes = QuantizedVectors(self.path, self.dimension, self.quantization, self._generation)
+            self._codes.sync(self._matrix_view())
+            self._codes.remove_other_files()
+
+    def set_quantization(self, quantization: Optional[str]):
+        """
+        Switch the code used to pick rescoring candidates (None scores every
+        candidate in float32), encoding any rows the code file lacks
+        """
+        with self._lock:
+            self.quantization = quantization
+            self._sync_codes()
+
+    @property
+    def float_bytes(self) -> int:
+        return self._count * self.dimension * 4
+
+    @property
+    def quantized_bytes(self) -> int:
+        return self._codes.nbytes if self._codes is not None else 0
+
+    def _invalidate(self):
+        """
+        Drop masks and metadata columns derived from the current rows
+        """
+        self._columns: Dict[str, np.ndarray] = {}
+        self._filters: Dict[str, np.ndarray] = {}
+        self._live: Optional[np.ndarray] = None
+
+    def _set_row(self, id: str, row: int, metadata: Optional[Dict[str, Any]]):
+        old = self._rows.get(id)
+        if old is not None and old != row:
+            self._ids[old] = None
+            self._metadata[old] = None
+        self._rows[id] = row
+        self._ids[row] = id
+        self._metadata[row] = metadata or {}
+
+    def _clear_row(self, id: str):
+        row = self._rows.pop(id, None)
+        if row is not None:
+            self._ids[row] = None
+            self._metadata[row] = None
+
+    def _matrix_view(self) -> np.ndarray:
+        if self._matrix is None:
+            if self._count == 0:
+                self._matrix = np.empty((0, self.dimension), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode='r',
+                                         shape=(self._count, self.dimension))
+        return self._matrix
+
+    def _column(self, field: str) -> np.ndarray:
+        if field not in self._columns:
+            column = np.empty(self._count, dtype=object)
+            column[:] = [m.get(field) if m is not None else None for m in self._metadata]
+            self._columns[field] = column
+        return self._columns[field]
+
+    def _filter_mask(self, filter: Dict[str, Any]) -> np.ndarray:
+        key = json.dumps(filter, sort_keys=True)
+        if key not in self._filters:
+            self._filters[key] = filter_mask(self._column, filter, self._count)
+        return self._filters[key]
+
+    def _live_mask(self) -> np.ndarray:
+        if self._live is None:
+            self._live = np.fromiter((i is not None for i in self._ids), dtype=bool, count=self._count)
+        return self._live.copy()
+
+    @property
+    def ann_trained(self) -> bool:
+        return self._ann.trained and self._ann.generation == self._generation
+
+    def build_ann(self, nlist: Optional[int] = None):
+        """
+        (Re)cluster every stored row into a fresh IVF build
+        """
+        with self._lock:
+            if self._count:
+                self._ann.train(self._matrix_view(), self._generation, nlist or self.nlist)
+
+    def _sync_ann(self):
+        """
+        Build the IVF index once the store is large enough, and assign rows
+        the current build has not seen yet
+        """
+        if self.ann_min_rows is None:
+            return
+        if not self.ann_trained:
+            if len(self._rows) >= self.ann_min_rows:
+                self.build_ann()
+            return
+        if self._ann.assigned_rows < self._count:
+            first = self._ann.assigned_rows
+            self._ann.add(first, np.asarray(self._matrix_view()[first:]))
+        if self._ann.tail_rows > self._ann.built_rows:
+            # The index has doubled since the last build; re-cluster
+            self.build_ann()
+
+    def sample_vectors(self, count: int, seed: int = 0) -> np.ndarray:
+        with self._lock:
+            live = np.flatnonzero(self._live_mask())
+            rows = np.random.default_rng(seed).choice(live, min(count, len(live)), replace=False)
+            return np.array(self._matrix_view()[np.sort(rows)])
+
+    def upsert(self, vectors: List[Dict[str, Any]], **kwargs) -> Dict[str, int]:
+        if not vectors:
+            return {'upserted_count': 0}
+        with self._lock:
+            latest = {}
+            for vector in vectors:
+                latest[vector['id']] = vector
+            vectors = list(latest.values())
+            matrix = np.asarray([v['values'] for v in vectors], dtype=np.float32)
+            if matrix.ndim != 2 or matrix.shape[1] != self.dimension:
+                raise ValueError(f"Expected vectors of dimension {self.dimension}")
+            matrix = normalize(matrix).astype(np.float32)
+            rows = range(self._count, self._count + len(vectors))
+            with open(self._vectors_path, 'ab') as f:
+                f.write(matrix.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            if self._codes is not None:
+                self._codes.add(matrix)
+            self._ids.extend([None] * len(vectors))
+            self._metadata.extend([None] * len(vectors))
+            self._count += len(vectors)
+            self._matrix = None
+            with open(self._log_path, 'a') as f:
+                for row, vector in zip(rows, vectors):
+                    metadata = vector.get('metadata') or {}
+                    f.write(json.dumps({'op': 'upsert', 'id': vector['id'], 'row': row, 'metadata': metadata}) + "\n")
+                    self._set_row(vector['id'], row, metadata)
+            self._invalidate()
+            self._maybe_compact()
+            self._sync_ann()
+            return {'upserted_count': len(vectors)}
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[Dict[str, Any]] = None,
+               delete_all: bool = False, **kwargs):
+        with self._lock:
+            if delete_all:
+                targets = list(self._rows)
+            elif filter:
+                mask = filter_mask(self._column, filter, self._count) & self._live_mask()
+                targets = [self._ids[row] for row in np.flatnonzero(mask)]
+            else:
+                targets = [i for i in (ids or []) if i in self._rows]
+            if not targets:
+                return {}
+            with open(self._log_path, 'a') as f:
+                for id in targets:
+                    f.write(json.dumps({'op': 'delete', 'id': id}) + "\n")
+                    self._clear_row(id)
+            self._invalidate()
+            self._maybe_compact()
+            return {}
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            matrix = self._matrix_view()
+            return {id: {'id': id, 'values': matrix[self._rows[id]].tolist(),
+                         'metadata': self._metadata[self._rows[id]]}
+                    for id in ids if id in self._rows}
+
+    def query(self, vector: List[float], top_k: int = 10, filter: Optional[Dict[str, Any]] = None,
+              include_metadata: bool = False, include_values: bool = False, nprobe: Optional[int] = None,
+              exact: bool = False, rescore: Optional[int] = None, **kwargs) -> QueryResponse:
+        query = normalize(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            matrix = self._matrix_view()
+            ids = self._ids
+            metadata = self._metadata
+            mask = self._live_mask()
+            if filter:
+                mask &= self._filter_mask(filter)
+            if self.ann_trained and not exact:
+                # Pre-filtered IVF candidates
+                candidates = self._ann.candidates(query, nprobe or self.nprobe, mask, top_k)
+                scan_all = False
+            else:
+                candidates = np.flatnonzero(mask)
+                scan_all = len(candidates) == len(matrix)
+            codes = self._codes if not exact else None
+        if top_k <= 0 or len(candidates) == 0:
+            return QueryResponse([])
+        shortlist = top_k * (rescore or self.rescore)
+        if codes is not None and len(candidates) > shortlist:
+            # Rank by the compact codes, rescore the best in float32
+            approximate = codes.scores(query, None if scan_all else candidates)
+            best = np.argpartition(-approximate, shortlist - 1)[:shortlist]
+            candidates = np.sort(candidates[best])
+            scan_all = False
+        if scan_all:
+            scores = matrix @ query
+        elif len(candidates) >= len(matrix) * DENSE_SCAN_FRACTION:
+            # Scoring every row in place is cheaper than copying most of them out
+            scores = (matrix @ query)[candidates]
+        else:
+            scores = matrix[candidates] @ query
+        top = np.argpartition(-scores, top_k - 1)[:top_k] if top_k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        matches = []
+        # Upserts and deletes clear rows in place while scoring runs unlocked;
+        # skip rows retired since the mask was taken
+        with self._lock:
+            for position in top:
+                row = candidates[position]
+                if ids[row] is None:
+                    continue
+                matches.append(Match(
+                    ids[row],
+                    float(scores[position]),
+                    dict(metadata[row]) if include_metadata else None,
+                    matrix[row].tolist() if include_values else None
+                ))
+        return QueryResponse(matches)
+
+    def describe_index_stats(self, **kwargs) -> Dict[str, Any]:
+        return {'dimension': self.dimension, 'total_vector_count': len(self._rows)}
+
+    def _maybe_compact(self):
+        if self._count >= 1000 and len(self._rows) < self._count // 2:
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrite the vector file and log without deleted rows
+        """
+        with self._lock:
+            live = [row for row in range(self._count) if self._ids[row] is not None]
+            kept = np.array(self._matrix_view()[live]) if live else np.empty((0, self.dimension), dtype=np.float32)
+            old_vectors, old_log = self._vectors_path, self._log_path
+            self._generation += 1
+            with open(self._vectors_path, 'wb') as f:
+                f.write(kept.tobytes())
+            with open(self._log_path, 'w') as f:
+                for new_row, row in enumerate(live):
+                    f.write(json.dumps({'op': 'upsert', 'id': self._ids[row], 'row': new_row,
+                                        'metadata': self._metadata[row]}) + "\n")
+            self._write_meta()
+            for old_path in (old_vectors, old_log):
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+            self._load()
+            if self._ann.trained:
+                self._ann.train(self._matrix_view(), self._generation, reuse_centroids=True)
+            logging.info(f"Compacted local index {self.path} to {len(live)} vectors")
+
+def setup_local_index(root: str, index_name: str, embedding_dimension: Optional[int] = None, shards: int = 1,
+                      shard_by: Optional[str] = None, query_workers: Optional[int] = None, **options):
+    """
+    The LocalIndex at root/index_name, or a ShardedLocalIndex when sharding
+    is configured for a new index or the index on disk is already sharded
+    """
+    from pdf2pinecone.sharded_index import ShardedLocalIndex, SHARDS_FILE
+    path = os.path.join(root, index_name)
+    sharded = os.path.exists(os.path.join(path, SHARDS_FILE))
+    unsharded = os.path.exists(os.path.join(path, META_FILE))
+    if sharded or unsharded:
+        logging.info(f"Using existing local index: {path}")
+    else:
+        logging.info(f"Creating new local index: {path}")
+    if unsharded and (shards > 1 or shard_by):
+        logging.warning(f"Local index {path} is not sharded; ignoring LOCAL_SHARDS / LOCAL_SHARD_BY")
+    elif sharded or shards > 1 or shard_by:
+        return ShardedLocalIndex(path, embedding_dimension, shards, shard_by, query_workers, **options)
+    return LocalIndex(path, embedding_dimension, **options)
+
+def local_index_options(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    setup_local_index keyword arguments from load_config()
+    """
+    return {
+        'ann_min_rows': config['ANN_MIN_ROWS'] or None,
+        'nlist': config['ANN_NLIST'] or None,
+        'nprobe': config['ANN_NPROBE'],
+        'quantization': config['LOCAL_QUANTIZATION'] or None,
+        'rescore': config['LOCAL_RESCORE'],
+        'shards': config['LOCAL_SHARDS'],
+        'shard_by': config['LOCAL_SHARD_BY'] or None,
+        'query_workers': config['LOCAL_QUERY_WORKERS'] or None
+    }
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import List, Dict, Any
+
+def hash_file(path: str, block_size: int = 1024 * 1024) -> str:
+    """
+    SHA-256 of a file's contents, read in blocks
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class IngestManifest:
+    """
+    Local record of what has been ingested, keyed by PDF source path.
+
+    Each entry keeps the file's content hash, the chunk parameters it was
+    chunked with, the chunk ids it produced and whether its upload finished.
+    Vector ids that must be removed from the index (rechunked or deleted
+    files) are queued in `pending_deletes` until the delete succeeds, so an
+    interrupted run picks up where it stopped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.pending_deletes: List[str] = []
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                self.files = data.get('files', {})
+                self.pending_deletes = data.get('pending_deletes', [])
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable manifest {path}: {str(e)}")
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".tmp", 'w') as f:
+            json.dump({'files': self.files, 'pending_deletes': self.pending_deletes}, f, indent=1)
+        os.replace(self.path + ".tmp", self.path)
+
+    def file_hash(self, source_path: str) -> str:
+        """
+        Reuse the recorded hash when size and mtime are unchanged
+        """
+        stat = os.stat(source_path)
+        entry = self.files.get(source_path)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry['sha256']
+        return hash_file(source_path)
+
+    def is_current(self, source_path: str, sha256: str, chunk_params: Dict[str, Any]) -> bool:
+        entry = self.files.get(source_path)
+        return bool(entry and entry['status'] == 'complete' and entry['sha256'] == sha256
+                    and entry['chunk_params'] == chunk_params)
+
+    def begin(self, source_path: str, category: str, sha256: str, chunk_params: Dict[str, Any],
+              chunk_ids: List[str], **extra):
+        """
+        Record a file as in progress; ids it no longer produces are queued for deletion
+        """
+        old = self.files.get(source_path)
+        new_ids = set(chunk_ids)
+        pending = [i for i in self.pending_deletes if i not in new_ids]
+        if old:
+            pending.extend(i for i in old['chunk_ids'] if i not in new_ids)
+        self.pending_deletes = list(dict.fromkeys(pending))
+        stat = os.stat(source_path)
+        self.files[source_path] = {
+            'category': category,
+            'sha256': sha256,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'chunk_params': chunk_params,
+            'chunk_ids': chunk_ids,
+            'status': 'pending',
+            'ingested_at': None,
+            **extra
+        }
+
+    def complete(self, source_path: str):
+        self.files[source_path]['status'] = 'complete'
+        self.files[source_path]['ingested_at'] = time.time()
+
+    def remove_deleted(self) -> List[str]:
+        """
+        Drop entries for files that no longer exist and queue their ids for deletion
+        """
+        removed = [path for path in self.files if not os.path.exists(path)]
+        for path in removed:
+            self.pending_deletes.extend(self.files.pop(path)['chunk_ids'])
+        self.pending_deletes = list(dict.fromkeys(self.pending_deletes))
+        return removed
+
+    def drop_referenced(self):
+        """
+        Unqueue ids that a tracked file still produces; content-derived ids
+        are shared by identical copies of a PDF
+        """
+        if self.pending_deletes:
+            referenced = {i for entry in self.files.values() for i in entry['chunk_ids']}
+            self.pending_deletes = [i for i in self.pending_deletes if i not in referenced]
+
+    def deleted(self, ids: List[str]):
+        done = set(ids)
+        self.pending_deletes = [i for i in self.pending_deletes if i not in done]
@@ -0,0 +1,230 @@
+import os
+import json
+import logging
+import time
+import threading
+import functools
+from bisect import bisect_left
+from typing import List, Dict, Any, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th observation
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    def __init__(self, metrics: "Metrics", name: str, labels: Dict[str, Any]):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.metrics.observe(self.name, elapsed, **self.labels)
+        if self.metrics.tracing:
+            self.metrics._span(self.name, self.start, elapsed, self.labels)
+        return False
+
+class Metrics:
+    """
+    Process-wide counters, histograms and (optionally) trace spans.
+
+    Everything is a no-op until `enable` is called: `inc` and `observe`
+    return at once and `timer` hands back a shared do-nothing context
+    manager, so instrumented code pays one attribute check. Histograms use
+    fixed buckets (seconds for names ending in `_seconds`, sizes otherwise),
+    which is also what the Prometheus export needs. Spans are kept in
+    Chrome trace-event format, viewable in chrome://tracing or Perfetto.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.tracing = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters: Dict[LabelKey, float] = {}
+        self.histograms: Dict[LabelKey, Histogram] = {}
+        self.spans: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+
+    def enable(self, tracing: bool = False):
+        self.enabled = True
+        self.tracing = tracing
+
+    def disable(self):
+        self.enabled = False
+        self.tracing = False
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> LabelKey:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(
+                    LATENCY_BUCKETS if name.endswith('_seconds') else SIZE_BUCKETS)
+            histogram.observe(value)
+
+    def timer(self, name: str, **labels):
+        """
+        Context manager recording the elapsed seconds of its block in `name`
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def _span(self, name: str, start: float, elapsed: float, labels: Dict[str, Any]):
+        span = {'name': name, 'ph': 'X', 'ts': (start - self._origin) * 1e6, 'dur': elapsed * 1e6,
+                'pid': os.getpid(), 'tid': threading.get_ident(), 'args': labels}
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        JSON-friendly snapshot: counter totals and histogram count / sum /
+        mean / approximate p50, p95, p99 / max
+        """
+        def label(key: LabelKey) -> str:
+            name, labels = key
+            return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+        with self._lock:
+            return {
+                'counters': {label(key): value for key, value in sorted(self.counters.items())},
+                'histograms': {
+                    label(key): {
+                        'count': h.count,
+                        'sum': h.sum,
+                        'mean': h.sum / h.count if h.count else 0.0,
+                        'p50': h.quantile(0.5),
+                        'p95': h.quantile(0.95),
+                        'p99': h.quantile(0.99),
+                        'max': h.max,
+                    }
+                    for key, h in sorted(self.histograms.items())
+                },
+            }
+
+    def to_prometheus(self, prefix: str = "pdf2pinecone_") -> str:
+        """
+        Prometheus text exposition format
+        """
+        def labels_text(labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {prefix}{name} counter")
+                    typed.add(name)
+                lines.append(f"{prefix}{name}{labels_text(labels)} {value}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {prefix}{name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f"{prefix}{name}_bucket{labels_text(labels, (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{prefix}{name}_bucket{labels_text(labels, (('le', '+Inf'),))} {h.count}")
+                lines.append(f"{prefix}{name}_sum{labels_text(labels)} {h.sum}")
+                lines.append(f"{prefix}{name}_count{labels_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, format: Optional[str] = None):
+        """
+        Write metrics as Prometheus text (`format='prometheus'` or a .prom /
+        .txt path) or as the JSON summary
+        """
+        format = format or ('prometheus' if path.endswith(('.prom', '.txt')) else 'json')
+        with open(path, 'w') as f:
+            if format == 'prometheus':
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.summary(), f, indent=2)
+
+    def write_trace(self, path: str):
+        with self._lock:
+            spans = list(self.spans)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': spans, 'displayTimeUnit': 'ms'}, f)
+
+    def export(self, metrics_file: Optional[str] = None, trace_file: Optional[str] = None):
+        if metrics_file:
+            self.write(metrics_file)
+            logging.info(f"Wrote metrics to {metrics_file}")
+        if trace_file:
+            self.write_trace(trace_file)
+            logging.info(f"Wrote {len(self.spans)} trace spans to {trace_file}")
+
+metrics = Metrics()
+
+def timed(name: str, **labels):
+    """
+    Decorator timing every call of a function into histogram `name`
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return fn(*args, **kwargs)
+            with metrics.timer(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
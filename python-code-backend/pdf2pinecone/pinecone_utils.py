@@ -1,15 +1,24 @@
 import os
 import hashlib
-from typing import List, Dict, Any
+from bisect import bisect_right
+from typing import List, Dict, Any, Tuple, Optional
 from pinecone import Pinecone, ServerlessSpec
-import openai
 import logging
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from pdf2pinecone.embeddings import EMBEDDING_MODEL, DEFAULT_BATCH_SIZE, DEFAULT_BATCH_TOKENS, embed_texts
+from pdf2pinecone.async_uploader import AsyncUploader
+from pdf2pinecone.metrics import timed
 
-def create_chunks(text: str, filename: str, chunk_size: int, chunk_overlap: int, pdf_folder: str, category: str) -> List[Dict[str, Any]]:
+@timed('create_chunks_seconds')
+def create_chunks(text: str, filename: str, chunk_size: int, chunk_overlap: int, pdf_folder: str, category: str,
+                  page_starts: Optional[List[Tuple[int, int]]] = None) -> List[Dict[str, Any]]:
+    """
+    Split text into overlapping word windows. With `page_starts` from
+    pdf_utils.join_pages, each chunk's metadata records the pages it spans.
+    """
     words = text.split()
     chunks = []
+    page_offsets = [offset for offset, _ in page_starts] if page_starts else None
     for i in range(0, len(words), chunk_size - chunk_overlap):
         chunk_words = words[i:i + chunk_size]
         chunk_text = ' '.join(chunk_words)
@@ -27,16 +36,25 @@ def create_chunks(text: str, filename: str, chunk_size: int, chunk_overlap: int,
                 'text': chunk_text
             }
         }
+        if page_offsets:
+            first = bisect_right(page_offsets, i) - 1
+            last = bisect_right(page_offsets, i + len(chunk_words) - 1) - 1
+            chunk_data['metadata']['page_start'] = page_starts[max(first, 0)][1]
+            chunk_data['metadata']['page_end'] = page_starts[max(last, 0)][1]
         chunks.append(chunk_data)
     return chunks
 
-def generate_embedding(text: str) -> List[float]:
+@timed('generate_embedding_seconds')
+def generate_embedding(text: str, client=None, model: str = EMBEDDING_MODEL, cache=None) -> List[float]:
     try:
-        response = openai.embeddings.create(
-            input=text,
-            model="text-embedding-ada-002"
-        )
-        return response.data[0].embedding
+        if cache is not None:
+            embedding = cache.get(model, text)
+            if embedding is not None:
+                return embedding
+        embedding = embed_texts([text], client, model)[0]
+        if cache is not None:
+            cache.put(model, text, embedding)
+        return embedding
     except Exception as e:
         logging.error(f"Error generating embedding: {str(e)}")
         return None
@@ -60,36 +78,52 @@ def setup_pinecone_index(pc, index_name, embedding_dimension):
         logging.error(f"Error setting up Pinecone index: {str(e)}")
         raise
 
-def upload_to_pinecone(index, chunks: List[Dict[str, Any]], batch_size: int = 100, parallel: bool = True):
+@timed('upload_to_pinecone_seconds')
+def upload_to_pinecone(index, chunks: List[Dict[str, Any]], batch_size: int = 100, parallel: bool = True,
+                       embedding_batch_size: int = DEFAULT_BATCH_SIZE,
+                       embedding_batch_tokens: int = DEFAULT_BATCH_TOKENS, client=None, cache=None,
+                       on_upserted=None, embed_rate: float = 50, upsert_rate: float = 20,
+                       max_retries: int = 5, failures_path: Optional[str] = None) -> List[str]:
+    """
+    Embed and upsert chunks; returns the ids that were upserted.
+    `on_upserted` is called with the ids of each batch once it is stored.
+    Requests are rate limited and retried by async_uploader.AsyncUploader;
+    batches that still fail are written to `failures_path` for replay.
+    """
     logging.info(f"Uploading {len(chunks)} chunks to Pinecone...")
-    def embed_and_prepare(chunk):
-        embedding = generate_embedding(chunk['text'])
-        if embedding is None:
-            logging.warning(f"Skipping chunk {chunk['id']} due to embedding error")
-            return None
-        return {
-            'id': chunk['id'],
-            'values': embedding,
-            'metadata': chunk['metadata']
-        }
-    vectors_to_upsert = []
-    if parallel:
-        with ThreadPoolExecutor() as executor:
-            future_to_chunk = {executor.submit(embed_and_prepare, chunk): chunk for chunk in chunks}
-            for future in as_completed(future_to_chunk):
-                result = future.result()
-                if result:
-                    vectors_to_upsert.append(result)
-    else:
-        for chunk in chunks:
-            result = embed_and_prepare(chunk)
-            if result:
-                vectors_to_upsert.append(result)
-    for i in range(0, len(vectors_to_upsert), batch_size):
-        batch = vectors_to_upsert[i:i + batch_size]
+    uploader = AsyncUploader(
+        index,
+        client=client,
+        cache=cache,
+        embedding_batch_size=embedding_batch_size,
+        embedding_batch_tokens=embedding_batch_tokens,
+        upsert_batch_size=batch_size,
+        embed_rate=embed_rate,
+        upsert_rate=upsert_rate,
+        embed_concurrency=4 if parallel else 1,
+        upsert_concurrency=4 if parallel else 1,
+        max_retries=max_retries
+    )
+    report = uploader.upload(chunks, on_upserted)
+    if report.failures:
+        logging.warning(f"{report.failed_chunks} chunks failed to upload")
+    if failures_path:
+        report.write_failures(failures_path)
+    return report.upserted_ids
+
+@timed('delete_from_pinecone_seconds')
+def delete_from_pinecone(index, ids: List[str], batch_size: int = 1000) -> List[str]:
+    """
+    Delete vectors by id in batches; returns the ids that were deleted
+    """
+    deleted_ids = []
+    for i in range(0, len(ids), batch_size):
+        batch = ids[i:i + batch_size]
         try:
-            index.upsert(vectors=batch)
-            logging.info(f"Uploaded batch {i//batch_size + 1}/{(len(vectors_to_upsert) + batch_size - 1)//batch_size}")
-            time.sleep(1)
+            index.delete(ids=batch)
+            deleted_ids.extend(batch)
         except Exception as e:
-            logging.error(f"Error uploading batch to Pinecone: {str(e)}")
+            logging.error(f"Error deleting batch from Pinecone: {str(e)}")
+    if ids:
+        logging.info(f"Deleted {len(deleted_ids)}/{len(ids)} stale vectors")
+    return deleted_ids
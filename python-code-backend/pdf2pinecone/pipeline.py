@@ -0,0 +1,314 @@
+import os
+import time
+import queue
+import logging
+import threading
+from typing import List, Dict, Any, Iterable, Iterator, Callable, Optional
+from tqdm import tqdm
+from pdf2pinecone.pdf_utils import extract_pages, join_pages
+from pdf2pinecone.pinecone_utils import create_chunks
+from pdf2pinecone.chunker import iter_chunks
+from pdf2pinecone.embeddings import EMBEDDING_MODEL, DEFAULT_BATCH_SIZE, DEFAULT_BATCH_TOKENS
+from pdf2pinecone.async_uploader import AsyncUploader
+from pdf2pinecone.chunk_store import strip_text
+from pdf2pinecone.metrics import metrics
+
+_DONE = object()
+
+class Stage:
+    """
+    One step of a streaming pipeline.
+
+    `fn` receives an iterator over the stage's input buffer and yields
+    outputs for the next stage; each of the `workers` threads runs its own
+    copy of `fn` over the shared buffer. The input buffer holds at most
+    `buffer_size` items, so a slow stage blocks the ones before it.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Iterator], Iterable], workers: int = 1, buffer_size: int = 8):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.buffer_size = max(1, buffer_size)
+
+def run_pipeline(source: Iterable, stages: List[Stage]) -> Dict[str, int]:
+    """
+    Run `source` through `stages` with bounded buffers between them.
+    Returns the number of items each stage emitted; the first exception
+    raised by any stage stops the pipeline and is re-raised.
+    """
+    stop = threading.Event()
+    lock = threading.Lock()
+    errors = []
+    buffers = [queue.Queue(maxsize=stage.buffer_size) for stage in stages]
+    running = [stage.workers for stage in stages]
+    counts = {stage.name: 0 for stage in stages}
+
+    def put(buffer: queue.Queue, item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain(buffer: queue.Queue) -> Iterator:
+        while not stop.is_set():
+            try:
+                item = buffer.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                # Leave the marker for the other workers of this stage
+                put(buffer, _DONE)
+                return
+            yield item
+
+    def feed():
+        try:
+            for item in source:
+                if not put(buffers[0], item):
+                    return
+            put(buffers[0], _DONE)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    def work(position: int, stage: Stage):
+        output = buffers[position + 1] if position + 1 < len(stages) else None
+        try:
+            for result in stage.fn(drain(buffers[position])):
+                with lock:
+                    counts[stage.name] += 1
+                metrics.inc('pipeline_items_total', stage=stage.name)
+                if output is not None and not put(output, result):
+                    break
+        except Exception as e:
+            logging.error(f"Pipeline stage '{stage.name}' failed: {str(e)}")
+            errors.append(e)
+            stop.set()
+        finally:
+            with lock:
+                running[position] -= 1
+                last = running[position] == 0
+            if last and output is not None:
+                put(output, _DONE)
+
+    threads = [threading.Thread(target=feed, name="pipeline-source", daemon=True)]
+    for position, stage in enumerate(stages):
+        for worker in range(stage.workers):
+            threads.append(threading.Thread(target=work, args=(position, stage),
+                                            name=f"pipeline-{stage.name}-{worker}", daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return counts
+
+def rebatch(batches: Iterable[List[Any]], size: int) -> Iterator[List[Any]]:
+    """
+    Regroup a stream of lists into lists of `size` items
+    """
+    batch = []
+    for items in batches:
+        for item in items:
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+class CompletionTracker:
+    """
+    Marks manifest files complete once every chunk still outstanding for
+    them has been upserted.
+
+    The manifest is rewritten at most once every `save_interval` seconds
+    (`checkpoint`); call `flush` when the run ends. Progress after the last
+    save is lost on a crash, and those files are simply ingested again.
+    """
+
+    def __init__(self, manifest, lock: Optional[threading.RLock] = None, save_interval: float = 5.0):
+        self.manifest = manifest
+        self.remaining: Dict[str, set] = {}
+        self._paths: Dict[str, set] = {}
+        # Shared with other writers of the manifest
+        self._lock = lock or threading.RLock()
+        self.save_interval = save_interval
+        self._saved_at = time.monotonic()
+        self._dirty = False
+
+    def checkpoint(self):
+        """
+        Note a manifest change, saving it if the last save is old enough
+        """
+        with self._lock:
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.save_interval:
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                with metrics.timer('manifest_save_seconds'):
+                    self.manifest.save()
+                self._dirty = False
+            self._saved_at = time.monotonic()
+
+    def expect(self, path: str, ids: Iterable[str], references: Iterable[str] = ()):
+        """
+        Wait for `ids`, and for the `references` (representatives of
+        near-duplicate chunks) that are still outstanding for other files
+        """
+        with self._lock:
+            remaining = set(ids) | {chunk_id for chunk_id in references if chunk_id in self._paths}
+            if not remaining:
+                self.manifest.complete(path)
+                return
+            self.remaining[path] = remaining
+            for chunk_id in remaining:
+                self._paths.setdefault(chunk_id, set()).add(path)
+
+    def uploaded(self, ids: Iterable[str]):
+        with self._lock:
+            for chunk_id in ids:
+                for path in self._paths.pop(chunk_id, ()):
+                    if path in self.remaining:
+                        self.remaining[path].discard(chunk_id)
+                        if not self.remaining[path]:
+                            self.manifest.complete(path)
+                            del self.remaining[path]
+            self.checkpoint()
+
+def ingest_files(files: List[Dict[str, Any]], index, manifest, chunk_size: int, chunk_overlap: int,
+                 chunk_params: Dict[str, Any], client=None, model: str = EMBEDDING_MODEL, cache=None,
+                 embedding_batch_size: int = DEFAULT_BATCH_SIZE,
+                 embedding_batch_tokens: int = DEFAULT_BATCH_TOKENS, upsert_batch_size: int = 100,
+                 extract_workers: int = 2, chunk_workers: int = 1, embed_workers: int = 4,
+                 upsert_workers: int = 2, buffer_size: int = 16, extractor=None, lexical=None, chunk_store=None,
+                 embed_rate: float = 50, upsert_rate: float = 20, max_retries: int = 5,
+                 failures_path: Optional[str] = None, chunk_tokens: int = 0, chunk_overlap_tokens: int = 0,
+                 align_sentences: bool = True, dedup=None, similar=None,
+                 manifest_save_interval: float = 5.0) -> Dict[str, int]:
+    """
+    Stream PDFs through extraction -> clean_text -> create_chunks -> embedding -> upsert.
+
+    `files` holds dicts with 'path', 'category', 'folder' and 'sha256'.
+    With `chunk_tokens` set, chunks are token-budgeted windows from
+    chunker.iter_chunks; otherwise create_chunks' word windows are used.
+    Chunks flow into an AsyncUploader, which keeps up to `embed_workers`
+    embedding requests and `upsert_workers` upserts in flight under the
+    given rate limits, and each file is marked complete in the manifest once
+    all of its chunks are in the index, so memory stays bounded by the stage
+    buffers rather than the corpus size. Batches that fail after retries are
+    written to `failures_path` for replay.
+    Pass a pdf_utils.ParallelExtractor to run extraction in worker processes,
+    a LexicalIndex to index each file's chunks for keyword search, a
+    ChunkStore to keep chunk text out of the vector metadata and a
+    dedup.DuplicateDetector to upload one representative per near-duplicate
+    cluster; a file's manifest entry then lists the representatives it
+    references among its chunk ids, so they outlive its own chunks.
+    A similar_reports.SimilarReports accumulates every stored vector into
+    its report's vector; commit it once the files are complete.
+    Each manifest entry also records the file's page, chunk and chunk text
+    character counts for catalog.CorpusCatalog. The manifest is saved at
+    most every `manifest_save_interval` seconds and once more at the end.
+    """
+    lock = threading.RLock()
+    tracker = CompletionTracker(manifest, lock, manifest_save_interval)
+    reports = []
+    created = [0]
+    progress = tqdm(total=len(files), desc="Ingesting PDFs")
+    uploader = AsyncUploader(index, client=client, model=model, cache=cache,
+                             embedding_batch_size=embedding_batch_size,
+                             embedding_batch_tokens=embedding_batch_tokens,
+                             upsert_batch_size=upsert_batch_size, embed_rate=embed_rate,
+                             upsert_rate=upsert_rate, embed_concurrency=embed_workers,
+                             upsert_concurrency=upsert_workers, max_retries=max_retries)
+
+    extract_file = extract_pages
+    if extractor is not None:
+        # Keep enough files in flight to occupy every extraction process
+        extract_file = extractor.extract_pages
+        extract_workers = max(extract_workers, extractor.processes)
+
+    def extract(items):
+        for item in items:
+            with metrics.timer('extract_file_seconds', category=item['category']):
+                pages = extract_file(item['path'])
+            yield item, pages
+
+    def chunk(items):
+        for item, pages in items:
+            path = item['path']
+            filename = os.path.basename(path)
+            chunks = []
+            with metrics.timer('chunk_file_seconds', category=item['category']):
+                text, page_starts = join_pages(pages)
+                if text and chunk_tokens:
+                    chunks = list(iter_chunks(text, filename, item['folder'], item['category'], item['sha256'],
+                                              chunk_tokens, chunk_overlap_tokens, align_sentences, page_starts))
+                elif text:
+                    chunks = create_chunks(text, filename, chunk_size, chunk_overlap,
+                                           item['folder'], item['category'], page_starts)
+            metrics.observe('chunks_per_file', len(chunks), category=item['category'])
+            metrics.inc('files_processed_total', category=item['category'])
+            if text:
+                logging.info(f"Created {len(chunks)} chunks from {item['category']}/{filename}")
+            else:
+                logging.warning(f"No text extracted from {filename}")
+            if chunk_store is not None:
+                with metrics.timer('chunk_store_add_seconds'):
+                    chunk_store.add(chunks)
+                strip_text(chunks)
+            if lexical is not None:
+                with metrics.timer('lexical_add_seconds'):
+                    lexical.add(chunks)
+            chunk_ids = [c['id'] for c in chunks]
+            file_counts = {'pages': len(pages), 'chunks': len(chunks), 'text_chars': sum(len(c['text']) for c in chunks)}
+            references = {}
+            if dedup is not None and chunks:
+                with metrics.timer('dedup_seconds'):
+                    chunks, references = dedup.deduplicate(chunks)
+                metrics.inc('duplicate_chunks_total', len(references), category=item['category'])
+            extra = {**file_counts, 'duplicates': references} if references else file_counts
+            with lock:
+                created[0] += len(chunk_ids)
+                manifest.begin(path, item['category'], item['sha256'], chunk_params,
+                               list(dict.fromkeys(chunk_ids + list(references.values()))), **extra)
+                if chunk_ids:
+                    tracker.expect(path, [c['id'] for c in chunks], references.values())
+                else:
+                    manifest.complete(path)
+                tracker.checkpoint()
+                progress.update(1)
+            yield from chunks
+
+    def upload(chunks):
+        reports.append(uploader.upload(chunks, on_upserted=tracker.uploaded,
+                                       on_vectors=similar.add_vectors if similar is not None else None))
+        yield from ()
+
+    stages = [
+        Stage("extract", extract, extract_workers, buffer_size),
+        Stage("chunk", chunk, chunk_workers, max(2, extract_workers)),
+        Stage("upload", upload, 1, buffer_size * 4),
+    ]
+    try:
+        counts = run_pipeline(files, stages)
+    finally:
+        tracker.flush()
+        progress.close()
+    report = reports[0]
+    counts['created'] = created[0]
+    counts['upsert'] = report.upserted_batches
+    counts['failed'] = report.failed_chunks
+    if failures_path:
+        report.write_failures(failures_path)
+    if tracker.remaining:
+        logging.warning(f"{len(tracker.remaining)} files did not upload completely and will be retried on the next run")
+    return counts
@@ -0,0 +1,208 @@
+import functools
+from collections import deque
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+from pdf2pinecone.lexical_index import tokenize
+
+ANSI_HIGHLIGHT = ("\033[1;31m", "\033[0m")
+
+class Highlighter:
+    """
+    Aho-Corasick automaton over a set of terms, built once and reused for
+    every result of a query.
+
+    Text is scanned in one pass, one transition per character, whatever the
+    number of terms. Matches are case-insensitive and must start and end on
+    word boundaries (so 'fire' does not light up 'fireproof'); overlapping
+    matches and matches separated only by whitespace are merged into one
+    span, so 'engine failure' comes out as a single highlight.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms = sorted({term.lower() for term in terms if term})
+        # goto[state][char] -> state; out[state] = longest term ending here
+        goto: List[Dict[str, int]] = [{}]
+        out: List[int] = [0]
+        for term in self.terms:
+            state = 0
+            for char in term:
+                if char not in goto[state]:
+                    goto.append({})
+                    out.append(0)
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            out[state] = max(out[state], len(term))
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in goto[state].items():
+                queue.append(child)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(char, 0) if goto[fallback].get(char) != child else 0
+                out[child] = max(out[child], out[fail[child]])
+            # Complete the transition table so scanning never follows failure links
+            for char, target in goto[fail[state]].items():
+                goto[state].setdefault(char, target)
+        self._goto = goto
+        self._out = out
+
+    def __bool__(self) -> bool:
+        return bool(self.terms)
+
+    def find(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Merged (start, end) character spans of term matches in `text`
+        """
+        if not self.terms:
+            return []
+        folded = text.lower()
+        if len(folded) != len(text):
+            # A few characters change length when lowercased
+            folded = ''.join(char.lower() if len(char.lower()) == 1 else char for char in text)
+        goto, out = self._goto, self._out
+        spans = []
+        state = 0
+        for end, char in enumerate(folded, 1):
+            state = goto[state].get(char) or goto[0].get(char, 0)
+            length = out[state]
+            if length:
+                start = end - length
+                if (start == 0 or not folded[start - 1].isalnum()) and (end == len(folded) or not folded[end].isalnum()):
+                    spans.append((start, end))
+        return merge_spans(spans, text)
+
+    def snippet(self, text: str, max_chars: int = 500) -> Tuple[str, List[Tuple[int, int]]]:
+        """
+        The `max_chars` window of `text` holding the most matches, cut at
+        word boundaries and marked with '...' where text was dropped, and
+        the match spans within it
+        """
+        spans = self.find(text)
+        if len(text) <= max_chars:
+            return text, spans
+        start = 0
+        if spans:
+            # Widest run of spans that fits in the window
+            best, first = (1, 0, 0), 0
+            for last in range(len(spans)):
+                while spans[last][1] - spans[first][0] > max_chars:
+                    first += 1
+                best = max(best, (last - first + 1, -first, last))
+            first, last = -best[1], best[2]
+            slack = max_chars - (spans[last][1] - spans[first][0])
+            start = max(0, min(spans[first][0] - slack // 2, len(text) - max_chars))
+            if start:
+                boundary = text.find(' ', start, spans[first][0])
+                start = boundary + 1 if boundary >= 0 else start
+        end = min(len(text), start + max_chars)
+        if end < len(text):
+            boundary = text.rfind(' ', start, end)
+            end = boundary if boundary > start else end
+        prefix = "..." if start else ""
+        suffix = "..." if end < len(text) else ""
+        shift = len(prefix) - start
+        window = [(s + shift, e + shift) for s, e in spans if s >= start and e <= end]
+        return prefix + text[start:end] + suffix, window
+
+def merge_spans(spans: List[Tuple[int, int]], text: str) -> List[Tuple[int, int]]:
+    """
+    Sort spans and merge those that overlap or are separated only by whitespace
+    """
+    merged: List[List[int]] = []
+    for start, end in sorted(spans):
+        if merged and (start <= merged[-1][1] or not text[merged[-1][1]:start].strip()):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+def query_terms(query: str) -> List[str]:
+    """
+    Terms to highlight for a query: its lexical tokens, stopwords dropped
+    """
+    return list(dict.fromkeys(tokenize(query)))
+
+@functools.lru_cache(maxsize=256)
+def highlighter_for(query: str) -> Highlighter:
+    return Highlighter(query_terms(query))
+
+def mark(text: str, spans: List[Tuple[int, int]], markers: Tuple[str, str] = ANSI_HIGHLIGHT) -> str:
+    """
+    Wrap each span of `text` in the start / end markers
+    """
+    parts, position = [], 0
+    for start, end in spans:
+        parts.extend((text[position:start], markers[0], text[start:end], markers[1]))
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+def collapse(matches, top_k: int, chunks_per_report: int = 1, key: str = 'filename') -> List[List[Any]]:
+    """
+    Group score-ordered matches by the `key` metadata field, keeping the
+    first `top_k` groups with at most `chunks_per_report` matches each;
+    groups are ordered by their best match
+    """
+    groups: Dict[Any, List[Any]] = {}
+    for match in matches:
+        value = (match.metadata or {}).get(key, match.id)
+        group = groups.get(value)
+        if group is None:
+            if len(groups) >= top_k:
+                continue
+            group = groups[value] = []
+        if len(group) < chunks_per_report:
+            group.append(match)
+    return list(groups.values())
+
+def build_results(query: str, groups: List[List[Any]], snippet_chars: int = 500,
+                  highlighter: Optional[Highlighter] = None, **info) -> Dict[str, Any]:
+    """
+    JSON-ready results: one entry per report with its best score and its
+    chunks, each with a snippet and the highlighted spans within it
+    """
+    highlighter = highlighter if highlighter is not None else highlighter_for(query)
+    reports = []
+    for rank, group in enumerate(groups, 1):
+        metadata = group[0].metadata or {}
+        chunks = []
+        for match in group:
+            chunk_metadata = match.metadata or {}
+            text = chunk_metadata.get('text')
+            snippet, highlights = highlighter.snippet(text, snippet_chars) if text else (None, [])
+            chunks.append({
+                'id': match.id,
+                'score': match.score,
+                'chunk_index': chunk_metadata.get('chunk_index'),
+                'page_start': chunk_metadata.get('page_start'),
+                'page_end': chunk_metadata.get('page_end'),
+                'snippet': snippet,
+                'highlights': [list(span) for span in highlights],
+            })
+        reports.append({
+            'rank': rank,
+            'filename': metadata.get('filename'),
+            'category': metadata.get('category'),
+            'score': group[0].score,
+            'chunks': chunks,
+        })
+    return {'query': query, 'terms': highlighter.terms, **info, 'reports': reports}
+
+def format_results(results: Dict[str, Any], markers: Tuple[str, str] = ANSI_HIGHLIGHT) -> str:
+    """
+    Terminal rendering of build_results output
+    """
+    category_text = f" in '{results['category']}' category" if results.get('category') else ""
+    lines = [f"Found {len(results['reports'])} reports for: '{results['query']}'{category_text}", "=" * 60]
+    for report in results['reports']:
+        lines.append(f"Result {report['rank']} | Score: {report['score']:.4f} | "
+                     f"Category: {(report['category'] or 'N/A').upper()} | File: {report['filename'] or 'N/A'}")
+        for chunk in report['chunks']:
+            pages = f" | Pages: {chunk['page_start']}-{chunk['page_end']}" if chunk['page_start'] is not None else ""
+            lines.append(f"Chunk: {chunk['chunk_index']} | Score: {chunk['score']:.4f}{pages}")
+            snippet = chunk['snippet']
+            lines.append(mark(snippet, chunk['highlights'], markers) if snippet else "Content not found in metadata.")
+        lines.append("-" * 60)
+    return "\n".join(lines)
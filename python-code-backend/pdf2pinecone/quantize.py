@@ -0,0 +1,277 @@
+import os
+import glob
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+MODES = ('int8', 'binary')
+
+if hasattr(np, 'bitwise_count'):
+    popcount = np.bitwise_count
+else:
+    _POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(codes: np.ndarray) -> np.ndarray:
+        return _POPCOUNT[codes]
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-row int8 codes and the float32 scale that restores them
+    (row ≈ codes * scale)
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=1) / 127 if len(matrix) else np.empty(0, dtype=np.float32)
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def pack_signs(matrix: np.ndarray) -> np.ndarray:
+    """
+    One bit per dimension (set where the value is positive), packed into bytes
+    """
+    return np.packbits(np.asarray(matrix) > 0, axis=-1)
+
+def hamming(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    return popcount(codes ^ query_code).sum(axis=1, dtype=np.int32)
+
+class QuantizedVectors:
+    """
+    Compact copy of a LocalIndex's vectors used to pick rescoring candidates.
+
+    `int8` keeps one byte per dimension plus a float32 scale per row and
+    approximates cosine similarity by the dot product of the dequantized
+    rows with the float query; `binary` keeps
+    one bit per dimension (the sign) and ranks rows by Hamming distance to
+    the query's bits, 32x smaller than float32. Codes are appended to
+    codes.<generation>.<mode> next to the float file they were derived from
+    and memory-mapped on load; rows missing after a crash or a mode switch
+    are re-encoded from the float rows.
+    """
+
+    def __init__(self, path: str, dimension: int, mode: str, generation: int):
+        if mode not in MODES:
+            raise ValueError(f"Unknown quantization {mode!r}, expected one of {', '.join(MODES)}")
+        self.path = path
+        self.dimension = dimension
+        self.mode = mode
+        self.generation = generation
+        self.row_bytes = dimension if mode == 'int8' else (dimension + 7) // 8
+        self.count = 0
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+
+    @property
+    def _codes_path(self) -> str:
+        return os.path.join(self.path, f"codes.{self.generation}.{self.mode}")
+
+    @property
+    def _scales_path(self) -> str:
+        return os.path.join(self.path, f"scales.{self.generation}.f32")
+
+    @property
+    def nbytes(self) -> int:
+        return self.count * (self.row_bytes + (4 if self.mode == 'int8' else 0))
+
+    def sync(self, matrix: np.ndarray, block_size: int = 65536):
+        """
+        Bring the code file in line with the first len(matrix) float rows
+        """
+        count = os.path.getsize(self._codes_path) // self.row_bytes if os.path.exists(self._codes_path) else 0
+        if self.mode == 'int8':
+            scaled = os.path.getsize(self._scales_path) // 4 if os.path.exists(self._scales_path) else 0
+            count = min(count, scaled)
+        count = min(count, len(matrix))
+        self._truncate(count)
+        self.count = count
+        for start in range(count, len(matrix), block_size):
+            self.add(np.asarray(matrix[start:start + block_size], dtype=np.float32))
+        self._codes = None
+
+    def _truncate(self, count: int):
+        for path, row_bytes in ((self._codes_path, self.row_bytes), (self._scales_path, 4)):
+            if path == self._scales_path and self.mode != 'int8':
+                continue
+            if os.path.exists(path) and os.path.getsize(path) != count * row_bytes:
+                with open(path, 'r+b') as f:
+                    f.truncate(count * row_bytes)
+
+    def add(self, matrix: np.ndarray):
+        if self.mode == 'int8':
+            codes, scales = quantize_int8(matrix)
+            with open(self._scales_path, 'ab') as f:
+                f.write(scales.tobytes())
+        else:
+            codes = pack_signs(matrix)
+        with open(self._codes_path, 'ab') as f:
+            f.write(codes.tobytes())
+        self.count += len(matrix)
+        self._codes = None
+
+    def _view(self) -> np.ndarray:
+        if self._codes is None:
+            dtype = np.int8 if self.mode == 'int8' else np.uint8
+            if self.count == 0:
+                self._codes = np.empty((0, self.row_bytes), dtype=dtype)
+                self._scales = np.empty(0, dtype=np.float32)
+            else:
+                self._codes = np.memmap(self._codes_path, dtype=dtype, mode='r', shape=(self.count, self.row_bytes))
+                if self.mode == 'int8':
+                    self._scales = np.fromfile(self._scales_path, dtype=np.float32, count=self.count)
+        return self._codes
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None, block_size: int = 8192) -> np.ndarray:
+        """
+        Approximate similarity of `query` to `rows` (every row when None);
+        higher is closer
+        """
+        codes = self._view()
+        if rows is not None:
+            codes = codes[rows]
+        if self.mode == 'int8':
+            scales = self._scales if rows is None else self._scales[rows]
+            scores = np.empty(len(codes), dtype=np.float32)
+            query = np.asarray(query, dtype=np.float32)
+            for start in range(0, len(codes), block_size):
+                # float32 blocks go through BLAS; integer matmul does not
+                block = codes[start:start + block_size].astype(np.float32)
+                scores[start:start + block_size] = block @ query
+            return scores * scales
+        return -hamming(codes, pack_signs(query))
+
+    def remove_other_files(self):
+        """
+        Delete code files of other generations and modes
+        """
+        keep = {self._codes_path, self._scales_path if self.mode == 'int8' else None}
+        for path in glob.glob(os.path.join(self.path, "codes.*")) + glob.glob(os.path.join(self.path, "scales.*")):
+            if path not in keep:
+                os.remove(path)
+
+    def close(self):
+        self._codes = None
+        self._scales = None
+
+def quantization_report(index, queries: np.ndarray, top_k: int = 10,
+                        candidates: Tuple[int, ...] = (1, 2, 4, 8, 16)) -> List[Dict[str, Any]]:
+    """
+    Recall@top_k against exact float search, latency and resident vector
+    bytes for each rescoring candidate multiplier of `index`'s quantization
+    """
+    def run(**kwargs):
+        results, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            response = index.query(query, top_k=top_k, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append([match.id for match in response.matches])
+        return results, np.array(latencies)
+
+    def row(mode, rescore, results, latencies, resident):
+        hits = sum(len(set(found) & set(expected)) for found, expected in zip(results, exact))
+        total = sum(len(expected) for expected in exact)
+        return {
+            'mode': mode,
+            'rescore': rescore,
+            'recall': hits / total if total else 1.0,
+            'mean_ms': float(latencies.mean()),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'resident_bytes': resident,
+        }
+
+    float_bytes = index.float_bytes
+    exact, latencies = run(exact=True)
+    report = [row('float32', None, exact, latencies, float_bytes)]
+    if index.quantization:
+        for rescore in candidates:
+            results, latencies = run(rescore=rescore)
+            report.append(row(index.quantization, rescore, results, latencies, index.quantized_bytes))
+    return report
+
+def build_benchmark_index(path: str, corpus: str, dimension: int, quantization: Optional[str],
+                          chunk_tokens: int = 640, chunk_overlap_tokens: int = 64):
+    """
+    LocalIndex over the iter_chunks chunks of every PDF under `corpus`,
+    embedded with the benchmark's hashing-trick FakeEmbedder
+    """
+    from pdf2pinecone.benchmark import FakeEmbedder
+    from pdf2pinecone.chunker import iter_chunks
+    from pdf2pinecone.embeddings import make_batches, embed_texts
+    from pdf2pinecone.local_index import LocalIndex
+    from pdf2pinecone.pdf_utils import extract_text_from_pdf, clean_text
+    client = FakeEmbedder(dimension)
+    index = LocalIndex(path, dimension, ann_min_rows=None, quantization=quantization)
+    for pdf_path in sorted(glob.glob(os.path.join(corpus, '*', '*.pdf'))):
+        folder, filename = os.path.split(pdf_path)
+        category = os.path.basename(folder)
+        text = clean_text(extract_text_from_pdf(pdf_path))
+        chunks = list(iter_chunks(text, filename, folder, category, filename, chunk_tokens, chunk_overlap_tokens))
+        for batch in make_batches(chunks, 256):
+            embeddings = embed_texts([chunk['text'] for chunk in batch], client)
+            index.upsert([{'id': chunk['id'], 'values': values, 'metadata': {'category': category, 'filename': filename}}
+                          for chunk, values in zip(batch, embeddings)])
+    return index, client
+
+def copy_index(source: str, target: str) -> str:
+    """
+    Copy the current generation of the LocalIndex at `source` (meta, float
+    rows and log; no codes or IVF files) to `target`, so it can be
+    re-quantized without touching the original
+    """
+    from pdf2pinecone.local_index import META_FILE
+    with open(os.path.join(source, META_FILE)) as f:
+        generation = json.load(f).get('generation', 0)
+    os.makedirs(target, exist_ok=True)
+    for name in (META_FILE, f"vectors.{generation}.f32", f"log.{generation}.jsonl"):
+        if os.path.exists(os.path.join(source, name)):
+            shutil.copyfile(os.path.join(source, name), os.path.join(target, name))
+    return target
+
+def main():
+    from pdf2pinecone.benchmark import QUERIES, generate_corpus
+    from pdf2pinecone.embeddings import embed_texts
+    from pdf2pinecone.local_index import LocalIndex
+    parser = argparse.ArgumentParser(description="Memory footprint and recall of quantized local vectors against exact float search")
+    parser.add_argument('index_path', type=str, nargs='?', help='Local index directory (default: build one from the benchmark corpus)')
+    parser.add_argument('--corpus', type=str, help='Benchmark PDF folder (generated if empty or omitted)')
+    parser.add_argument('--reports', type=int, default=40, help='Synthetic reports to generate')
+    parser.add_argument('--pages', type=int, default=6, help='Average pages per synthetic report')
+    parser.add_argument('--dimension', type=int, default=256, help='Fake embedding dimension')
+    parser.add_argument('--queries', type=int, default=200, help='Number of query vectors')
+    parser.add_argument('--noise', type=float, default=0.05, help='Gaussian noise added to sampled vectors (index_path mode)')
+    parser.add_argument('--top-k', type=int, default=10, help='Results per query')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.index_path:
+            # Codes are written next to the vectors; build them in a copy
+            index = LocalIndex(copy_index(args.index_path, os.path.join(scratch, 'index')), ann_min_rows=None)
+            vectors = index.sample_vectors(args.queries)
+            rng = np.random.default_rng(0)
+            queries = (vectors + rng.normal(scale=args.noise, size=vectors.shape)).astype(np.float32)
+            source = args.index_path
+        else:
+            corpus = args.corpus or os.path.join(scratch, 'pdfs')
+            if not glob.glob(os.path.join(corpus, '*', '*.pdf')):
+                generate_corpus(corpus, args.reports, args.pages)
+            index, client = build_benchmark_index(os.path.join(scratch, 'index'), corpus, args.dimension, None)
+            texts = [QUERIES[i % len(QUERIES)][0] for i in range(args.queries)]
+            queries = np.array(embed_texts(texts, client), dtype=np.float32)
+            source = corpus
+        print(f"{len(index._rows)} vectors of dimension {index.dimension} from {source}")
+        print(f"{'mode':>8} {'rescore':>8} {'recall':>8} {'mean ms':>9} {'p95 ms':>9} {'resident MB':>12}")
+        for mode in MODES:
+            index.set_quantization(mode)
+            for row in quantization_report(index, queries, args.top_k):
+                if row['mode'] == 'float32' and mode != MODES[0]:
+                    continue
+                print(f"{row['mode']:>8} {row['rescore'] or '-':>8} {row['recall']:>8.3f} {row['mean_ms']:>9.3f} "
+                      f"{row['p95_ms']:>9.3f} {row['resident_bytes'] / 2**20:>12.2f}")
+
+if __name__ == "__main__":
+    main()
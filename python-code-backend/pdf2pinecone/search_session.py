@@ -0,0 +1,286 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from pinecone import Pinecone
+from pdf2pinecone.config import load_config
+from pdf2pinecone.embeddings import EMBEDDING_MODEL, DEFAULT_BATCH_SIZE, DEFAULT_BATCH_TOKENS, make_batches, embed_texts
+from pdf2pinecone.pinecone_utils import generate_embedding
+from pdf2pinecone.embedders import make_embedder
+from pdf2pinecone.embedding_cache import EmbeddingCache
+from pdf2pinecone.local_index import setup_local_index, local_index_options
+from pdf2pinecone.lexical_index import LexicalIndex, hybrid_search, hydrate_from_index
+from pdf2pinecone.chunk_store import ChunkStore
+from pdf2pinecone.similar_reports import SimilarReports, GRAPH_FILE
+from pdf2pinecone.postprocess import collapse, build_results
+from pdf2pinecone.metrics import metrics
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+class QueryEmbeddingCache:
+    """
+    In-memory LRU of query embeddings keyed by (model, normalized query),
+    with a time-to-live, optionally backed by an on-disk EmbeddingCache
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600, disk_cache=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_cache = disk_cache
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Tuple[str, str], Tuple[float, List[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        key = (model, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[0] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        if self.disk_cache is not None:
+            embedding = self.disk_cache.get(model, key[1])
+            if embedding is not None:
+                self._remember(key, embedding)
+                self.hits += 1
+                return embedding
+        self.misses += 1
+        return None
+
+    def put(self, model: str, query: str, embedding: List[float]):
+        key = (model, normalize_query(query))
+        self._remember(key, embedding)
+        if self.disk_cache is not None:
+            self.disk_cache.put(model, key[1], embedding)
+
+    def _remember(self, key: Tuple[str, str], embedding: List[float]):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class SearchSession:
+    """
+    Long-lived search state: one embedder (see embedders.py), one vector index handle,
+    the lexical index, the chunk store and a query embedding cache, created
+    once and reused for every search instead of per query.
+
+    Without a `disk_cache`, query embeddings persist in an EmbeddingCache
+    under QUERY_CACHE_DIR (empty to keep them in memory only), saved by
+    `save` and at interpreter exit.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, index=None, lexical=None, client=None,
+                 model: Optional[str] = None, disk_cache=None, index_name: Optional[str] = None,
+                 chunk_store=None):
+        self.config = config or load_config()
+        self.index_name = index_name or self.config['INDEX_NAME']
+        self._model = model
+        self._index = index
+        self._lexical = lexical
+        self._client = client
+        self._chunk_store = chunk_store
+        self._similar_reports = None
+        self._lock = threading.Lock()
+        if disk_cache is None and self.config['QUERY_CACHE_DIR']:
+            disk_cache = EmbeddingCache(self.config['QUERY_CACHE_DIR'])
+            atexit.register(disk_cache.save)
+        self.query_cache = QueryEmbeddingCache(self.config['QUERY_CACHE_SIZE'],
+                                               self.config['QUERY_CACHE_TTL'] or None, disk_cache)
+
+    def save(self):
+        """
+        Write the on-disk query cache's index, so new embeddings are found next time
+        """
+        if self.query_cache.disk_cache is not None:
+            self.query_cache.disk_cache.save()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = make_embedder(self.config)
+        return self._client
+
+    @property
+    def model(self) -> str:
+        """
+        Embedding model name the query cache is keyed by
+        """
+        return self._model or getattr(self.client, 'model', EMBEDDING_MODEL)
+
+    def _open_index(self):
+        if self.config['VECTOR_STORE'] == 'local':
+            index_path = os.path.join(self.config['LOCAL_INDEX_DIR'], self.index_name)
+            if not any(os.path.exists(os.path.join(index_path, name)) for name in ('meta.json', 'shards.json')):
+                raise ValueError(f"Local index '{index_path}' not found! Please run the main pipeline first.")
+            return setup_local_index(self.config['LOCAL_INDEX_DIR'], self.index_name,
+                                     **local_index_options(self.config))
+        pc = Pinecone(api_key=self.config['PINECONE_API_KEY'])
+        if self.index_name not in [index.name for index in pc.list_indexes()]:
+            raise ValueError(f"Index '{self.index_name}' not found! Please run the main pipeline first.")
+        return pc.Index(self.index_name)
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._open_index()
+        return self._index
+
+    @property
+    def lexical(self) -> Optional[LexicalIndex]:
+        if self._lexical is None and self.config['LEXICAL_INDEX_DIR']:
+            path = os.path.join(self.config['LEXICAL_INDEX_DIR'], self.index_name)
+            if os.path.exists(path):
+                with self._lock:
+                    if self._lexical is None:
+                        self._lexical = LexicalIndex(path)
+        return self._lexical
+
+    @property
+    def chunk_store(self) -> Optional[ChunkStore]:
+        if self._chunk_store is None and self.config['CHUNK_STORE_DIR']:
+            path = os.path.join(self.config['CHUNK_STORE_DIR'], self.index_name)
+            if os.path.exists(path):
+                with self._lock:
+                    if self._chunk_store is None:
+                        self._chunk_store = ChunkStore(path)
+        return self._chunk_store
+
+    @property
+    def similar_reports(self) -> Optional[SimilarReports]:
+        if self._similar_reports is None and self.config['SIMILAR_REPORTS_DIR']:
+            path = os.path.join(self.config['SIMILAR_REPORTS_DIR'], self.index_name)
+            if os.path.exists(os.path.join(path, GRAPH_FILE)):
+                with self._lock:
+                    if self._similar_reports is None:
+                        self._similar_reports = SimilarReports(path, self.config['SIMILAR_REPORTS_K'])
+        return self._similar_reports
+
+    def similar(self, filename: str, top_k: int = 5, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Reports nearest to `filename` from the precomputed graph; no
+        embedding or index query
+        """
+        graph = self.similar_reports
+        return graph.similar(filename, top_k, category) if graph is not None else []
+
+    def embed(self, query: str) -> Optional[List[float]]:
+        embedding = self.query_cache.get(self.model, query)
+        metrics.inc('query_cache_hits_total' if embedding is not None else 'query_cache_misses_total')
+        if embedding is None:
+            logging.info(f"Generating embedding for query: '{query}'")
+            embedding = generate_embedding(normalize_query(query), self.client, self.model)
+            if embedding is not None:
+                self.query_cache.put(self.model, query, embedding)
+        return embedding
+
+    def embed_many(self, queries: List[str], max_inputs: int = DEFAULT_BATCH_SIZE,
+                   max_tokens: int = DEFAULT_BATCH_TOKENS,
+                   embeddings: Optional[Dict[str, List[float]]] = None) -> int:
+        """
+        Put embeddings for every uncached query in the query cache using as
+        few requests as the batch limits allow; returns the request count.
+        Failed batches are logged and left to `embed` at search time.
+        `embeddings` also receives every query's embedding, cached or new,
+        keyed by normalized query: pass it to `search` when there are more
+        queries than the cache holds.
+        """
+        missing = []
+        for query in dict.fromkeys(normalize_query(query) for query in queries):
+            embedding = self.query_cache.get(self.model, query)
+            if embedding is None:
+                missing.append(query)
+            elif embeddings is not None:
+                embeddings[query] = embedding
+        requests = 0
+        for batch in make_batches([{'text': query} for query in missing], max_inputs, max_tokens):
+            texts = [item['text'] for item in batch]
+            try:
+                vectors = embed_texts(texts, self.client, self.model)
+            except Exception as e:
+                logging.error(f"Error embedding {len(texts)} queries: {str(e)}")
+                continue
+            finally:
+                requests += 1
+            for text, embedding in zip(texts, vectors):
+                self.query_cache.put(self.model, text, embedding)
+                if embeddings is not None:
+                    embeddings[text] = embedding
+        return requests
+
+    def search(self, query: str, top_k: int = 5, category: Optional[str] = None, mode: Optional[str] = None,
+               hydrate: bool = True, embeddings: Optional[Dict[str, List[float]]] = None):
+        """
+        Run one search; returns None if the query embedding fails. Match
+        metadata['text'] is filled from the chunk store or the vector index
+        (see _hydrate), unless `hydrate` is off. `embeddings` (from `embed_many`) is looked up
+        before the query cache.
+        """
+        filter_dict = {"category": {"$eq": category}} if category else None
+        def embed(text: str) -> Optional[List[float]]:
+            if embeddings is not None and normalize_query(text) in embeddings:
+                return embeddings[normalize_query(text)]
+            return self.embed(text)
+        with metrics.timer('search_seconds'):
+            results = hybrid_search(query, self.index, self.lexical, embed, top_k=top_k,
+                                    filter=filter_dict, mode=mode or self.config['SEARCH_MODE'])
+            if hydrate and results is not None:
+                self._hydrate(results.matches)
+        return results
+
+    def _hydrate(self, matches):
+        """
+        Fill the text of matches from the chunk store, or without one from
+        the vector index (lexical hits carry no text)
+        """
+        with metrics.timer('hydrate_seconds'):
+            if self.chunk_store is not None:
+                self.chunk_store.hydrate(matches)
+            else:
+                hydrate_from_index(self.index, matches)
+
+    def search_reports(self, query: str, top_k: int = 5, category: Optional[str] = None, mode: Optional[str] = None,
+                       chunks_per_report: Optional[int] = None, snippet_chars: Optional[int] = None,
+                       max_candidates: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Search for `top_k` distinct reports with up to `chunks_per_report`
+        matching chunks each, as postprocess.build_results output; returns
+        None if the query embedding fails.
+
+        Chunks are fetched `top_k * chunks_per_report` (at least twice
+        `top_k`) at a time; while the distinct reports fall short of `top_k`
+        the fetch grows by the observed chunks-per-report ratio, up to
+        `max_candidates`. The query embedding is cached, so a deeper fetch
+        costs one more index query. Only the chunks kept are hydrated.
+        """
+        chunks_per_report = chunks_per_report or self.config['RESULT_CHUNKS_PER_REPORT']
+        limit = max(max_candidates or self.config['RESULT_MAX_CANDIDATES'], top_k)
+        depth = min(top_k * max(chunks_per_report, 2), limit)
+        while True:
+            results = self.search(query, top_k=depth, category=category, mode=mode, hydrate=False)
+            if results is None:
+                return None
+            groups = collapse(results.matches, top_k, chunks_per_report)
+            if len(groups) >= top_k or len(results.matches) < depth or depth >= limit:
+                break
+            metrics.inc('search_refetches_total')
+            depth = min(limit, max(depth * 2, -(-depth * top_k // max(len(groups), 1)) * 5 // 4))
+        kept = [match for group in groups for match in group]
+        self._hydrate(kept)
+        with metrics.timer('postprocess_seconds'):
+            return build_results(query, groups, snippet_chars or self.config['SNIPPET_CHARS'],
+                                 category=category, top_k=top_k, chunks_per_report=chunks_per_report,
+                                 candidates=depth)
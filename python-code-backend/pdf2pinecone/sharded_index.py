@@ -0,0 +1,338 @@
+import os
+import re
+import json
+import glob
+import time
+import zlib
+import heapq
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from pdf2pinecone.ann import normalize
+from pdf2pinecone.local_index import LocalIndex, QueryResponse
+
+SHARDS_FILE = "shards.json"
+SHARD_PREFIX = "shard-"
+
+def shard_group(category: Optional[str]) -> str:
+    return re.sub(r'[^\w\-]+', '_', category or '') or '_'
+
+class ShardedLocalIndex:
+    """
+    LocalIndex split into shards that are scanned in parallel.
+
+    Ids are spread over `shards` partitions by a stable hash; with
+    `shard_by='category'` every category gets its own partitions
+    (incident.0, incident.1, ...), so a query filtered to one category only
+    touches that category's shards. Each shard is an ordinary LocalIndex in
+    shard-<name>/ with its own memory-mapped vector file, IVF lists and
+    codes, so worker threads score shards straight from the shared page
+    cache without copying them; NumPy releases the GIL for the scoring, and
+    every shard keeps its own lock. Per-shard top-k lists are merged into
+    the global top-k. The partitioning is recorded in shards.json and wins
+    over the arguments when the index already exists.
+    """
+
+    def __init__(self, path: str, dimension: Optional[int] = None, shards: int = 4,
+                 shard_by: Optional[str] = None, query_workers: Optional[int] = None, **options):
+        self.path = path
+        self.options = options
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, "meta.json")):
+            raise ValueError(f"Local index {path} is not sharded; re-ingest into a new LOCAL_INDEX_DIR "
+                             f"or convert it with pdf2pinecone.sharded_index.reshard")
+        layout_path = os.path.join(path, SHARDS_FILE)
+        if os.path.exists(layout_path):
+            with open(layout_path) as f:
+                layout = json.load(f)
+            if dimension and dimension != layout['dimension']:
+                raise ValueError(f"Local index {path} has dimension {layout['dimension']}, not {dimension}")
+            if (shards > 1 or shard_by) and (layout['shards'], layout['shard_by']) != (shards, shard_by):
+                logging.warning(f"Local index {path} keeps its {layout['shards']} shards "
+                                f"by {layout['shard_by'] or 'id'}")
+            self.dimension, self.shards, self.shard_by = layout['dimension'], layout['shards'], layout['shard_by']
+        else:
+            if not dimension:
+                raise ValueError(f"Local index {path} does not exist and no dimension was given")
+            if shard_by not in (None, 'category'):
+                raise ValueError(f"Unknown shard key {shard_by!r}, expected 'category' or none")
+            self.dimension, self.shards, self.shard_by = dimension, max(1, shards), shard_by
+            with open(layout_path + ".tmp", 'w') as f:
+                json.dump({'dimension': self.dimension, 'shards': self.shards, 'shard_by': self.shard_by}, f)
+            os.replace(layout_path + ".tmp", layout_path)
+        self._lock = threading.RLock()
+        self._shards: Dict[str, LocalIndex] = {}
+        self._owners: Dict[str, str] = {}
+        for shard_path in sorted(glob.glob(os.path.join(path, SHARD_PREFIX + "*"))):
+            name = os.path.basename(shard_path)[len(SHARD_PREFIX):]
+            shard = LocalIndex(shard_path, self.dimension, **options)
+            self._shards[name] = shard
+            self._owners.update(dict.fromkeys(shard._rows, name))
+        self._executor = ThreadPoolExecutor(max_workers=query_workers or os.cpu_count() or 1,
+                                            thread_name_prefix='shard')
+
+    def _shard_name(self, id: str, metadata: Optional[Dict[str, Any]]) -> str:
+        partition = str(zlib.crc32(id.encode()) % self.shards)
+        if self.shard_by:
+            return f"{shard_group((metadata or {}).get(self.shard_by))}.{partition}"
+        return partition
+
+    def _shard(self, name: str) -> LocalIndex:
+        with self._lock:
+            if name not in self._shards:
+                self._shards[name] = LocalIndex(os.path.join(self.path, SHARD_PREFIX + name), self.dimension,
+                                                **self.options)
+            return self._shards[name]
+
+    def _route(self, filter: Optional[Dict[str, Any]]) -> List[LocalIndex]:
+        """
+        Shards that can hold rows matching `filter`
+        """
+        with self._lock:
+            shards = dict(self._shards)
+        condition = (filter or {}).get(self.shard_by) if self.shard_by else None
+        if isinstance(condition, dict) and len(condition) == 1:
+            op, value = next(iter(condition.items()))
+            groups = {shard_group(value)} if op == '$eq' else {shard_group(v) for v in value} if op == '$in' else None
+        elif condition is not None and not isinstance(condition, dict):
+            groups = {shard_group(condition)}
+        else:
+            groups = None
+        if groups is None:
+            return list(shards.values())
+        return [shard for name, shard in shards.items() if name.rsplit('.', 1)[0] in groups]
+
+    def _map(self, function, items: List[Any]) -> List[Any]:
+        if len(items) <= 1:
+            return [function(item) for item in items]
+        return list(self._executor.map(function, items))
+
+    def upsert(self, vectors: List[Dict[str, Any]], **kwargs) -> Dict[str, int]:
+        if not vectors:
+            return {'upserted_count': 0}
+        latest = {}
+        for vector in vectors:
+            latest[vector['id']] = vector
+        batches: Dict[str, List[Dict[str, Any]]] = {}
+        # id -> the shard holding it before its category changed
+        moved: Dict[str, str] = {}
+        with self._lock:
+            for vector in latest.values():
+                name = self._shard_name(vector['id'], vector.get('metadata'))
+                batches.setdefault(name, []).append(vector)
+                owner = self._owners.get(vector['id'])
+                if owner is not None and owner != name:
+                    moved[vector['id']] = owner
+            shards = {name: self._shard(name) for name in batches}
+
+        def upsert_shard(name: str) -> Optional[Exception]:
+            try:
+                shards[name].upsert(batches[name])
+            except Exception as e:
+                return e
+            return None
+
+        names = list(batches)
+        errors = dict(zip(names, self._map(upsert_shard, names)))
+        with self._lock:
+            # Only ids a shard has actually stored are routed to it, and only
+            # then are they retired from the shard that held them before
+            retired: Dict[str, List[str]] = {}
+            for name in names:
+                if errors[name] is not None:
+                    continue
+                for vector in batches[name]:
+                    owner = moved.get(vector['id'])
+                    if owner is not None and self._owners.get(vector['id']) == owner:
+                        retired.setdefault(owner, []).append(vector['id'])
+                    self._owners[vector['id']] = name
+            for owner, ids in retired.items():
+                self._shards[owner].delete(ids=ids)
+        failed = [error for error in errors.values() if error is not None]
+        if failed:
+            raise failed[0]
+        return {'upserted_count': len(latest)}
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[Dict[str, Any]] = None,
+               delete_all: bool = False, **kwargs):
+        with self._lock:
+            if delete_all or filter:
+                for shard in (self._shards.values() if delete_all else self._route(filter)):
+                    shard.delete(filter=filter, delete_all=delete_all)
+                self._owners = {id: name for name, shard in self._shards.items() for id in shard._rows}
+                return {}
+            owned: Dict[str, List[str]] = {}
+            for id in ids or []:
+                name = self._owners.pop(id, None)
+                if name is not None:
+                    owned.setdefault(name, []).append(id)
+            for name, shard_ids in owned.items():
+                self._shards[name].delete(ids=shard_ids)
+            return {}
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        owned: Dict[str, List[str]] = {}
+        with self._lock:
+            for id in ids:
+                if id in self._owners:
+                    owned.setdefault(self._owners[id], []).append(id)
+            shards = {name: self._shards[name] for name in owned}
+        vectors = {}
+        for name, shard_ids in owned.items():
+            vectors.update(shards[name].fetch(shard_ids))
+        return vectors
+
+    def query(self, vector: List[float], top_k: int = 10, filter: Optional[Dict[str, Any]] = None,
+              **kwargs) -> QueryResponse:
+        """
+        Query every shard the filter can match in the worker pool and merge
+        their top-k lists
+        """
+        query = normalize(np.asarray(vector, dtype=np.float32))
+        shards = self._route(filter)
+        responses = self._map(lambda shard: shard.query(query, top_k=top_k, filter=filter, **kwargs), shards)
+        if len(responses) == 1:
+            return responses[0]
+        matches = [match for response in responses for match in response.matches]
+        return QueryResponse(heapq.nlargest(top_k, matches, key=lambda match: match.score))
+
+    def describe_index_stats(self, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            shards = {name: len(shard._rows) for name, shard in self._shards.items()}
+        return {'dimension': self.dimension, 'total_vector_count': sum(shards.values()), 'shards': shards}
+
+    def shard_sizes(self) -> Dict[str, int]:
+        return self.describe_index_stats()['shards']
+
+    @property
+    def ann_trained(self) -> bool:
+        return bool(self._shards) and all(shard.ann_trained for shard in self._shards.values())
+
+    @property
+    def float_bytes(self) -> int:
+        return sum(shard.float_bytes for shard in self._shards.values())
+
+    @property
+    def quantized_bytes(self) -> int:
+        return sum(shard.quantized_bytes for shard in self._shards.values())
+
+    @property
+    def quantization(self) -> Optional[str]:
+        return self.options.get('quantization')
+
+    def set_quantization(self, quantization: Optional[str]):
+        self.options['quantization'] = quantization
+        self._map(lambda shard: shard.set_quantization(quantization), list(self._shards.values()))
+
+    def build_ann(self, nlist: Optional[int] = None):
+        self._map(lambda shard: shard.build_ann(nlist), list(self._shards.values()))
+
+    def compact(self):
+        self._map(lambda shard: shard.compact(), list(self._shards.values()))
+
+    def sample_vectors(self, count: int, seed: int = 0) -> np.ndarray:
+        samples = [shard.sample_vectors(count, seed) for shard in self._shards.values()]
+        vectors = np.concatenate(samples) if samples else np.empty((0, self.dimension), dtype=np.float32)
+        rows = np.random.default_rng(seed).choice(len(vectors), min(count, len(vectors)), replace=False)
+        return vectors[np.sort(rows)]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+def reshard(source: LocalIndex, target: ShardedLocalIndex, block_size: int = 8192):
+    """
+    Copy every live row of an unsharded LocalIndex into `target`
+    """
+    live = [row for row, id in enumerate(source._ids) if id is not None]
+    matrix = source._matrix_view()
+    for start in range(0, len(live), block_size):
+        rows = live[start:start + block_size]
+        block = np.asarray(matrix[rows])
+        target.upsert([{'id': source._ids[row], 'values': values, 'metadata': source._metadata[row]}
+                       for row, values in zip(rows, block)])
+    logging.info(f"Copied {len(live)} vectors from {source.path} into {len(target._shards)} shards at {target.path}")
+
+def throughput_report(index, queries: np.ndarray, top_k: int = 10, concurrency: int = 8,
+                      filters: Optional[List[Optional[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+    """
+    Queries per second with `concurrency` clients querying at once, and
+    per-query latency
+    """
+    filters = filters or [None]
+
+    def run(position: int) -> Tuple[float, List[str]]:
+        start = time.perf_counter()
+        response = index.query(queries[position], top_k=top_k, filter=filters[position % len(filters)])
+        return (time.perf_counter() - start) * 1000, [match.id for match in response.matches]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        results = list(clients.map(run, range(len(queries))))
+    elapsed = time.perf_counter() - start
+    latencies = np.array([latency for latency, _ in results])
+    return {
+        'queries_per_s': len(queries) / elapsed,
+        'mean_ms': float(latencies.mean()),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'results': [ids for _, ids in results],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent query throughput of the local index by shard count")
+    parser.add_argument('index_path', type=str, nargs='?', help='Unsharded local index to copy (default: random vectors)')
+    parser.add_argument('--vectors', type=int, default=200000, help='Random vectors when no index is given')
+    parser.add_argument('--dimension', type=int, default=384, help='Dimension of the random vectors')
+    parser.add_argument('--shards', type=str, default=f"1,2,4,{os.cpu_count() or 1}", help='Shard counts to compare')
+    parser.add_argument('--by-category', action='store_true', help='Shard by category as well as by id')
+    parser.add_argument('--queries', type=int, default=400, help='Number of queries')
+    parser.add_argument('--concurrency', type=int, default=os.cpu_count() or 1, help='Concurrent clients')
+    parser.add_argument('--workers', type=int, help='Shard query workers (default: one per core)')
+    parser.add_argument('--top-k', type=int, default=10, help='Results per query')
+    parser.add_argument('--category', action='store_true', help='Filter alternate queries to one category')
+    parser.add_argument('--exact', action='store_true', help='Disable IVF in the shards')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    rng = np.random.default_rng(0)
+    options = {'ann_min_rows': None} if args.exact else {}
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.index_path:
+            source = LocalIndex(args.index_path, **options)
+        else:
+            source = LocalIndex(os.path.join(scratch, 'source'), args.dimension, **options)
+            categories = np.where(rng.random(args.vectors) < 0.9, 'incident', 'accident')
+            for start in range(0, args.vectors, 20000):
+                block = rng.normal(size=(min(20000, args.vectors - start), args.dimension)).astype(np.float32)
+                source.upsert([{'id': f"v{start + i}", 'values': values, 'metadata': {'category': categories[start + i]}}
+                               for i, values in enumerate(block)])
+        vectors = source.sample_vectors(args.queries)
+        queries = normalize(vectors + rng.normal(scale=0.05, size=vectors.shape)).astype(np.float32)
+        filters = [None, {'category': {'$eq': 'incident'}}] if args.category else [None]
+        exact = [[match.id for match in source.query(query, args.top_k, filter=filters[i % len(filters)], exact=True).matches]
+                 for i, query in enumerate(queries)]
+
+        def recall(results: List[List[str]]) -> float:
+            return float(np.mean([len(set(found) & set(expected)) / max(len(expected), 1)
+                                  for found, expected in zip(results, exact)]))
+
+        baseline = throughput_report(source, queries, args.top_k, args.concurrency, filters)
+        print(f"{len(source._rows)} vectors of dimension {source.dimension}, {args.concurrency} concurrent clients")
+        print(f"{'shards':>8} {'qps':>9} {'speedup':>8} {'mean ms':>9} {'p95 ms':>9} {'recall':>8}")
+        print(f"{'-':>8} {baseline['queries_per_s']:>9.1f} {1:>8.2f} {baseline['mean_ms']:>9.3f} "
+              f"{baseline['p95_ms']:>9.3f} {recall(baseline['results']):>8.3f}")
+        for count in sorted({int(value) for value in args.shards.split(',')}):
+            target = ShardedLocalIndex(os.path.join(scratch, f"shards-{count}"), source.dimension, count,
+                                       'category' if args.by_category else None, args.workers, **options)
+            reshard(source, target)
+            report = throughput_report(target, queries, args.top_k, args.concurrency, filters)
+            print(f"{len(target._shards):>8} {report['queries_per_s']:>9.1f} "
+                  f"{report['queries_per_s'] / baseline['queries_per_s']:>8.2f} {report['mean_ms']:>9.3f} "
+                  f"{report['p95_ms']:>9.3f} {recall(report['results']):>8.3f}")
+            target.close()
+
+if __name__ == "__main__":
+    main()
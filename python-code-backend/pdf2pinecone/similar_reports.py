@@ -0,0 +1,320 @@
+import os
+import json
+import logging
+import argparse
+import threading
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+import numpy as np
+from pdf2pinecone.ann import normalize
+
+GRAPH_FILE = "graph.json"
+
+def nearest(queries: np.ndarray, matrix: np.ndarray, k: int, query_rows: Optional[np.ndarray] = None,
+            live: Optional[np.ndarray] = None, offset: int = 0, best: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+            block_size: int = 8192) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k rows of `matrix` by dot product for every query row, scanning
+    `matrix` in column blocks; returns (row indices + offset, scores), padded
+    with -1 / -inf. `query_rows` excludes each query's own row, `live` masks
+    dead rows and `best` is an earlier top-k to merge into.
+    """
+    if best is None:
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    else:
+        indices, scores = best[0].astype(np.int64), best[1].astype(np.float32)
+    for start in range(0, len(matrix), block_size):
+        block = np.asarray(matrix[start:start + block_size])
+        block_scores = queries @ block.T
+        if live is not None:
+            block_scores[:, ~live[start:start + len(block)]] = -np.inf
+        if query_rows is not None:
+            own = (query_rows >= offset + start) & (query_rows < offset + start + len(block))
+            block_scores[np.flatnonzero(own), query_rows[own] - offset - start] = -np.inf
+        columns = np.arange(offset + start, offset + start + len(block))
+        if len(block) > k:
+            top = np.argpartition(-block_scores, k - 1, axis=1)[:, :k]
+            block_scores = np.take_along_axis(block_scores, top, axis=1)
+            candidates = columns[top]
+        else:
+            candidates = np.broadcast_to(columns, block_scores.shape)
+        merged_scores = np.concatenate([scores, block_scores], axis=1)
+        merged = np.concatenate([indices, candidates], axis=1)
+        top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(merged_scores, top, axis=1)
+        indices = np.take_along_axis(merged, top, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    scores = np.take_along_axis(scores, order, axis=1)
+    indices = np.take_along_axis(indices, order, axis=1)
+    indices[~np.isfinite(scores)] = -1
+    return indices, scores
+
+class SimilarReports:
+    """
+    "Reports like this one": a k-nearest-report graph built at ingest time.
+
+    Each report's vector is the normalised mean of its chunk vectors, fed in
+    by `add_vectors` as the chunks are upserted (near-duplicate chunks that
+    were not embedded do not count) and folded into the graph by `commit`.
+    New and changed reports get a full blocked top-k scan; every other
+    report only scores the new rows against its current neighbours, and
+    reports that pointed at a changed or removed report are rescanned.
+    On disk the graph is a fixed-width adjacency list (int32 neighbour rows
+    and float16 scores, `k` per report) next to an append-only float32
+    vector file, so a lookup is a dictionary hit and one row read.
+    """
+
+    def __init__(self, path: str, k: int = 10, block_size: int = 512):
+        self.path = path
+        self.k = k
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Any]] = {}
+        os.makedirs(path, exist_ok=True)
+        self.dimension: Optional[int] = None
+        self._names: List[Optional[str]] = []
+        self._categories: List[Optional[str]] = []
+        graph_path = os.path.join(path, GRAPH_FILE)
+        if os.path.exists(graph_path):
+            with open(graph_path) as f:
+                graph = json.load(f)
+            self.dimension = graph['dimension']
+            self._names = graph['names']
+            self._categories = graph['categories']
+            if graph['k'] != k:
+                logging.info(f"Rebuilding similar reports in {path} for k={k}")
+        self._rows = {name: row for row, name in enumerate(self._names) if name is not None}
+        self._neighbours = np.full((len(self._names), k), -1, dtype=np.int32)
+        self._scores = np.full((len(self._names), k), -np.inf, dtype=np.float16)
+        self._matrix = None
+        stale = np.ones(len(self._names), dtype=bool)
+        if self.dimension:
+            self._truncate_vectors()
+            if os.path.exists(graph_path) and graph['k'] == k:
+                neighbours = np.fromfile(self._path('neighbours.i32'), dtype=np.int32) \
+                    if os.path.exists(self._path('neighbours.i32')) else np.empty(0, dtype=np.int32)
+                scores = np.fromfile(self._path('scores.f16'), dtype=np.float16) \
+                    if os.path.exists(self._path('scores.f16')) else np.empty(0, dtype=np.float16)
+                if len(neighbours) == len(scores) == len(self._names) * k:
+                    self._neighbours = neighbours.reshape(-1, k)
+                    self._scores = scores.reshape(-1, k)
+                    stale[:] = False
+        if stale.any() and self._rows:
+            # Adjacency missing or from an interrupted save
+            self._rescan(np.flatnonzero(stale & self._live()))
+            self._save()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _truncate_vectors(self):
+        size = len(self._names) * self.dimension * 4
+        if os.path.exists(self._path('vectors.f32')) and os.path.getsize(self._path('vectors.f32')) > size:
+            with open(self._path('vectors.f32'), 'r+b') as f:
+                f.truncate(size)
+
+    def _live(self) -> np.ndarray:
+        return np.fromiter((name is not None for name in self._names), dtype=bool, count=len(self._names))
+
+    def _matrix_view(self) -> np.ndarray:
+        if self._matrix is None:
+            if not self._names:
+                self._matrix = np.empty((0, self.dimension or 0), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self._path('vectors.f32'), dtype=np.float32, mode='r',
+                                         shape=(len(self._names), self.dimension))
+        return self._matrix
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self._rows
+
+    def add_vectors(self, vectors: List[Dict[str, Any]]):
+        """
+        Accumulate upserted chunk vectors ({'values', 'metadata'}) into
+        their report's running sum
+        """
+        with self._lock:
+            for vector in vectors:
+                metadata = vector.get('metadata') or {}
+                filename = metadata.get('filename')
+                if not filename:
+                    continue
+                values = normalize(np.asarray(vector['values'], dtype=np.float32))
+                entry = self._pending.get(filename)
+                if entry is None:
+                    self._pending[filename] = [values.astype(np.float64), 1, metadata.get('category')]
+                else:
+                    entry[0] += values
+                    entry[1] += 1
+
+    @property
+    def pending(self) -> List[str]:
+        return list(self._pending)
+
+    def commit(self, filenames: Optional[Iterable[str]] = None, removed: Iterable[str] = ()) -> Dict[str, int]:
+        """
+        Add or replace the accumulated reports (only those in `filenames`
+        when given, e.g. files whose upload completed), drop `removed`
+        reports and save the graph
+        """
+        with self._lock:
+            keep = set(filenames) if filenames is not None else None
+            reports = {filename: (entry[2], entry[0] / entry[1]) for filename, entry in self._pending.items()
+                       if keep is None or filename in keep}
+            self._pending.clear()
+            removed = [filename for filename in removed if filename in self._rows and filename not in reports]
+            if not reports and not removed:
+                return {'added': 0, 'removed': 0, 'rescanned': 0}
+            rescanned = self._update(reports, removed)
+            self._save()
+        logging.info(f"Similar reports: {len(reports)} added or updated, {len(removed)} removed, "
+                     f"{rescanned} neighbour lists rescanned, {len(self._rows)} reports")
+        return {'added': len(reports), 'removed': len(removed), 'rescanned': rescanned}
+
+    def _update(self, reports: Dict[str, Tuple[Optional[str], np.ndarray]], removed: List[str]) -> int:
+        dead = []
+        for filename in list(reports) + removed:
+            row = self._rows.pop(filename, None)
+            if row is not None:
+                self._names[row] = None
+                self._categories[row] = None
+                dead.append(row)
+        first_new = len(self._names)
+        if reports:
+            matrix = normalize(np.array([vector for _, vector in reports.values()], dtype=np.float32))
+            if self.dimension is None:
+                self.dimension = matrix.shape[1]
+            elif matrix.shape[1] != self.dimension:
+                raise ValueError(f"Similar reports in {self.path} have dimension {self.dimension}, not {matrix.shape[1]}")
+            with open(self._path('vectors.f32'), 'ab') as f:
+                f.write(matrix.astype(np.float32).tobytes())
+            for filename, (category, _) in reports.items():
+                self._rows[filename] = len(self._names)
+                self._names.append(filename)
+                self._categories.append(category)
+            self._matrix = None
+            grow = len(self._names) - first_new
+            self._neighbours = np.vstack([self._neighbours, np.full((grow, self.k), -1, dtype=np.int32)])
+            self._scores = np.vstack([self._scores, np.full((grow, self.k), -np.inf, dtype=np.float16)])
+        live = self._live()
+        old = np.arange(first_new)
+        stale = live[:first_new] & np.isin(self._neighbours[:first_new], dead).any(axis=1) if dead else \
+            np.zeros(first_new, dtype=bool)
+        rescan = np.concatenate([np.arange(first_new, len(self._names)), old[stale]])
+        self._rescan(rescan)
+        others = old[live[:first_new] & ~stale]
+        if len(self._names) > first_new and len(others):
+            matrix = self._matrix_view()
+            for start in range(0, len(others), self.block_size):
+                rows = others[start:start + self.block_size]
+                indices, scores = nearest(np.asarray(matrix[rows]), matrix[first_new:], self.k, live=live[first_new:],
+                                          offset=first_new, best=(self._neighbours[rows], self._scores[rows]))
+                self._neighbours[rows] = indices
+                self._scores[rows] = scores
+        retired = len(self._names) - len(self._rows)
+        if retired > 1000 and retired > len(self._rows):
+            self._compact()
+        return len(rescan)
+
+    def _rescan(self, rows: np.ndarray):
+        """
+        Recompute the neighbour lists of `rows` against every live report
+        """
+        matrix = self._matrix_view()
+        live = self._live()
+        for start in range(0, len(rows), self.block_size):
+            block = rows[start:start + self.block_size]
+            indices, scores = nearest(np.asarray(matrix[block]), matrix, self.k, query_rows=block, live=live)
+            self._neighbours[block] = indices
+            self._scores[block] = scores
+
+    def _compact(self):
+        live = self._live()
+        remap = np.cumsum(live) - 1
+        kept = np.array(self._matrix_view()[live])
+        with open(self._path('vectors.f32.tmp'), 'wb') as f:
+            f.write(kept.tobytes())
+        os.replace(self._path('vectors.f32.tmp'), self._path('vectors.f32'))
+        neighbours = self._neighbours[live]
+        self._neighbours = np.where(neighbours >= 0, remap[np.maximum(neighbours, 0)], -1).astype(np.int32)
+        self._scores = self._scores[live]
+        self._names = [name for name in self._names if name is not None]
+        self._categories = [category for category, alive in zip(self._categories, live) if alive]
+        self._rows = {name: row for row, name in enumerate(self._names)}
+        self._matrix = None
+
+    def _save(self):
+        for name, array in (('neighbours.i32', self._neighbours), ('scores.f16', self._scores)):
+            with open(self._path(name + '.tmp'), 'wb') as f:
+                f.write(np.ascontiguousarray(array).tobytes())
+            os.replace(self._path(name + '.tmp'), self._path(name))
+        with open(self._path(GRAPH_FILE + '.tmp'), 'w') as f:
+            json.dump({'dimension': self.dimension, 'k': self.k, 'names': self._names,
+                       'categories': self._categories}, f)
+        os.replace(self._path(GRAPH_FILE + '.tmp'), self._path(GRAPH_FILE))
+
+    def similar(self, filename: str, top_k: Optional[int] = None,
+                category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        The reports nearest to `filename`, best first (empty if unknown);
+        `category` filters the precomputed neighbours
+        """
+        row = self._rows.get(filename)
+        if row is None:
+            return []
+        results = []
+        for neighbour, score in zip(self._neighbours[row], self._scores[row]):
+            if neighbour < 0 or (category and self._categories[neighbour] != category):
+                continue
+            results.append({'filename': self._names[neighbour], 'category': self._categories[neighbour],
+                            'score': float(score)})
+        return results[:top_k or self.k]
+
+    def backfill(self, index, chunk_ids: Dict[str, List[str]], batch_size: int = 100) -> int:
+        """
+        Fetch the stored chunk vectors of reports the graph lacks
+        ({filename: chunk ids}), e.g. files ingested before the graph
+        existed; returns the number of reports fetched
+        """
+        missing = {filename: ids for filename, ids in chunk_ids.items()
+                   if filename not in self._rows and filename not in self._pending}
+        ids = [id for chunk_list in missing.values() for id in chunk_list]
+        for start in range(0, len(ids), batch_size):
+            response = index.fetch(ids=ids[start:start + batch_size])
+            vectors = response.vectors if hasattr(response, 'vectors') else response
+            self.add_vectors([vector if isinstance(vector, dict) else
+                              {'values': vector.values, 'metadata': vector.metadata}
+                              for vector in vectors.values()])
+        if missing:
+            logging.info(f"Fetched {len(ids)} chunk vectors for {len(missing)} reports missing from the similar-reports graph")
+        return len(missing)
+
+def main():
+    from pdf2pinecone.config import load_config
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Reports most similar to a given report")
+    parser.add_argument('filename', type=str, help='Report PDF file name, e.g. incident_report_0001.pdf')
+    parser.add_argument('--index-name', type=str, default=config['INDEX_NAME'], help='Index the graph belongs to')
+    parser.add_argument('--top-k', type=int, help='Number of reports (default: all stored neighbours)')
+    parser.add_argument('--category', type=str, choices=['incident', 'accident'], help='Only reports of this category')
+    parser.add_argument('--json', action='store_true', help='Print JSON')
+    args = parser.parse_args()
+    path = os.path.join(config['SIMILAR_REPORTS_DIR'], args.index_name)
+    if not os.path.exists(os.path.join(path, GRAPH_FILE)):
+        raise SystemExit(f"No similar-reports graph in {path}; run the ingest pipeline first")
+    graph = SimilarReports(path, config['SIMILAR_REPORTS_K'])
+    if args.filename not in graph:
+        raise SystemExit(f"{args.filename} is not in the similar-reports graph")
+    results = graph.similar(args.filename, args.top_k, args.category)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"Reports similar to {args.filename}:")
+    for rank, result in enumerate(results, 1):
+        print(f"{rank:>3}. {result['score']:.4f}  {result['category'] or '-':<9} {result['filename']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,16 @@
 #!/usr/bin/env python3
 """
 DGCA Reports Master Scraper
-Runs both incident and accident report scrapers.
+Downloads incident and accident reports concurrently through one
+shared download pool.
 """
 
 import sys
-import os
 import logging
+import argparse
 from pathlib import Path
 
-# Add the scrapers directory to the path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'scrapers'))
-
-from scrapers.incident_scraper import main as run_incident_scraper
-from scrapers.accident_scraper import main as run_accident_scraper
+from scrapers.downloader import REPORT_PAGES, RENDER_MODES, download_reports
 
 def setup_logging():
     """Setup logging for the master scraper"""
@@ -28,6 +25,14 @@ def setup_logging():
     return logging.getLogger(__name__)
 
 def main():
+    parser = argparse.ArgumentParser(description="Download DGCA incident and accident reports")
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent downloads across both categories')
+    parser.add_argument('--max-pages', type=int, help='Listing pages to walk per category')
+    parser.add_argument('--incident-url', type=str, default=REPORT_PAGES['incident'], help='Incident listing page')
+    parser.add_argument('--accident-url', type=str, default=REPORT_PAGES['accident'], help='Accident listing page')
+    parser.add_argument('--render', type=str, choices=RENDER_MODES, default='auto',
+                        help='Read listings in a headless browser: when the HTML has no report links, always or never')
+    args = parser.parse_args()
     logger = setup_logging()
     logger.info("🚀 Starting DGCA Reports Master Scraper...")
     
@@ -41,17 +46,13 @@ def main():
     logger.info(f"Created directories: {incident_dir}, {accident_dir}")
     
     try:
-        # Run incident scraper
-        logger.info("\n" + "="*60)
-        logger.info("STARTING INCIDENT REPORTS SCRAPER")
-        logger.info("="*60)
-        run_incident_scraper()
-        
-        # Run accident scraper
         logger.info("\n" + "="*60)
-        logger.info("STARTING ACCIDENT REPORTS SCRAPER")
+        logger.info("DOWNLOADING INCIDENT AND ACCIDENT REPORTS")
         logger.info("="*60)
-        run_accident_scraper()
+        listings = {'incident': args.incident_url, 'accident': args.accident_url}
+        counts = download_reports(listings, "pdfs", args.workers, args.max_pages, render=args.render)
+        if counts.get('failed') or counts.get('listing_failed'):
+            raise RuntimeError(f"{counts.get('failed', 0)} downloads and {counts.get('listing_failed', 0)} listings failed")
         
         logger.info("\n" + "="*60)
         logger.info("✅ ALL SCRAPERS COMPLETED SUCCESSFULLY!")
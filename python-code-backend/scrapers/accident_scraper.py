@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+DGCA Accident Reports Scraper
+Downloads every accident report into pdfs/accident/.
+"""
+
+import sys
+import logging
+from scrapers.downloader import REPORT_PAGES, download_reports
+
+def main(root: str = "pdfs", workers: int = 8):
+    counts = download_reports({'accident': REPORT_PAGES['accident']}, root, workers)
+    if counts.get('failed') or counts.get('listing_failed'):
+        raise RuntimeError(f"{counts.get('failed', 0)} accident reports failed to download")
+    return counts
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        main()
+    except RuntimeError as e:
+        logging.error(str(e))
+        sys.exit(1)
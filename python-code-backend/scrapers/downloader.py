@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Concurrent, resumable downloader for DGCA incident and accident reports.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Set
+from urllib.parse import urljoin, urlparse, unquote
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+
+from pdf2pinecone.manifest import hash_file
+
+REPORT_PAGES = {
+    'incident': "https://www.dgca.gov.in/digigov-portal/?baseLocale=hi?dynamicPage=IncidentReports/500006/0/viewApplicationDtlsReq",
+    'accident': "https://www.dgca.gov.in/digigov-portal/?baseLocale=en_US?dynamicPage=AccidentReports/500005/0/viewApplicationDtlsReq",
+}
+CATALOG_FILE = ".downloads.json"
+PARTIAL_DIR = ".partial"
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) dgca-report-downloader"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def make_session(pool_size: int = 8) -> requests.Session:
+    """
+    One pooled session for every request, keeping up to `pool_size`
+    keep-alive connections per host
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+def safe_filename(name: str) -> str:
+    name = os.path.basename(unquote(name)).strip()
+    name = re.sub(r'[^\w.\- ()]+', '_', name) or 'report'
+    return name if name.lower().endswith('.pdf') else name + '.pdf'
+
+def content_filename(response: requests.Response) -> Optional[str]:
+    disposition = response.headers.get('Content-Disposition', '')
+    match = re.search(r"filename\*=UTF-8''([^;]+)", disposition) or re.search(r'filename="?([^";]+)"?', disposition)
+    return safe_filename(match.group(1)) if match else None
+
+def parse_listing(html: str, base_url: str) -> Tuple[List[str], Optional[str]]:
+    """
+    Report links (anchors in the report table, or any link to a .pdf) and
+    the URL of the next page, if the 'Next' pager button is enabled
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    anchors = soup.select('tbody tr td a[href]') + soup.select('a[href$=".pdf"], a[href$=".PDF"]')
+    links = list(dict.fromkeys(urljoin(base_url, a['href']) for a in anchors if not a['href'].startswith(('#', 'javascript:'))))
+    next_url = None
+    for a in soup.find_all('a', href=True):
+        if a.get_text(strip=True) == 'Next' or 'next' in (a.get('rel') or []):
+            item = a.find_parent('li')
+            disabled = 'disabled' in (item.get('class') or []) if item is not None else False
+            if not disabled and not a['href'].startswith(('#', 'javascript:')):
+                next_url = urljoin(base_url, a['href'])
+            break
+    return links, next_url
+
+RENDER_MODES = ('auto', 'always', 'never')
+
+def render_listing(url: str, max_pages: Optional[int] = None, timeout: float = 45.0) -> Iterator[str]:
+    """
+    Report links from a listing whose table is built client-side (the live
+    DGCA portal), read from a headless Firefox page by page; needs the
+    optional selenium and webdriver-manager packages and Firefox
+    """
+    try:
+        from selenium import webdriver
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.firefox.service import Service
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException, NoSuchElementException
+        from webdriver_manager.firefox import GeckoDriverManager
+    except ImportError:
+        raise RuntimeError(f"{url} builds its report table client-side; rendering it needs selenium and webdriver-manager")
+    options = webdriver.FirefoxOptions()
+    options.add_argument('-headless')
+    driver = webdriver.Firefox(service=Service(GeckoDriverManager().install()), options=options)
+    try:
+        wait = WebDriverWait(driver, timeout)
+        driver.get(url)
+        page = 1
+        while True:
+            wait.until(EC.visibility_of_element_located((By.XPATH, "//tbody/tr/td/a")))
+            hrefs = [a.get_attribute('href') or '' for a in driver.find_elements(By.XPATH, "//tbody/tr/td/a")]
+            links = [href for href in hrefs if href.startswith(('http://', 'https://'))]
+            if hrefs and not links:
+                raise RuntimeError(f"Report links on {url} have no downloadable URL")
+            logging.info(f"Found {len(links)} reports on rendered listing page {page}")
+            yield from links
+            if max_pages is not None and page >= max_pages:
+                return
+            try:
+                button = driver.find_element(
+                    By.XPATH, f"//a[contains(@class, 'paginate_button') and text()='{page + 1}']")
+            except NoSuchElementException:
+                return
+            first = driver.find_element(By.XPATH, "//tbody/tr/td/a")
+            driver.execute_script("arguments[0].click();", button)
+            try:
+                wait.until(EC.staleness_of(first))
+            except TimeoutException:
+                return
+            page += 1
+    finally:
+        driver.quit()
+
+class DownloadCatalog:
+    """
+    What has been downloaded, keyed by report URL: local path, size, mtime,
+    SHA-256 and the server's ETag / Last-Modified for conditional requests.
+    Stored as JSON next to the category folders and rewritten atomically.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable download catalog {path}: {str(e)}")
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.entries.get(url)
+
+    def find_sha256(self, sha256: str, category: str) -> Optional[str]:
+        with self._lock:
+            for entry in self.entries.values():
+                if entry['sha256'] == sha256 and entry['category'] == category and os.path.exists(entry['path']):
+                    return entry['path']
+        return None
+
+    def claimed_paths(self, exclude: Optional[str] = None) -> Set[str]:
+        """
+        Local paths recorded for every URL except `exclude`
+        """
+        with self._lock:
+            return {entry['path'] for url, entry in self.entries.items() if url != exclude}
+
+    def record(self, url: str, **entry):
+        with self._lock:
+            self.entries[url] = entry
+            with open(self.path + ".tmp", 'w') as f:
+                json.dump(self.entries, f, indent=1)
+            os.replace(self.path + ".tmp", self.path)
+
+class ReportDownloader:
+    """
+    Downloads report PDFs from paginated listing pages with a bounded pool
+    of worker threads shared by every category.
+
+    Each download streams into <category>/.partial/ and is fsynced, checked
+    for a PDF header and renamed into place, so a report folder never holds
+    a truncated file. An interrupted transfer is resumed with a Range request
+    (guarded by If-Range, so a changed file restarts from zero). Reports in
+    the catalog whose local copy still matches its SHA-256 are revalidated
+    with If-None-Match / If-Modified-Since, or skipped without a request when
+    the server sent no validators; content already present under another
+    name is not stored twice. Connection errors, 429 and 5xx responses are
+    retried with jittered exponential backoff, honouring Retry-After.
+    A listing whose HTML has no report links is rendered in a browser
+    (render='auto'; see render_listing), and one that still yields none
+    counts as a failed listing rather than an empty category.
+    """
+
+    def __init__(self, root: str = "pdfs", session: Optional[requests.Session] = None, workers: int = 8,
+                 max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 30.0, timeout: float = 60.0,
+                 block_size: int = 1 << 16, refresh: bool = False, render: str = 'auto'):
+        if render not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode {render!r}, expected one of {', '.join(RENDER_MODES)}")
+        self.root = root
+        self.render = render
+        self.workers = workers
+        # Room for the listing walkers next to the download workers
+        self.session = session or make_session(workers + len(REPORT_PAGES))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.block_size = block_size
+        self.refresh = refresh
+        os.makedirs(root, exist_ok=True)
+        self.catalog = DownloadCatalog(os.path.join(root, CATALOG_FILE))
+        self._names_lock = threading.Lock()
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                delay = response.headers.get('Retry-After')
+                response.close()
+                delay = float(delay) if delay and delay.isdigit() else None
+                reason = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay, reason = None, str(e)
+            delay = delay if delay is not None else random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            logging.warning(f"{method} {url} failed ({reason}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+    def listing(self, url: str, max_pages: Optional[int] = None) -> Iterator[str]:
+        """
+        Report URLs from `url` and the pages after it; raises if none are found
+        """
+        start = url
+        found = 0
+        if self.render != 'always':
+            seen = set()
+            page = 0
+            while url and url not in seen and (max_pages is None or page < max_pages):
+                seen.add(url)
+                page += 1
+                response = self._request('GET', url)
+                response.raise_for_status()
+                links, url = parse_listing(response.text, response.url)
+                logging.info(f"Found {len(links)} reports on listing page {page}")
+                found += len(links)
+                yield from links
+        if not found and self.render != 'never':
+            if self.render == 'auto':
+                logging.info(f"No report links in the HTML of {start}; rendering it in a browser")
+            for link in render_listing(start, max_pages, self.timeout):
+                found += 1
+                yield link
+        if not found:
+            raise ValueError(f"No reports found on {start}")
+
+    def _verified(self, entry: Optional[Dict[str, Any]]) -> bool:
+        """
+        The catalogued file is still on disk with the recorded content
+        """
+        if not entry or not os.path.exists(entry['path']):
+            return False
+        stat = os.stat(entry['path'])
+        if stat.st_size == entry['size'] and stat.st_mtime == entry['mtime']:
+            return True
+        return hash_file(entry['path']) == entry['sha256']
+
+    def _target(self, folder: str, name: str, url: str) -> str:
+        """
+        A path for `name` that no other report URL has claimed
+        """
+        stem, ext = os.path.splitext(name)
+        claimed = self.catalog.claimed_paths(exclude=url)
+        path, n = os.path.join(folder, name), 1
+        while path in claimed:
+            n += 1
+            path = os.path.join(folder, f"{stem}_{n}{ext}")
+        return path
+
+    def _record(self, url: str, category: str, path: str, sha256: str, response: Optional[requests.Response]):
+        stat = os.stat(path)
+        headers = response.headers if response is not None else {}
+        self.catalog.record(url, category=category, path=path, size=stat.st_size, mtime=stat.st_mtime,
+                            sha256=sha256, etag=headers.get('ETag'), last_modified=headers.get('Last-Modified'),
+                            downloaded_at=time.time())
+
+    def download(self, url: str, category: str) -> str:
+        """
+        Fetch one report into root/category; returns 'downloaded',
+        'resumed', 'not-modified', 'skipped', 'duplicate' or 'failed'
+        """
+        folder = os.path.join(self.root, category)
+        partial_dir = os.path.join(folder, PARTIAL_DIR)
+        os.makedirs(partial_dir, exist_ok=True)
+        entry = self.catalog.get(url)
+        headers = {}
+        if self._verified(entry):
+            if not (entry.get('etag') or entry.get('last_modified')) and not self.refresh:
+                return 'skipped'
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        elif entry is None:
+            # A copy from an earlier scraper run, named after the URL
+            existing = os.path.join(folder, safe_filename(urlparse(url).path))
+            if os.path.exists(existing) and not self.refresh and existing not in self.catalog.claimed_paths():
+                self._record(url, category, existing, hash_file(existing), None)
+                return 'skipped'
+
+        partial = os.path.join(partial_dir, hashlib.sha1(url.encode()).hexdigest() + ".part")
+        partial_meta = partial + ".json"
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        if offset and os.path.exists(partial_meta) and not headers:
+            with open(partial_meta) as f:
+                validator = json.load(f).get('validator')
+            if validator:
+                headers.update({'Range': f"bytes={offset}-", 'If-Range': validator})
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._transfer(url, category, folder, partial, partial_meta, headers)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == self.max_retries:
+                    logging.error(f"Failed to download {url}: {str(e)}")
+                    return 'failed'
+                offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+                validator = None
+                if os.path.exists(partial_meta):
+                    with open(partial_meta) as f:
+                        validator = json.load(f).get('validator')
+                headers = {'Range': f"bytes={offset}-", 'If-Range': validator} if offset and validator else {}
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                logging.warning(f"Download of {url} interrupted at {offset} bytes ({str(e)}); resuming in {delay:.1f}s")
+                time.sleep(delay)
+            except (requests.HTTPError, ValueError) as e:
+                logging.error(f"Failed to download {url}: {str(e)}")
+                return 'failed'
+        return 'failed'
+
+    def _transfer(self, url: str, category: str, folder: str, partial: str, partial_meta: str,
+                  headers: Dict[str, str]) -> str:
+        with self._request('GET', url, headers=headers, stream=True) as response:
+            if response.status_code == 304:
+                entry = self.catalog.get(url)
+                self._record(url, category, entry['path'], entry['sha256'], response)
+                return 'not-modified'
+            if response.status_code == 416:
+                # The range starts past the end: the partial file is stale
+                os.remove(partial)
+                raise requests.ConnectionError("requested range not satisfiable; restarting")
+            response.raise_for_status()
+            resumed = response.status_code == 206 and 'Range' in headers
+            validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+            if not resumed:
+                with open(partial_meta, 'w') as f:
+                    json.dump({'url': url, 'validator': validator}, f)
+            digest = hashlib.sha256()
+            mode = 'ab' if resumed else 'wb'
+            if resumed:
+                with open(partial, 'rb') as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(block)
+            with open(partial, mode) as f:
+                for block in response.iter_content(self.block_size):
+                    f.write(block)
+                    digest.update(block)
+                f.flush()
+                os.fsync(f.fileno())
+            name = content_filename(response) or safe_filename(urlparse(url).path)
+
+        with open(partial, 'rb') as f:
+            if f.read(5) != b'%PDF-':
+                os.remove(partial)
+                raise ValueError(f"{url} did not return a PDF")
+        sha256 = digest.hexdigest()
+        with self._names_lock:
+            entry = self.catalog.get(url)
+            existing = self.catalog.find_sha256(sha256, category)
+            if existing is not None and existing != (entry or {}).get('path'):
+                # The same report under another URL
+                os.remove(partial)
+                os.remove(partial_meta)
+                self._record(url, category, existing, sha256, response)
+                return 'duplicate'
+            target = entry['path'] if entry else self._target(folder, name, url)
+            os.replace(partial, target)
+            os.remove(partial_meta)
+            self._record(url, category, target, sha256, response)
+        return 'resumed' if resumed else 'downloaded'
+
+    def run(self, listings: Dict[str, str], max_pages: Optional[int] = None) -> Dict[str, int]:
+        """
+        Walk every category's listing and download its reports concurrently;
+        returns counts per download status
+        """
+        counts: Dict[str, int] = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as downloads, \
+                ThreadPoolExecutor(max_workers=max(1, len(listings))) as walkers:
+            futures = []
+            futures_lock = threading.Lock()
+
+            def walk(category: str, url: str):
+                for link in self.listing(url, max_pages):
+                    future = downloads.submit(self.download, link, category)
+                    with futures_lock:
+                        futures.append(future)
+
+            for future in as_completed([walkers.submit(walk, category, url) for category, url in listings.items()]):
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Listing failed: {str(e)}")
+                    counts['listing_failed'] = counts.get('listing_failed', 0) + 1
+            for future in as_completed(futures):
+                try:
+                    status = future.result()
+                except Exception as e:
+                    # One report's unexpected error must not abort the run
+                    logging.error(f"Download failed: {str(e)}")
+                    status = 'failed'
+                counts[status] = counts.get(status, 0) + 1
+        return counts
+
+def download_reports(listings: Optional[Dict[str, str]] = None, root: str = "pdfs", workers: int = 8,
+                     max_pages: Optional[int] = None, **options) -> Dict[str, int]:
+    start = time.perf_counter()
+    downloader = ReportDownloader(root, workers=workers, **options)
+    counts = downloader.run(listings or REPORT_PAGES, max_pages)
+    logging.info(f"Reports: {', '.join(f'{count} {status}' for status, count in sorted(counts.items())) or 'none found'} "
+                 f"in {time.perf_counter() - start:.1f}s")
+    return counts
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Download DGCA incident and accident reports")
+    parser.add_argument('--root', type=str, default='pdfs', help='Folder holding incident/ and accident/')
+    parser.add_argument('--incident-url', type=str, default=REPORT_PAGES['incident'], help='Incident listing page')
+    parser.add_argument('--accident-url', type=str, default=REPORT_PAGES['accident'], help='Accident listing page')
+    parser.add_argument('--category', type=str, choices=['incident', 'accident'], help='Only this category')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent downloads across both categories')
+    parser.add_argument('--max-pages', type=int, help='Listing pages to walk per category')
+    parser.add_argument('--retries', type=int, default=3, help='Retries per request')
+    parser.add_argument('--refresh', action='store_true', help='Re-download catalogued reports the server cannot revalidate')
+    parser.add_argument('--render', type=str, choices=RENDER_MODES, default='auto',
+                        help='Read listings in a headless browser: when the HTML has no report links, always or never')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    listings = {'incident': args.incident_url, 'accident': args.accident_url}
+    if args.category:
+        listings = {args.category: listings[args.category]}
+    counts = download_reports(listings, args.root, args.workers, args.max_pages, max_retries=args.retries,
+                              refresh=args.refresh, render=args.render)
+    return 1 if counts.get('failed') or counts.get('listing_failed') else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
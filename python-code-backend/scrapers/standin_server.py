@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the DGCA report pages, for exercising the downloader
+without the real portal.
+"""
+
+import os
+import glob
+import hashlib
+import logging
+import argparse
+import threading
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs, quote
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """
+    GET /<category>?page=N  paginated report table with a DGCA-style pager
+    GET /files/<category>/<name>  the PDF, with ETag, Last-Modified,
+        conditional requests and single byte ranges
+    """
+
+    server: "StandinServer"
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        self.server.count(url.path)
+        if len(parts) == 1 and parts[0] in self.server.files:
+            self._listing(parts[0], int(parse_qs(url.query).get('page', ['1'])[0]))
+        elif len(parts) == 3 and parts[0] == 'files' and parts[2] in self.server.files.get(parts[1], {}):
+            self._file(parts[1], parts[2])
+        else:
+            self.send_error(404)
+
+    def _listing(self, category: str, page: int):
+        names = sorted(self.server.files[category])
+        size = self.server.page_size
+        pages = max(1, -(-len(names) // size))
+        rows = "".join(f'<tr><td>{i}</td><td><a href="/files/{category}/{quote(name)}">{name}</a></td></tr>'
+                       for i, name in enumerate(names[(page - 1) * size:page * size], (page - 1) * size + 1))
+        disabled = " disabled" if page >= pages else ""
+        body = (f"<html><body><table><thead><tr><th>#</th><th>Report</th></tr></thead><tbody>{rows}</tbody></table>"
+                f'<ul class="pagination"><li class="paginate_button previous"><a href="/{category}?page={max(page - 1, 1)}">Previous</a></li>'
+                f'<li class="paginate_button next{disabled}"><a href="/{category}?page={page + 1}">Next</a></li></ul>'
+                f"</body></html>").encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _file(self, category: str, name: str):
+        path = self.server.files[category][name]
+        with open(path, 'rb') as f:
+            data = f.read()
+        etag = '"' + hashlib.md5(data).hexdigest() + '"'
+        last_modified = formatdate(os.path.getmtime(path), usegmt=True)
+        validators = self.server.validators
+        if validators and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        start, status = 0, 200
+        byte_range = self.headers.get('Range')
+        if byte_range and self.server.ranges and self.headers.get('If-Range', etag) in (etag, last_modified):
+            start = int(byte_range.split('=')[1].split('-')[0])
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{len(data)}")
+                self.end_headers()
+                return
+            status = 206
+        body = data[start:]
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Content-Disposition', f'attachment; filename="{name}"')
+        if validators:
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+        if self.server.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.end_headers()
+        if self.server.truncate_once(category, name):
+            # Drop the connection halfway through, once per file
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root: str, port: int = 0, page_size: int = 10, validators: bool = True,
+                 ranges: bool = True, interrupt: bool = False):
+        super().__init__(('127.0.0.1', port), StandinHandler)
+        self.files: Dict[str, Dict[str, str]] = {}
+        for path in sorted(glob.glob(os.path.join(root, '*', '*.pdf'))):
+            self.files.setdefault(os.path.basename(os.path.dirname(path)), {})[os.path.basename(path)] = path
+        self.page_size = page_size
+        self.validators = validators
+        self.ranges = ranges
+        self.interrupt = interrupt
+        self.requests: Dict[str, int] = {}
+        self._interrupted = set()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def listings(self) -> Dict[str, str]:
+        return {category: f"{self.url}/{category}" for category in self.files}
+
+    def count(self, path: str):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def truncate_once(self, category: str, name: str) -> bool:
+        with self._lock:
+            if not self.interrupt or (category, name) in self._interrupted:
+                return False
+            self._interrupted.add((category, name))
+            return True
+
+def serve(root: str, port: int = 0, **options) -> Tuple[StandinServer, threading.Thread]:
+    """
+    Start a stand-in server for the PDFs under root/<category>/ in a
+    background thread; stop it with server.shutdown()
+    """
+    server = StandinServer(root, port, **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Serve PDFs under ROOT/<category>/ as DGCA-style listing pages")
+    parser.add_argument('root', type=str, help='Folder with incident/ and accident/ PDFs')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--page-size', type=int, default=10, help='Reports per listing page')
+    parser.add_argument('--no-validators', action='store_true', help='Send no ETag / Last-Modified')
+    parser.add_argument('--no-ranges', action='store_true', help='Ignore Range requests')
+    parser.add_argument('--interrupt', action='store_true', help='Cut the first transfer of every file in half')
+    args = parser.parse_args(argv)
+    server = StandinServer(args.root, args.port, args.page_size, not args.no_validators, not args.no_ranges,
+                           args.interrupt)
+    for category, url in server.listings().items():
+        print(f"{category}: {url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
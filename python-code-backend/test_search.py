@@ -6,98 +6,96 @@ This script allows you to test different search queries without re-running the m
 
 import os
 import sys
-import re
+import json
+import atexit
 import logging
 from pathlib import Path
 
 # Add the current directory to Python path to import pdf2pinecone
 sys.path.insert(0, str(Path(__file__).parent))
 
-from pdf2pinecone.config import load_config
-from pdf2pinecone.pinecone_utils import generate_embedding, setup_pinecone_index
-from pinecone import Pinecone
+from pdf2pinecone.search_session import SearchSession
+from pdf2pinecone.postprocess import mark
+from pdf2pinecone.metrics import metrics
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
+_session = None
 
-def perform_search(query: str, category: str = None, top_k: int = 5):
+
+def get_session() -> SearchSession:
+    """Search session shared by every query in this process (clients, index handle, query cache)."""
+    global _session
+    if _session is None:
+        _session = SearchSession()
+        metrics_file, trace_file = _session.config['METRICS_FILE'], _session.config['TRACE_FILE']
+        if metrics_file or trace_file:
+            metrics.enable(tracing=bool(trace_file))
+            atexit.register(metrics.export, metrics_file, trace_file)
+    return _session
+
+
+def perform_search(query: str, category: str = None, top_k: int = 5, chunks_per_report: int = None,
+                   as_json: bool = False):
     """
     Perform search functionality with a given query.
     
     Args:
         query: Search query string
         category: Optional category filter ('incident' or 'accident')
-        top_k: Number of results to return (default: 5)
+        top_k: Number of distinct reports to return (default: 5)
+        chunks_per_report: Matching chunks shown per report (default: RESULT_CHUNKS_PER_REPORT)
+        as_json: Print the structured results as JSON instead
     """
-    print(f"\n{'='*60}")
-    print(f"🔍 Testing Search Query: '{query}'")
-    if category:
-        print(f"📁 Category Filter: {category.upper()}")
-    print(f"📊 Top Results: {top_k}")
-    print(f"{'='*60}\n")
+    if not as_json:
+        print(f"\n{'='*60}")
+        print(f"🔍 Testing Search Query: '{query}'")
+        if category:
+            print(f"📁 Category Filter: {category.upper()}")
+        print(f"📊 Top Results: {top_k}")
+        print(f"{'='*60}\n")
     
     try:
-        # Load config and setup Pinecone
-        config = load_config()
-        pc = Pinecone(api_key=config['PINECONE_API_KEY'])
-        
-        # Get existing index
-        index_name = config['INDEX_NAME']
-        if index_name not in [index.name for index in pc.list_indexes()]:
-            print(f"❌ Index '{index_name}' not found! Please run the main pipeline first.")
+        session = get_session()
+        try:
+            session.index
+        except ValueError as e:
+            print(f"❌ {str(e)}")
             return
         
-        index = pc.Index(index_name)
-        
-        # Generate query embedding
-        logging.info(f"Generating embedding for query: '{query}'")
-        query_embedding = generate_embedding(query)
-        if query_embedding is None:
+        # Perform search; keyword-only queries skip the embedding call.
+        # Chunks are collapsed per report, fetching deeper until top_k distinct reports are found.
+        results = session.search_reports(query, top_k=top_k, category=category, chunks_per_report=chunks_per_report)
+        if results is None:
             print("❌ Failed to generate query embedding.")
             return
         
-        # Build filter for category if specified
-        filter_dict = {"category": {"$eq": category}} if category else None
-        
-        # Perform search
-        results = index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_values=False,
-            include_metadata=True,
-            filter=filter_dict
-        )
+        if as_json:
+            print(json.dumps(results, indent=2))
+            return
         
-        if not results.matches:
+        if not results['reports']:
             print("❌ No results found!")
             return
         
         # Display results
         category_text = f" in '{category}' category" if category else ""
-        print(f"✅ Found {len(results.matches)} results for: '{query}'{category_text}\n")
+        print(f"✅ Found {len(results['reports'])} reports for: '{query}'{category_text}\n")
         
-        for i, match in enumerate(results.matches):
-            filename = match.metadata.get('filename', 'N/A')
-            category_meta = match.metadata.get('category', 'N/A')
-            chunk_idx = match.metadata.get('chunk_index', 'N/A')
-            score = match.score
-            chunk_text = match.metadata.get('text', None)
-            
-            # Highlight query in chunk_text
-            if chunk_text:
-                snippet = chunk_text[:500] + ("..." if len(chunk_text) > 500 else "")
-                # Highlight all occurrences of the query (case-insensitive)
-                pattern = re.compile(re.escape(query), re.IGNORECASE)
-                snippet = pattern.sub(lambda m: f"\033[1;31m{m.group(0)}\033[0m", snippet)
-            else:
-                snippet = "Content not found in metadata."
-                
-            print(f"📄 Result {i+1} | Score: {score:.4f} | Category: {category_meta.upper()}")
-            print(f"📁 File: {filename} | � Chunk: {chunk_idx}")
-            print(f"📝 Content:\n{snippet}\n{'-'*60}")
+        for report in results['reports']:
+            print(f"📄 Result {report['rank']} | Score: {report['score']:.4f} | Category: {(report['category'] or 'N/A').upper()}")
+            print(f"📁 File: {report['filename'] or 'N/A'}")
+            for chunk in report['chunks']:
+                snippet = chunk['snippet']
+                # Highlight spans come from the query's precompiled term automaton
+                snippet = mark(snippet, chunk['highlights']) if snippet else "Content not found in metadata."
+                pages = f" | Pages: {chunk['page_start']}-{chunk['page_end']}" if chunk['page_start'] is not None else ""
+                print(f"🔖 Chunk: {chunk['chunk_index']} | Score: {chunk['score']:.4f}{pages}")
+                print(f"📝 Content:\n{snippet}")
+            print('-'*60)
             
-        print(f"\n✅ Search completed! Displayed {len(results.matches)} results.\n")
+        print(f"\n✅ Search completed! Displayed {len(results['reports'])} reports.\n")
         
     except Exception as e:
         print(f"❌ Error during search: {str(e)}")
@@ -143,7 +141,7 @@ def interactive_mode():
     
     print("\n🎯 Interactive Search Mode")
     print("Type your search queries below. Type 'quit' to exit, 'tests' to run predefined tests.")
-    print("Format: <query> [--category incident|accident] [--top-k N]")
+    print("Format: <query> [--category incident|accident] [--top-k N] [--chunks N]")
     print("Example: engine failure --category incident --top-k 10")
     print("-" * 60)
     
@@ -168,6 +166,7 @@ def interactive_mode():
             query_parts = []
             category = None
             top_k = 5
+            chunks_per_report = None
             
             i = 0
             while i < len(parts):
@@ -177,6 +176,12 @@ def interactive_mode():
                         print(f"❌ Invalid category: {category}. Use 'incident' or 'accident'.")
                         break
                     i += 2
+                elif parts[i] == '--chunks' and i + 1 < len(parts):
+                    if not parts[i + 1].isdigit() or int(parts[i + 1]) <= 0:
+                        print(f"❌ Invalid chunks value: {parts[i + 1]}. Must be a positive integer.")
+                        break
+                    chunks_per_report = int(parts[i + 1])
+                    i += 2
                 elif parts[i] == '--top-k' and i + 1 < len(parts):
                     try:
                         top_k = int(parts[i + 1])
@@ -193,7 +198,7 @@ def interactive_mode():
                 # Only execute if we didn't break out of the loop
                 query = ' '.join(query_parts)
                 if query:
-                    perform_search(query, category, top_k)
+                    perform_search(query, category, top_k, chunks_per_report)
                 else:
                     print("❌ No search query provided.")
         
@@ -207,10 +212,25 @@ def interactive_mode():
 def main():
     """Main function to handle command line arguments or interactive mode."""
     
-    print("🧪 PDF2Pinecone Search Test Tool")
-    print("=" * 40)
+    if len(sys.argv) < 2 or sys.argv[1] != '--json':
+        print("🧪 PDF2Pinecone Search Test Tool")
+        print("=" * 40)
     
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        # Non-interactive: test_search.py --batch queries.jsonl [batch_search options]
+        from pdf2pinecone.batch_search import main as batch_main
+        batch_main(sys.argv[2:])
+    elif len(sys.argv) > 2 and sys.argv[1] == '--similar':
+        # Reports like a given one: test_search.py --similar incident_report_0001.pdf
+        results = get_session().similar(sys.argv[2], top_k=10)
+        if not results:
+            print(f"❌ No similar reports found for {sys.argv[2]}")
+        for i, result in enumerate(results, 1):
+            print(f"{i:>2}. {result['score']:.4f} | {(result['category'] or 'N/A').upper()} | {result['filename']}")
+    elif len(sys.argv) > 2 and sys.argv[1] == '--json':
+        # Structured results for scripts: test_search.py --json engine failure
+        perform_search(' '.join(sys.argv[2:]), as_json=True)
+    elif len(sys.argv) > 1:
         # Command line mode
         query = ' '.join(sys.argv[1:])
         perform_search(query)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# pdf2pinecone and scrapers are imported from the backend folder, as the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from pdf2pinecone.async_uploader import AsyncUploader, AdaptiveLimiter, TokenBucket, load_failures
+
+class StatusError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={'retry-after': retry_after} if retry_after is not None else {})
+
+class FakeEmbedder:
+    """
+    Embeds each text as [len(text)]; the first `failures` requests raise
+    StatusError(`status`)
+    """
+
+    def __init__(self, failures=0, status=503):
+        self.embeddings = self
+        self.failures = failures
+        self.status = status
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def create(self, input, model):
+        with self._lock:
+            self.requests += 1
+            if self.requests <= self.failures:
+                raise StatusError(self.status)
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(text))])
+                                     for i, text in enumerate(input)])
+
+class FakeIndex:
+    """
+    Records upserted vectors and the peak number of concurrent calls; the
+    first `throttled` calls are rejected with a 429
+    """
+
+    def __init__(self, throttled=0, status=429, delay=0.01):
+        self.throttled = throttled
+        self.status = status
+        self.delay = delay
+        self.calls = 0
+        self.vectors = {}
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            threading.Event().wait(self.delay)
+            if call <= self.throttled:
+                raise StatusError(self.status, retry_after='0')
+            with self._lock:
+                for vector in vectors:
+                    self.vectors[vector['id']] = vector
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+def make_chunks(count):
+    return [{'id': f"c{i}", 'text': f"chunk text {i}", 'metadata': {'chunk_index': i}} for i in range(count)]
+
+def uploader(index, client, **options):
+    settings = dict(embedding_batch_size=10, upsert_batch_size=5, embed_rate=0, upsert_rate=0,
+                    embed_concurrency=2, upsert_concurrency=4, max_retries=3, base_delay=0.001)
+    settings.update(options)
+    return AsyncUploader(index, client=client, **settings)
+
+def test_uploads_every_chunk_once():
+    index, client = FakeIndex(), FakeEmbedder()
+    upserted = []
+    report = uploader(index, client).upload(make_chunks(47), on_upserted=upserted.extend)
+    assert sorted(index.vectors) == sorted(f"c{i}" for i in range(47))
+    assert sorted(report.upserted_ids) == sorted(upserted) == sorted(index.vectors)
+    assert report.embedding_requests == client.requests == 5
+    assert report.upserted_batches == 10
+    assert report.failures == [] and report.retries == 0
+    assert index.vectors['c3']['values'] == [float(len("chunk text 3"))]
+    assert index.vectors['c3']['metadata'] == {'chunk_index': 3}
+
+def test_throttled_upserts_are_retried_within_the_concurrency_limit():
+    index, client = FakeIndex(throttled=3), FakeEmbedder()
+    engine = uploader(index, client, upsert_concurrency=4)
+    report = engine.upload(make_chunks(40))
+    assert len(index.vectors) == 40
+    assert report.failures == []
+    assert engine.upserts.throttled == 3
+    assert report.retries == 3
+    assert index.peak <= 4
+
+def test_transient_embedding_errors_are_retried():
+    index, client = FakeIndex(), FakeEmbedder(failures=2, status=503)
+    report = uploader(index, client).upload(make_chunks(20))
+    assert len(index.vectors) == 20
+    assert report.retries == 2
+    assert client.requests == 4
+
+def test_failing_endpoint_reports_batches_for_replay(tmp_path):
+    index, client = FakeIndex(), FakeEmbedder(failures=10 ** 6, status=500)
+    report = uploader(index, client, max_retries=2).upload(make_chunks(15))
+    assert index.vectors == {}
+    assert client.requests == 2 * 3
+    assert {failure['stage'] for failure in report.failures} == {'embed'}
+    assert report.failed_chunks == 15
+    path = str(tmp_path / "failed.jsonl")
+    report.write_failures(path)
+    # Batches fail in completion order
+    assert sorted(chunk['id'] for chunk in load_failures(path)) == sorted(f"c{i}" for i in range(15))
+
+def test_client_errors_are_not_retried():
+    index, client = FakeIndex(throttled=10 ** 6, status=400), FakeEmbedder()
+    report = uploader(index, client).upload(make_chunks(10))
+    assert index.calls == 2
+    assert report.retries == 0
+    assert {failure['stage'] for failure in report.failures} == {'upsert'}
+    assert report.failed_chunks == 10
+
+def test_replay_after_failure_completes(tmp_path):
+    chunks = make_chunks(12)
+    path = str(tmp_path / "failed.jsonl")
+    uploader(FakeIndex(), FakeEmbedder(failures=10 ** 6), max_retries=0).upload(chunks).write_failures(path)
+    index = FakeIndex()
+    report = uploader(index, FakeEmbedder()).upload(load_failures(path))
+    report.write_failures(path)
+    assert sorted(index.vectors) == sorted(chunk['id'] for chunk in chunks)
+    assert not (tmp_path / "failed.jsonl").exists()
+
+def test_limiter_halves_on_throttle_and_recovers():
+    limiter = AdaptiveLimiter(8)
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    limiter.on_throttle()
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.limit == 1
+    for _ in range(1 + 2):
+        limiter.on_success()
+    assert limiter.limit == 3
+
+def test_limiter_bounds_concurrency():
+    async def run():
+        limiter = AdaptiveLimiter(3)
+        active, peak = 0, 0
+
+        async def task():
+            nonlocal active, peak
+            async with limiter:
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.005)
+                active -= 1
+
+        await asyncio.gather(*(task() for _ in range(20)))
+        return peak
+
+    assert asyncio.run(run()) == 3
+
+def test_token_bucket_spaces_requests():
+    async def run():
+        bucket = TokenBucket(rate=200, capacity=1)
+        start = asyncio.get_running_loop().time()
+        for _ in range(21):
+            await bucket.acquire()
+        return asyncio.get_running_loop().time() - start
+
+    # One token up front, then one every 5 ms
+    assert asyncio.run(run()) >= 0.09
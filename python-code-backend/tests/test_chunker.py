@@ -0,0 +1,62 @@
+import pytest
+from pdf2pinecone.chunker import iter_chunks
+from pdf2pinecone.pdf_utils import join_pages
+
+def make_text(words=400, sentence=7):
+    """
+    Unique words w0, w1, ... with a sentence end every `sentence` words
+    """
+    return " ".join(f"w{i}." if i % sentence == sentence - 1 else f"w{i}" for i in range(words))
+
+def chunk(text, **options):
+    return list(iter_chunks(text, "report.pdf", "pdfs", "incident", "filehash", **options))
+
+def cost(text):
+    return sum((len(word) + 1) / 4 for word in text.split())
+
+def test_every_word_is_covered_in_order():
+    text = make_text()
+    chunks = chunk(text, max_tokens=40, overlap_tokens=8)
+    assert len(chunks) > 1
+    assert all(c['text'] in text and c['metadata']['word_count'] == len(c['text'].split()) for c in chunks)
+    assert list(dict.fromkeys(word for c in chunks for word in c['text'].split())) == text.split()
+    assert [c['metadata']['chunk_index'] for c in chunks] == list(range(len(chunks)))
+
+@pytest.mark.parametrize('align_sentences', [True, False])
+def test_chunks_fit_the_token_budget(align_sentences):
+    chunks = chunk(make_text(), max_tokens=30, overlap_tokens=5, align_sentences=align_sentences)
+    assert all(cost(c['text']) <= 30 for c in chunks)
+
+def test_oversized_word_is_its_own_chunk():
+    text = "bird strike " + "x" * 200 + " on short final"
+    chunks = chunk(text, max_tokens=10, overlap_tokens=2)
+    assert "x" * 200 in [c['text'] for c in chunks]
+    assert all(cost(c['text']) <= 10 or len(c['text'].split()) == 1 for c in chunks)
+    assert " ".join(dict.fromkeys(w for c in chunks for w in c['text'].split())) == text
+
+def test_ids_are_stable():
+    text = make_text()
+    first = [c['id'] for c in chunk(text, max_tokens=40, overlap_tokens=8)]
+    assert first == [c['id'] for c in chunk(text, max_tokens=40, overlap_tokens=8)]
+    assert len(set(first)) == len(first)
+    moved = iter_chunks(text, "renamed.pdf", "elsewhere", "accident", "filehash", max_tokens=40, overlap_tokens=8)
+    assert [c['id'] for c in moved] == first
+
+def test_cuts_land_on_sentence_ends():
+    chunks = chunk(make_text(), max_tokens=40, overlap_tokens=8)
+    assert all(c['text'].endswith('.') for c in chunks[:-1])
+    unaligned = chunk(make_text(), max_tokens=40, overlap_tokens=8, align_sentences=False)
+    assert not all(c['text'].endswith('.') for c in unaligned[:-1])
+
+def test_overlap_must_be_smaller_than_budget():
+    with pytest.raises(ValueError):
+        chunk(make_text(), max_tokens=20, overlap_tokens=20)
+
+def test_pages_are_mapped_from_join_pages_offsets():
+    pages = [(1, "a1 a2 a3 a4 a5 a6"), (2, "   "), (3, "b1 b2 b3 b4 b5 b6")]
+    text, page_starts = join_pages(pages)
+    assert page_starts == [(0, 1), (6, 3)]
+    chunks = chunk(text, max_tokens=4, overlap_tokens=0, align_sentences=False, page_starts=page_starts,
+                   count_tokens=lambda word: 1.0)
+    assert [c['text'] for c in chunks] == ["a1 a2 a3 a4", "a5 a6 b1 b2", "b3 b4 b5 b6"]
+    assert [(c['metadata']['page_start'], c['metadata']['page_end']) for c in chunks] == [(1, 1), (1, 3), (3, 3)]
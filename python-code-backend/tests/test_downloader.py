@@ -0,0 +1,101 @@
+import os
+import random
+import pytest
+from scrapers.downloader import ReportDownloader
+from scrapers.standin_server import serve
+
+REPORTS = {'incident': 15, 'accident': 14}
+
+@pytest.fixture
+def source(tmp_path):
+    """
+    Folder of fake report PDFs, 29 in all, large enough to arrive in many blocks
+    """
+    root = tmp_path / "source"
+    rng = random.Random(0)
+    for category, count in REPORTS.items():
+        (root / category).mkdir(parents=True)
+        for number in range(count):
+            data = b"%PDF-1.4\n" + rng.randbytes(rng.randint(64, 256) * 1024)
+            (root / category / f"{category}_{number:03d}.pdf").write_bytes(data)
+    return root
+
+def run_server(root, **options):
+    server, _ = serve(str(root), **options)
+    return server
+
+def downloader(root, **options):
+    return ReportDownloader(str(root), workers=4, base_delay=0.01, max_delay=0.05, timeout=10,
+                            block_size=8192, render='never', **options)
+
+def assert_mirrors(source, target):
+    for category in REPORTS:
+        names = sorted(name for name in os.listdir(target / category) if name.endswith('.pdf'))
+        assert names == sorted(os.listdir(source / category))
+        for name in names:
+            assert (target / category / name).read_bytes() == (source / category / name).read_bytes()
+        assert os.listdir(target / category / ".partial") == []
+
+def test_interrupted_downloads_resume_and_revalidate(source, tmp_path):
+    server = run_server(source, page_size=10, interrupt=True)
+    target = tmp_path / "pdfs"
+    try:
+        counts = downloader(target).run(server.listings())
+        assert counts == {'resumed': 29}
+        assert_mirrors(source, target)
+
+        counts = downloader(target).run(server.listings())
+        assert counts == {'not-modified': 29}
+        assert_mirrors(source, target)
+    finally:
+        server.shutdown()
+
+def test_changed_file_is_downloaded_again(source, tmp_path):
+    server = run_server(source)
+    target = tmp_path / "pdfs"
+    try:
+        assert downloader(target).run(server.listings()) == {'downloaded': 29}
+        (source / 'incident' / 'incident_000.pdf').write_bytes(b"%PDF-1.4\nrevised report\n")
+        counts = downloader(target).run(server.listings())
+        assert counts == {'downloaded': 1, 'not-modified': 28}
+        assert_mirrors(source, target)
+    finally:
+        server.shutdown()
+
+def test_reports_without_validators_are_skipped(source, tmp_path):
+    server = run_server(source, validators=False)
+    target = tmp_path / "pdfs"
+    try:
+        assert downloader(target).run(server.listings()) == {'downloaded': 29}
+        requests_before = sum(server.requests.values())
+        assert downloader(target).run(server.listings()) == {'skipped': 29}
+        # Only the listing pages are fetched again
+        assert sum(server.requests.values()) - requests_before == 4
+    finally:
+        server.shutdown()
+
+def test_empty_listing_fails(source, tmp_path):
+    server = run_server(source)
+    target = tmp_path / "pdfs"
+    try:
+        counts = downloader(target).run({'incident': f"{server.url}/incident?page=99"})
+        assert counts == {'listing_failed': 1}
+    finally:
+        server.shutdown()
+
+def test_unexpected_download_error_counts_as_failed(source, tmp_path):
+    server = run_server(source)
+    target = tmp_path / "pdfs"
+    try:
+        engine = downloader(target)
+        download = engine.download
+
+        def flaky(url, category):
+            if url.endswith('incident_003.pdf'):
+                raise RuntimeError("unexpected")
+            return download(url, category)
+
+        engine.download = flaky
+        assert engine.run(server.listings()) == {'downloaded': 28, 'failed': 1}
+    finally:
+        server.shutdown()
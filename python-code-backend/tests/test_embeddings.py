@@ -0,0 +1,91 @@
+import random
+import threading
+from types import SimpleNamespace
+import pytest
+from pdf2pinecone.embeddings import make_batches, embed_texts, generate_embeddings, estimate_tokens
+
+class FakeClient:
+    """
+    `client.embeddings.create` stand-in: each text embeds as [len(text), n]
+    where n is its position in the request, and responses come back shuffled
+    """
+
+    def __init__(self, fail_on=None):
+        self.embeddings = self
+        self.requests = []
+        self.fail_on = fail_on or (lambda texts: False)
+        self._lock = threading.Lock()
+
+    def create(self, input, model):
+        with self._lock:
+            self.requests.append(list(input))
+        if self.fail_on(input):
+            raise RuntimeError("embedding request failed")
+        data = [SimpleNamespace(index=i, embedding=[float(len(text)), float(i)]) for i, text in enumerate(input)]
+        random.Random(len(input)).shuffle(data)
+        return SimpleNamespace(data=data)
+
+class DictCache:
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+
+    def get_many(self, model, texts):
+        return [self.entries.get((model, text)) for text in texts]
+
+    def put_many(self, model, texts, vectors):
+        for text, vector in zip(texts, vectors):
+            self.entries[(model, text)] = vector
+
+def make_chunks(count, words=10):
+    return [{'id': f"c{i}", 'text': " ".join(f"w{i}" for _ in range(words))} for i in range(count)]
+
+def test_batches_respect_input_limit_and_keep_order():
+    chunks = make_chunks(10)
+    batches = list(make_batches(chunks, max_inputs=4))
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert [chunk for batch in batches for chunk in batch] == chunks
+
+def test_batches_respect_token_budget():
+    chunks = make_chunks(9)
+    tokens = estimate_tokens(chunks[0]['text'])
+    batches = list(make_batches(chunks, max_inputs=100, max_tokens=tokens * 3))
+    assert [len(batch) for batch in batches] == [3, 3, 3]
+
+def test_oversized_chunk_is_sent_alone():
+    chunks = make_chunks(2) + [{'id': 'big', 'text': "x" * 4000}] + make_chunks(2)
+    batches = list(make_batches(chunks, max_inputs=100, max_tokens=100))
+    assert [[chunk['id'] for chunk in batch] for batch in batches] == [['c0', 'c1'], ['big'], ['c0', 'c1']]
+
+def test_embed_texts_restores_input_order():
+    texts = ["a", "bb", "ccc", "dddd"]
+    assert embed_texts(texts, FakeClient()) == [[1.0, 0.0], [2.0, 1.0], [3.0, 2.0], [4.0, 3.0]]
+
+def test_embed_texts_rejects_short_responses():
+    client = FakeClient()
+    client.create = lambda input, model: SimpleNamespace(data=[SimpleNamespace(index=0, embedding=[0.0])])
+    with pytest.raises(ValueError):
+        embed_texts(["a", "b"], client)
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_generate_embeddings_batches_requests(max_workers):
+    chunks = make_chunks(25)
+    client = FakeClient()
+    embeddings = generate_embeddings(chunks, client, max_inputs=10, max_workers=max_workers)
+    assert sorted(len(request) for request in client.requests) == [5, 10, 10]
+    assert list(embeddings) == [chunk['id'] for chunk in chunks]
+    assert all(embeddings[chunk['id']][0] == len(chunk['text']) for chunk in chunks)
+
+def test_failed_batch_is_left_out():
+    chunks = make_chunks(6)
+    client = FakeClient(fail_on=lambda texts: chunks[2]['text'] in texts)
+    embeddings = generate_embeddings(chunks, client, max_inputs=2, max_workers=1)
+    assert list(embeddings) == ['c0', 'c1', 'c4', 'c5']
+
+def test_cache_hits_are_not_requested():
+    chunks = make_chunks(6)
+    cache = DictCache({('model', chunks[1]['text']): [9.0, 9.0], ('model', chunks[4]['text']): [8.0, 8.0]})
+    client = FakeClient()
+    embeddings = generate_embeddings(chunks, client, model='model', max_inputs=10, cache=cache)
+    assert client.requests == [[chunks[i]['text'] for i in (0, 2, 3, 5)]]
+    assert embeddings['c1'] == [9.0, 9.0] and embeddings['c4'] == [8.0, 8.0]
+    assert len(cache.entries) == 6
@@ -0,0 +1,36 @@
+from pdf2pinecone.lexical_index import LexicalIndex, hydrate_from_index
+from pdf2pinecone.local_index import LocalIndex
+
+def make_chunk(id, text, category='incident'):
+    return {'id': id, 'text': text,
+            'metadata': {'filename': f"{id}.pdf", 'category': category, 'chunk_index': 0,
+                         'page_start': 1, 'page_end': 2, 'word_count': len(text.split()), 'text': text}}
+
+def test_documents_keep_only_stored_fields(tmp_path):
+    lexical = LexicalIndex(str(tmp_path))
+    lexical.add([make_chunk('a', "engine failure on takeoff")])
+    expected = {'filename': 'a.pdf', 'category': 'incident', 'chunk_index': 0, 'page_start': 1, 'page_end': 2}
+    assert lexical.query("engine").matches[0].metadata == expected
+    assert LexicalIndex(str(tmp_path)).query("engine").matches[0].metadata == expected
+
+def test_deleted_documents_do_not_count_towards_idf(tmp_path):
+    chunks = [make_chunk('a', "bird strike on approach"), make_chunk('b', "runway excursion on landing")]
+    fresh = LexicalIndex(str(tmp_path / "fresh"))
+    fresh.add(chunks)
+    churned = LexicalIndex(str(tmp_path / "churned"))
+    churned.add([make_chunk(f"old{i}", "bird strike reported") for i in range(5)])
+    churned.add(chunks)
+    churned.delete([f"old{i}" for i in range(5)])
+    # The deleted documents are still in an unmerged segment
+    assert churned.query("bird").matches[0].score == fresh.query("bird").matches[0].score
+
+def test_lexical_matches_are_hydrated_from_the_vector_index(tmp_path):
+    chunk = make_chunk('a', "hydraulic leak during taxi")
+    lexical = LexicalIndex(str(tmp_path / "lexical"))
+    lexical.add([chunk])
+    index = LocalIndex(str(tmp_path / "vectors"), 2, ann_min_rows=None)
+    index.upsert([{'id': 'a', 'values': [1.0, 0.0], 'metadata': chunk['metadata']}])
+    matches = lexical.query("hydraulic").matches
+    assert 'text' not in matches[0].metadata
+    hydrate_from_index(index, matches)
+    assert matches[0].metadata['text'] == chunk['text']
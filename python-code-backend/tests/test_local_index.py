@@ -0,0 +1,42 @@
+import threading
+import numpy as np
+from pdf2pinecone.local_index import LocalIndex
+
+def random_vectors(rng, ids, dimension=16):
+    return [{'id': id, 'values': rng.normal(size=dimension).tolist(), 'metadata': {'category': 'incident'}}
+            for id in ids]
+
+def test_queries_skip_rows_retired_while_scoring(tmp_path):
+    index = LocalIndex(str(tmp_path), 16, ann_min_rows=None)
+    rng = np.random.default_rng(0)
+    index.upsert(random_vectors(rng, [f"v{i}" for i in range(2000)]))
+    stop = threading.Event()
+    errors = []
+
+    def write():
+        writes = np.random.default_rng(1)
+        i = 0
+        while not stop.is_set():
+            index.upsert(random_vectors(writes, [f"v{i % 2000}"]))
+            index.delete(ids=[f"v{(i * 7) % 2000}"])
+            i += 1
+
+    def read(seed):
+        queries = np.random.default_rng(seed)
+        try:
+            for _ in range(3000):
+                for match in index.query(queries.normal(size=16).tolist(), top_k=20, include_metadata=True).matches:
+                    assert match.id is not None and match.metadata is not None
+        except Exception as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=write)
+    readers = [threading.Thread(target=read, args=(seed,)) for seed in range(3)]
+    writer.start()
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    stop.set()
+    writer.join()
+    assert errors == []